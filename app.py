@@ -1,10 +1,12 @@
-# app.py — 最小 LINE Webhook：把 userId 印到日誌
-import os
-from flask import Flask, request, abort
+# app.py — LINE Webhook：印出 userId，並讓使用者用文字指令管理自己的觀察清單 / 規則
+import os, hmac
+from flask import Flask, request, abort, Response
 
 from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError
-from linebot.models import MessageEvent, TextMessage, TextSendMessage, FollowEvent
+from linebot.models import MessageEvent, TextMessage, TextSendMessage, FollowEvent, UnfollowEvent
+
+from subscriptions import SubscriptionStore, handle_command, export_snapshot, HELP_TEXT
 
 app = Flask(__name__)
 
@@ -13,11 +15,27 @@ CHANNEL_ACCESS_TOKEN = os.environ["LINE_CHANNEL_ACCESS_TOKEN"]
 
 line_bot_api = LineBotApi(CHANNEL_ACCESS_TOKEN)
 handler = WebhookHandler(CHANNEL_SECRET)
+# 訂閱只存在 Webhook 這邊：SUBSCRIPTIONS_DB 要指到持久磁碟（Render 掛 Disk），否則重新部署就清空。
+# 掃描端（另一個服務、另一顆磁碟）經 GET /subscriptions 讀取，兩邊設同一個 SUBSCRIPTIONS_TOKEN。
+subs = SubscriptionStore(os.environ.get("SUBSCRIPTIONS_DB", "subscriptions.db"))
+SUBSCRIPTIONS_TOKEN = os.environ.get("SUBSCRIPTIONS_TOKEN", "")
 
 @app.route("/healthz")
 def healthz():
     return "ok"
 
+@app.route("/subscriptions")
+def subscriptions_export():
+    """掃描端讀訂閱用；沒設 token 就不開放"""
+    if not SUBSCRIPTIONS_TOKEN:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {SUBSCRIPTIONS_TOKEN}"):
+        abort(401)
+    body, etag = export_snapshot(subs)
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status=304, headers={"ETag": etag})
+    return Response(body, mimetype="application/json", headers={"ETag": etag})
+
 @app.route("/callback", methods=["POST"])
 def callback():
     signature = request.headers.get("X-Line-Signature", "")
@@ -32,13 +50,19 @@ def callback():
 def handle_follow(event):
     uid = event.source.user_id
     print(f"[FOLLOW] userId={uid}")  # ← 到 Render Logs 直接看
-    line_bot_api.reply_message(event.reply_token, TextSendMessage(text="加好友成功 ✅ 已記錄 userId"))
+    line_bot_api.reply_message(event.reply_token, TextSendMessage(text=f"加好友成功 ✅ 已記錄 userId\n\n{HELP_TEXT}"))
     # 可選：主動再推一則
     line_bot_api.push_message(uid, TextSendMessage(text="歡迎！你的 userId 已寫入 Logs"))
 
+@handler.add(UnfollowEvent)
+def handle_unfollow(event):
+    uid = event.source.user_id
+    print(f"[UNFOLLOW] userId={uid}")
+    subs.drop_user(uid)
+
 @handler.add(MessageEvent, message=TextMessage)
 def handle_message(event):
     uid = event.source.user_id
     text = event.message.text
     print(f"[MSG] from {uid}: {text}")  # ← Logs 裡也會看到 userId
-    line_bot_api.reply_message(event.reply_token, TextSendMessage(text=f"收到訊息～你的 userId：{uid}"))
\ No newline at end of file
+    line_bot_api.reply_message(event.reply_token, TextSendMessage(text=handle_command(subs, uid, text)))
\ No newline at end of file
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# bar_series.py — 精簡 K 線序列：__slots__ + array('q') / array('d')，缺值以 NaN 表示
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Optional, Sequence
+
+NAN = float("nan")
+COLS = ("open", "high", "low", "close", "volume")
+FIELDS = ("ts",) + COLS
+
+def to_farray(vals: Iterable[Optional[float]]) -> array:
+    """None → NaN 的 float64 陣列（已是 array('d') 就直接沿用）"""
+    if isinstance(vals, array) and vals.typecode == "d":
+        return vals
+    return array("d", (NAN if v is None else v for v in vals))
+
+class BarSeries:
+    """
+    _chart_cache 的一條序列。每欄一個連續的 C 陣列（每根 8 bytes），
+    取代六個裝 boxed float/int 的 list；bar_store 的 blob 可直接 frombytes 載入。
+    仍支援 ent["close"] / ent.get("gen") 這種 dict 寫法，SeriesFeed 等呼叫端不必分兩套。
+    """
+    __slots__ = FIELDS + ("last", "gen")
+
+    def __init__(self, ts: Iterable[int] = (), open=(), high=(), low=(), close=(), volume=(),
+                 last: float = 0.0, gen: int = 0):
+        self.ts = ts if isinstance(ts, array) and ts.typecode == "q" else array("q", ts)
+        self.open = to_farray(open)
+        self.high = to_farray(high)
+        self.low = to_farray(low)
+        self.close = to_farray(close)
+        self.volume = to_farray(volume)
+        self.last = last
+        self.gen = gen
+
+    # ---- dict 相容 ----
+    def __getitem__(self, name: str):
+        return getattr(self, name)
+
+    def __setitem__(self, name: str, value):
+        setattr(self, name, value)
+
+    def get(self, name: str, default=None):
+        return getattr(self, name, default)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    # ---- 增量 ----
+    def merge(self, ts: Sequence[int], cols: Sequence[Sequence[Optional[float]]]) -> bool:
+        """
+        就地把短窗口併進來：從新資料第一根 ts 起截掉舊資料再接上（成形中的最後一根因此被取代）。
+        新窗口跟既有資料沒有重疊（中間可能漏 K 棒）時回 False。
+        """
+        if not self.ts or ts[0] > self.ts[-1]:
+            return False
+        k = bisect_left(self.ts, ts[0])
+        del self.ts[k:]
+        self.ts.extend(ts)
+        for name, vals in zip(COLS, cols):
+            a = getattr(self, name)
+            del a[k:]
+            a.extend(to_farray(vals))
+        return True
+
+    def trim(self, keep: int) -> bool:
+        """只留最後 keep 根；有剪掉回 True"""
+        cut = len(self.ts) - keep
+        if cut <= 0:
+            return False
+        for name in FIELDS:
+            del getattr(self, name)[:cut]
+        return True
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + sum(sys.getsizeof(getattr(self, name)) for name in FIELDS)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# bar_store.py — 持久化 K 線（每檔每週期一列，ts/open/high/low/close/volume 以欄位陣列 blob 存放）
+import sqlite3
+from array import array
+from typing import Dict, Optional, Iterable, Tuple
+
+from bar_series import BarSeries, COLS as _COLS, to_farray
+
+def _pack_f(vals) -> bytes:
+    return to_farray(vals).tobytes()
+
+def _unpack_f(blob: bytes) -> array:
+    a = array("d")
+    a.frombytes(blob)
+    return a
+
+def _pack_ts(ts) -> bytes:
+    return (ts if isinstance(ts, array) else array("q", ts)).tobytes()
+
+def _unpack_ts(blob: bytes) -> array:
+    a = array("q")
+    a.frombytes(blob)
+    return a
+
+class BarStore:
+    """
+    SQLite 單檔儲存。每列 = (symbol, interval) 的整段序列，
+    讀取時 blob 直接 frombytes 成 BarSeries（不經 Python list），啟動不必重抓。
+    """
+    def __init__(self, path: str = "bars.db", max_mb: float = 200):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS series (
+                symbol   TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                last     REAL NOT NULL,
+                ts BLOB, open BLOB, high BLOB, low BLOB, close BLOB, volume BLOB,
+                PRIMARY KEY (symbol, interval)
+            )""")
+        self.db.commit()
+
+    # ---- 讀 ----
+    def load_all(self, symbols: Optional[Iterable[str]] = None) -> Dict[Tuple[str, str], BarSeries]:
+        """symbols 給定時只解開這些代號（分片子行程只載自己負責的）"""
+        want = set(symbols) if symbols is not None else None
+        out = {}
+        for row in self.db.execute(
+                "SELECT symbol, interval, last, ts, open, high, low, close, volume FROM series"):
+            sym, interval, last, ts = row[:4]
+            if want is not None and sym not in want:
+                continue
+            out[(sym, interval)] = BarSeries(_unpack_ts(ts), *(_unpack_f(b) for b in row[4:]), last=last)
+        return out
+
+    # ---- 寫 ----
+    def save_many(self, items: Iterable[Tuple[Tuple[str, str], BarSeries]]):
+        rows = []
+        for (sym, interval), ent in items:
+            if not ent["ts"]:
+                continue            # 抓失敗的空資料不覆蓋既有好資料
+            rows.append((sym, interval, ent["last"], _pack_ts(ent["ts"]),
+                         *(_pack_f(ent[c]) for c in _COLS)))
+        if not rows:
+            return
+        self.db.executemany(
+            "INSERT OR REPLACE INTO series (symbol, interval, last, ts, open, high, low, close, volume) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.db.commit()
+        self.enforce_cap()
+
+    # ---- 清理 ----
+    def prune(self, keep_symbols: Iterable[str], keep_intervals: Optional[Iterable[str]] = None) -> int:
+        """刪掉已不在 symbols_all.txt（下市 / 轉板）的代號；給 keep_intervals 時順便刪掉不再抓的週期"""
+        keep = set(keep_symbols)
+        stale = [(s,) for (s,) in self.db.execute("SELECT DISTINCT symbol FROM series") if s not in keep]
+        if stale:
+            self.db.executemany("DELETE FROM series WHERE symbol = ?", stale)
+        old = []
+        if keep_intervals is not None:
+            keep_iv = set(keep_intervals)
+            old = [(i,) for (i,) in self.db.execute("SELECT DISTINCT interval FROM series") if i not in keep_iv]
+            if old:
+                self.db.executemany("DELETE FROM series WHERE interval = ?", old)
+        if stale or old:
+            self.db.commit()
+            self.db.execute("PRAGMA incremental_vacuum")
+        return len(stale)
+
+    def size_bytes(self) -> int:
+        (pc,) = self.db.execute("PRAGMA page_count").fetchone()
+        (fc,) = self.db.execute("PRAGMA freelist_count").fetchone()
+        (ps,) = self.db.execute("PRAGMA page_size").fetchone()
+        return (pc - fc) * ps
+
+    def enforce_cap(self) -> int:
+        """超過容量上限時，從最久沒更新的序列開始刪"""
+        if self.max_bytes <= 0:
+            return 0
+        dropped = 0
+        while self.size_bytes() > self.max_bytes:
+            victims = self.db.execute(
+                "SELECT symbol, interval FROM series ORDER BY last ASC LIMIT 50").fetchall()
+            if not victims:
+                break
+            self.db.executemany("DELETE FROM series WHERE symbol = ? AND interval = ?", victims)
+            self.db.commit()
+            dropped += len(victims)
+        if dropped:
+            self.db.execute("PRAGMA incremental_vacuum")
+            print(f"[INFO] bar_store 超過 {self.max_bytes // (1024 * 1024)} MB，淘汰 {dropped} 條序列")
+        return dropped
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+K 線快取記憶體：舊的 dict-of-lists vs BarSeries（array('q'/'d')），全市場日線
+（與 main 的 chart_specs 相同只快取日線；週線由 weekly_bars 從日線彙整）
+兩邊都從 JSON 解出來再建（與 fetch_chart → extract_ohlcv 相同），float / int 物件才算得進去；
+另外量全市場收盤價轉成批次指標矩陣（indicators_np.to_matrix，seed 時用）的時間。
+用法：python bench_bar_memory.py [--symbols 1900] [--daily 170]
+"""
+import argparse, gc, json, random, time, tracemalloc
+
+from bar_series import BarSeries
+from indicators_np import to_matrix
+
+def make_bars(n: int, start: int, step: int, rnd: random.Random):
+    ts, o, h, l, c, v = [], [], [], [], [], []
+    p = rnd.uniform(10, 500)
+    for i in range(n):
+        p *= 1 + rnd.gauss(0, 0.02)
+        miss = rnd.random() < 0.01
+        ts.append(start + i * step)
+        for col, x in ((o, p * 0.99), (h, p * 1.01), (l, p * 0.98), (c, p)):
+            col.append(None if miss else x)
+        v.append(None if miss else int(rnd.lognormvariate(13, 1)))
+    return ts, o, h, l, c, v
+
+def make_raw(n_sym: int, n_daily: int, seed: int = 1):
+    rnd = random.Random(seed)
+    raw = []
+    for i in range(n_sym):
+        sym = f"{1000 + i}.TW"
+        raw.append(((sym, "1d"), json.dumps(make_bars(n_daily, 1_700_000_000, 86400, rnd))))
+    return raw
+
+def build_lists(raw):
+    # 舊格式（extract_ohlcv 之後的 list(...)）
+    out = {}
+    for key, payload in raw:
+        ts, o, h, l, c, v = json.loads(payload)
+        out[key] = {"ts": ts, "open": o, "high": h, "low": l, "close": c, "volume": v, "last": 0.0, "gen": 1}
+    return out
+
+def build_series(raw):
+    out = {}
+    for key, payload in raw:
+        out[key] = BarSeries(*json.loads(payload), last=0.0, gen=1)
+    return out
+
+def measure(fn):
+    """回傳 (結果, 常駐 bytes, 峰值 bytes, 秒)"""
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    res = fn()
+    secs = time.perf_counter() - t0
+    cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return res, cur, peak, secs
+
+def closes_matrix(cache):
+    return to_matrix([ent["close"] for (_, interval), ent in cache.items() if interval == "1d"])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--symbols", type=int, default=1900)
+    ap.add_argument("--daily", type=int, default=170)
+    args = ap.parse_args()
+    raw = make_raw(args.symbols, args.daily)
+    bars = args.symbols * args.daily
+
+    old, old_cur, _, old_s = measure(lambda: build_lists(raw))
+    t0 = time.perf_counter(); closes_matrix(old); old_mx = time.perf_counter() - t0
+    del old
+    new, new_cur, _, new_s = measure(lambda: build_series(raw))
+    t0 = time.perf_counter(); closes_matrix(new); new_mx = time.perf_counter() - t0
+
+    mb = lambda b: b / (1024 * 1024)
+    print(f"{args.symbols} 檔 × 日線 {args.daily} 根 = {bars:,} 根 K 棒")
+    print(f"  dict-of-lists 快取 : {mb(old_cur):7.1f} MB（{old_cur / bars:5.1f} B/根），建立 {old_s:.2f}s")
+    print(f"  BarSeries 快取     : {mb(new_cur):7.1f} MB（{new_cur / bars:5.1f} B/根），建立 {new_s:.2f}s"
+          f"  → 省 {1 - new_cur / old_cur:.0%}")
+    print(f"  日線收盤 → 批次指標矩陣：list {old_mx * 1000:.1f} ms vs array {new_mx * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+本機 stub Yahoo server 壓測：一批（預設 200 檔）日線預抓的耗時 vs 併發數
+（與 main 的 chart_specs 相同只抓日線；週線由 weekly_bars 從日線彙整，不另外抓）
+用法：python bench_fetch.py [--batch 200] [--latency-ms 80] [--conc 1,2,4,8,16]
+"""
+import argparse, json, math, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import xq_alert_bot as bot
+from fetch_pool import configure
+
+def _fake_chart(n: int):
+    step = 86400
+    t0 = 1_700_000_000
+    close = [100 + 5 * math.sin(i / 7.0) for i in range(n)]
+    return {"chart": {"result": [{
+        "timestamp": [t0 + i * step for i in range(n)],
+        "indicators": {"quote": [{
+            "open": close, "high": [c + 1 for c in close], "low": [c - 1 for c in close],
+            "close": close, "volume": [1_000_000 + i for i in range(n)],
+        }]},
+    }], "error": None}}
+
+def make_handler(latency: float):
+    class StubYahoo(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"          # keep-alive，才量得到連線重用
+
+        def do_GET(self):
+            time.sleep(latency)
+            u = urlsplit(self.path)
+            qs = parse_qs(u.query)
+            if u.path.startswith("/v8/finance/chart/"):
+                body = _fake_chart(170)
+            elif u.path.startswith("/v7/finance/quote"):
+                syms = qs.get("symbols", [""])[0].split(",")
+                body = {"quoteResponse": {"result": [
+                    {"symbol": s, "regularMarketPrice": 100.0, "regularMarketVolume": 2_000_000}
+                    for s in syms if s]}}
+            else:
+                body = {}
+            data = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+    return StubYahoo
+
+def start_stub(latency: float):
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(latency))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_address[1]}"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batch", type=int, default=200)
+    ap.add_argument("--latency-ms", type=float, default=80)
+    ap.add_argument("--conc", default="1,2,4,8,16")
+    args = ap.parse_args()
+
+    srv, base = start_stub(args.latency_ms / 1000.0)
+    bot.YAHOO_BASE = base
+    batch = [f"{1000 + i}.TW" for i in range(args.batch)]
+    specs = [("8mo", "1d", 10)]
+
+    print(f"batch={args.batch} 檔日線，stub 延遲 {args.latency_ms:.0f} ms")
+    print(f"{'concurrency':>11} {'wall(s)':>8} {'req/s':>8}")
+    for conc in [int(c) for c in args.conc.split(",")]:
+        configure(concurrency=conc)
+        bot._chart_cache.clear()
+        t0 = time.perf_counter()
+        bot.fetch_quotes_bulk(batch, 50)
+        n = bot.prefetch_charts(batch, specs)
+        dt = time.perf_counter() - t0
+        print(f"{conc:>11} {dt:>8.2f} {n / dt:>8.1f}")
+    srv.shutdown()
+
+if __name__ == "__main__":
+    main()
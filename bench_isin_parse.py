@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+ISIN 頁面解析：isin_parser（regex 串流）vs 舊的 pandas.read_html，以本機 tpex.html 為例
+用法：python bench_isin_parse.py [html 檔 ...]
+"""
+import subprocess, sys, time
+
+from isin_parser import parse_isin_codes, read_page
+
+def _pandas_codes(html: str):
+    import pandas as pd
+    from io import StringIO
+    df = pd.read_html(StringIO(html))[0]
+    first_col = df.iloc[:, 0].astype(str).str.replace("\u3000", " ", regex=False)
+    return first_col.str.extract(r"^\s*(\d{4})\b")[0].dropna().tolist()
+
+def _best_of(fn, n=5):
+    best, res = float("inf"), None
+    for _ in range(n):
+        t0 = time.perf_counter()
+        res = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, res
+
+def _import_time(mod: str) -> float:
+    out = subprocess.run([sys.executable, "-c",
+                          f"import time; t=time.perf_counter(); import {mod}; print(time.perf_counter()-t)"],
+                         capture_output=True, text=True)
+    return float(out.stdout.strip()) if out.returncode == 0 else float("nan")
+
+def main():
+    paths = sys.argv[1:] or ["tpex.html"]
+    for path in paths:
+        html = read_page(path)
+        t_new, codes_new = _best_of(lambda: parse_isin_codes(html))
+        print(f"{path}（{len(html) / 1e6:.1f} MB）")
+        print(f"  isin_parser      : {t_new * 1000:8.1f} ms，{len(codes_new)} 檔")
+        try:
+            t_old, codes_old = _best_of(lambda: _pandas_codes(html), n=2)
+        except ImportError:
+            print("  pandas.read_html : 未安裝 pandas/lxml，略過比較")
+            continue
+        print(f"  pandas.read_html : {t_old * 1000:8.1f} ms，{len(codes_old)} 檔  → {t_old / t_new:.1f}x")
+        print(f"  代號完全相同     : {codes_new == codes_old}")
+    print(f"import 時間：isin_parser {_import_time('isin_parser') * 1000:.1f} ms，"
+          f"pandas {_import_time('pandas') * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
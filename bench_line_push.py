@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+本機 stub LINE Messaging API：比較「每則 × 每人各送一次」與 PushDispatcher（摘要 + 5 則一包 + multicast）
+stub 第一個請求與之後每 --throttle-every 個請求回一次 429（帶 Retry-After），驗證退避重送。
+StubLine / start_stub 也供 test_line_dispatcher.py 使用。
+用法：python bench_line_push.py [--alerts 40] [--recipients 3] [--latency-ms 150] [--throttle-every 4]
+"""
+import argparse, json, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import line_messaging_push as lmp
+
+class StubLine:
+    """
+    throttle_every：第 1、1+N、1+2N… 個請求回 429；script：接下來的請求依序強制回 (狀態碼, 是否照樣送達)，
+    例如 (500, True) 模擬「已送達但回應遺失」；gate 清掉時請求會卡住，直到 set()。
+    """
+    def __init__(self, latency: float, throttle_every: int):
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.arrived = 0
+        self.delivered = []           # (path, 收件人數, 訊息則數)
+        self.retry_keys = set()
+        self.log = []                 # (path, X-Line-Retry-Key, 回應狀態碼)
+        self.script = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def handler(self):
+        stub = self
+
+        class H(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with stub.lock:
+                    stub.arrived += 1
+                stub.gate.wait()
+                time.sleep(stub.latency)
+                with stub.lock:
+                    stub.calls += 1
+                    key = self.headers.get("X-Line-Retry-Key")
+                    dup = key and key in stub.retry_keys
+                    if stub.script:
+                        code, deliver = stub.script.pop(0)
+                    elif stub.throttle_every and (stub.calls - 1) % stub.throttle_every == 0:
+                        code, deliver = 429, False
+                    else:
+                        code, deliver = (409, False) if dup else (200, True)
+                    if deliver and not dup:
+                        if key:
+                            stub.retry_keys.add(key)
+                        to = body.get("to")
+                        stub.delivered.append((self.path, len(to) if isinstance(to, list) else 1,
+                                               len(body.get("messages", []))))
+                    stub.log.append((self.path, key, code))
+                throttled = code == 429
+                data = b"{}"
+                self.send_response(code)
+                if throttled:
+                    self.send_header("Retry-After", "0.05")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+        return H
+
+def start_stub(latency: float, throttle_every: int = 0):
+    stub = StubLine(latency, throttle_every)
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), stub.handler())
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return stub, srv, f"http://127.0.0.1:{srv.server_address[1]}"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--alerts", type=int, default=40)
+    ap.add_argument("--recipients", type=int, default=3)
+    ap.add_argument("--latency-ms", type=float, default=150)
+    ap.add_argument("--throttle-every", type=int, default=4)
+    args = ap.parse_args()
+    recipients = [f"U{i:032d}" for i in range(args.recipients)]
+    alerts = [f"【觸發】測試 ({1000 + i}) TWSE\n價：100.0\nR6 價>20；R7 量 2,000,000 > 1,000,000 股"
+              for i in range(args.alerts)]
+
+    # 舊作法：掃描迴圈內逐則、逐人同步送
+    stub, srv, base = start_stub(args.latency_ms / 1000.0)
+    sess = lmp._session()
+    t0 = time.perf_counter()
+    for text in alerts:
+        for uid in recipients:
+            sess.post(f"{base}/v2/bot/message/push", json={"to": uid, "messages": [{"type": "text", "text": text}]},
+                      headers={"Authorization": "Bearer x"}, timeout=15)
+    t_old = time.perf_counter() - t0
+    old_calls = stub.calls
+    srv.shutdown()
+
+    # PushDispatcher：掃描迴圈只 submit_digest，背景送
+    stub, srv, base = start_stub(args.latency_ms / 1000.0, args.throttle_every)
+    d = lmp.PushDispatcher("x", recipients, api_base=base, backoff=0.05)
+    t0 = time.perf_counter()
+    n_msgs = d.submit_digest(alerts)
+    t_block = time.perf_counter() - t0
+    d.flush(60)
+    t_new = time.perf_counter() - t0
+    d.close()
+    srv.shutdown()
+
+    print(f"{args.alerts} 則警示 × {args.recipients} 位收件人，stub 延遲 {args.latency_ms:.0f} ms")
+    print(f"  逐則逐人 push     : {old_calls:4d} 個請求，掃描迴圈被卡 {t_old:.2f}s")
+    print(f"  PushDispatcher    : 摘要成 {n_msgs} 則 → {len(stub.delivered)} 個成功請求"
+          f"（429 重送 {d.stats['retries']} 次），掃描迴圈被卡 {t_block * 1000:.1f} ms，背景送完 {t_new:.2f}s")
+    print(f"  送達明細          : {stub.delivered}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+啟動時間：從行程啟動到「第一輪可以出訊號」（全市場特徵列都算好）要多久
+- import：只 import xq_alert_bot
+- cold：symbols_meta 對應代號 → bar_store 載入全部日 K → 冷卻狀態 → 全市場指標 seed + 特徵列
+- snapshot：載入啟動快照 → 同樣算一輪特徵列（指標狀態已在快照裡，只剩尾端同步）
+各情境都在全新的子行程裡量（模組層狀態不會互相沾到），資料放在暫存目錄；不連網。
+用法：python bench_startup.py [--symbols 1900] [--bars 170] [--runs 3]
+"""
+import argparse, json, os, random, statistics, subprocess, sys, tempfile, time, zlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def make_workdir(path: str, n_sym: int, n_bar: int, seed: int = 1):
+    from bar_series import BarSeries
+    from bar_store import BarStore
+    from bench_bar_memory import make_bars
+    from symbol_meta import make_entry, save_meta
+    rnd = random.Random(seed)
+    codes = [str(1000 + i) for i in range(n_sym)]
+    with open(os.path.join(path, "symbols_all.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(codes) + "\n")
+    save_meta({c: make_entry(c, "TWSE" if i % 3 else "TPEX") for i, c in enumerate(codes)},
+              os.path.join(path, "symbols_meta.json"))
+    now = time.time()
+    start = int(now) - n_bar * 86400
+    store = BarStore(os.path.join(path, "bars.db"), max_mb=0)
+    store.save_many(((c + (".TW" if i % 3 else ".TWO"), "1d"),
+                     BarSeries(*make_bars(n_bar, start, 86400, rnd), last=now))
+                    for i, c in enumerate(codes))
+    store.close()
+    cfg = json.load(open(os.path.join(HERE, "config.json"), encoding="utf-8"))
+    cfg["cooldown_store"] = {"enabled": True, "path": "cooldown.db"}
+    cfg["bar_store"] = {"enabled": True, "path": "bars.db", "max_mb": 0}
+    cfg["snapshot"] = {"enabled": True, "path": "snapshot.pkl", "max_age_hours": 72}
+    with open(os.path.join(path, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(cfg, f)
+
+def phase(name: str):
+    """子行程：量一個情境，最後一行印 JSON"""
+    t0 = time.perf_counter()
+    import xq_alert_bot as bot
+    out = {"import": time.perf_counter() - t0}
+    if name != "import":
+        cfg = json.load(open("config.json", encoding="utf-8"))
+        all_syms = [s.strip() for s in open("symbols_all.txt", encoding="utf-8") if s.strip()]
+        path, max_age = bot.snapshot_settings(cfg)
+        snap = bot.snapshot.load(path, max_age) if name == "snapshot" else None
+        sym_map = snap["sym_map"] if snap else bot.resolve_symbols(all_syms)
+        y_list = [sym_map[s] for s in all_syms if s in sym_map]
+        bot.configure_chart_cache(cfg)
+        bot.open_bar_store(cfg, y_list, load=snap is None)
+        bot.open_cooldown_store(cfg)
+        if snap:
+            bot.restore_snapshot(snap, y_list, cfg)
+        out["loaded"] = time.perf_counter() - t0
+        specs = [("8mo", "1d", cfg["cache_refresh_minutes"]["daily"])]
+        metas = [bot.quote_meta(y, {"regularMarketPrice": 100.0, "regularMarketVolume": 2e6}) for y in y_list]
+        rows, fetched = bot.compute_features(metas, cfg, specs)
+        assert fetched == 0, "bench 不應該連網"
+        out["ready"] = time.perf_counter() - t0
+        out["rows"] = len(rows)
+        out["digest"] = zlib.crc32(repr(rows).encode("utf-8"))     # 兩種啟動算出的特徵列要一樣
+        if name == "cold":
+            t1 = time.perf_counter()
+            out["snap_bytes"] = bot.save_snapshot(path, cfg, sym_map)
+            out["snap_write"] = time.perf_counter() - t1
+    print(json.dumps(out))
+
+def run(workdir: str, name: str) -> dict:
+    env = dict(os.environ, PYTHONPATH=HERE + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    res = subprocess.run([sys.executable, os.path.join(HERE, "bench_startup.py"), "--phase", name],
+                         cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    return json.loads(res.stdout.strip().splitlines()[-1])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--symbols", type=int, default=1900)
+    ap.add_argument("--bars", type=int, default=170)
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--phase", default="", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.phase:
+        phase(args.phase)
+        return
+
+    with tempfile.TemporaryDirectory() as wd:
+        make_workdir(wd, args.symbols, args.bars)
+        res = {name: [] for name in ("import", "cold", "snapshot")}
+        for _ in range(args.runs):
+            for name in res:        # cold 每次都重寫快照，snapshot 讀的是同一份狀態
+                res[name].append(run(wd, name))
+    med = lambda name, key: statistics.median(r[key] for r in res[name])
+    print(f"{args.symbols} 檔 × {args.bars} 根日 K，{args.runs} 次取中位數")
+    print(f"  import xq_alert_bot：{med('import', 'import') * 1000:7.0f} ms")
+    for name, label in (("cold", "冷啟動（bar_store + seed）"), ("snapshot", "快照啟動")):
+        print(f"  {label}\n    載入 {med(name, 'loaded') * 1000:6.0f} ms → "
+              f"可出訊號 {med(name, 'ready') * 1000:6.0f} ms（{res[name][0]['rows']} 檔）")
+    same = {r["digest"] for r in res["cold"] + res["snapshot"]}
+    print(f"  特徵列{'一致' if len(same) == 1 else '不一致！'}；"
+          f"寫出快照 {med('cold', 'snap_write') * 1000:.0f} ms，{med('cold', 'snap_bytes') / (1024 * 1024):.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -2,33 +2,24 @@
 """
 從本機 twse.html / tpex.html 解析出股票代號，產生 symbols_all.txt
 """
-import pandas as pd
-import re
-from io import StringIO
+from isin_parser import parse_isin_rows, read_page
+from symbol_meta import build_meta, save_meta
 
-def _extract_codes_from_html_file(path: str):
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        html = f.read()
-    try:
-        dfs = pd.read_html(StringIO(html))
-    except ValueError:
-        return []
-    if not dfs:
-        return []
-    df = dfs[0]
-    first_col = df.iloc[:, 0].astype(str).str.replace("\u3000", " ", regex=False)
-    codes = first_col.str.extract(r"^\s*(\d{4})\b")[0].dropna().tolist()
-    return codes
+def _extract_rows_from_html_file(path: str):
+    return parse_isin_rows(read_page(path))
 
 def build_symbols_all():
-    codes_twse = _extract_codes_from_html_file("twse.html")
-    codes_tpex = _extract_codes_from_html_file("tpex.html")
+    rows_twse = _extract_rows_from_html_file("twse.html")
+    rows_tpex = _extract_rows_from_html_file("tpex.html")
+    codes_twse = [r[0] for r in rows_twse]
+    codes_tpex = [r[0] for r in rows_tpex]
     all_codes = sorted(set(codes_twse + codes_tpex), key=lambda x: int(x))
     with open("symbols_all.txt", "w", encoding="utf-8") as f:
         for c in all_codes:
             f.write(c + "\n")
+    save_meta(build_meta({"TWSE": rows_twse, "TPEX": rows_tpex}))
     print(f"[OK] symbols_all.txt updated: {len(all_codes)} codes "
           f"(TWSE {len(codes_twse)}, TPEX {len(codes_tpex)})")
 
 if __name__ == "__main__":
-    build_symbols_all()
\ No newline at end of file
+    build_symbols_all()
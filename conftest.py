@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+# test_push.py 是手動用的真實 LINE 推播，不在 pytest 範圍內
+collect_ignore = ["test_push.py"]
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+# cooldown_store.py — should_push 的冷卻狀態：記憶體 O(1) 查詢 + SQLite 持久化，舊資料自動過期
+import datetime, sqlite3, time
+from typing import Dict, Optional, Tuple
+
+Key = Tuple[str, str]          # (symbol, rule_id)
+
+class CooldownStore:
+    """
+    每個 (代號, 規則) 只留最後一次推播的 (日期序號, 時間)。
+    - once_per_day：同一天推過就擋；換日時前一天的項目整批丟掉
+    - cooldown 視窗：超過視窗的項目定期清掉
+    所以大小上限約為「代號數 × 規則數」，不會隨天數成長。
+    變動先記在 dirty，每輪 flush() 一次寫進 SQLite，重啟後載回。
+    另記最後做完收盤整理的交易日（mark_eod 立即寫入），收盤後重啟不會把當天的警示再推一次。
+    """
+    def __init__(self, path: Optional[str] = "cooldown.db", purge_every_s: float = 600):
+        self._last: Dict[Key, Tuple[int, float]] = {}
+        self._dirty: Dict[Key, Optional[Tuple[int, float]]] = {}
+        self._day = self._today(time.time())
+        self._max_window_s = 0.0
+        self._daily = False
+        self._purge_every_s = purge_every_s
+        self._next_purge = time.time() + purge_every_s
+        self._eod: Optional[datetime.date] = None
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("""
+                CREATE TABLE IF NOT EXISTS last_push (
+                    symbol TEXT NOT NULL,
+                    rule   TEXT NOT NULL,
+                    day    INTEGER NOT NULL,
+                    ts     REAL NOT NULL,
+                    PRIMARY KEY (symbol, rule)
+                )""")
+            self.db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.db.execute("DELETE FROM last_push WHERE day < ?", (self._day - 1,))
+            self.db.commit()
+            for sym, rule, day, ts in self.db.execute("SELECT symbol, rule, day, ts FROM last_push"):
+                self._last[(sym, rule)] = (day, ts)
+            row = self.db.execute("SELECT value FROM state WHERE key = 'eod_done'").fetchone()
+            if row:
+                self._eod = datetime.date.fromisoformat(row[0])
+
+    @staticmethod
+    def _today(now: float) -> int:
+        return datetime.date.fromtimestamp(now).toordinal()
+
+    def __len__(self):
+        return len(self._last)
+
+    def should_push(self, symbol: str, rule_id: str, cooldown_minutes: int, once_per_day: bool,
+                    now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        day = self._today(now)
+        window = cooldown_minutes * 60
+        # 清理的依據先以這次的設定更新：重啟後第一次清理若還是預設值（視窗 0），會把載回的項目全丟掉
+        self._daily = once_per_day
+        if not once_per_day:
+            self._max_window_s = max(self._max_window_s, window)
+        if day != self._day or now >= self._next_purge:
+            self._roll(day, now)
+        key = (symbol, rule_id)
+        last = self._last.get(key)
+        if once_per_day:
+            if last and last[0] == day:
+                return False
+        else:
+            if last and now - last[1] < window:
+                return False
+        self._last[key] = self._dirty[key] = (day, now)
+        return True
+
+    def entries(self) -> Dict[Key, Tuple[int, float]]:
+        return dict(self._last)
+
+    def restore(self, entries: Dict[Key, Tuple[int, float]]):
+        """快照載回：SQLite 那份可能比快照新，只補比較新的項目"""
+        for k, v in entries.items():
+            if v[0] >= self._day - 1 and (k not in self._last or self._last[k][1] < v[1]):
+                self._last[k] = self._dirty[k] = v
+
+    def last_eod(self) -> Optional[datetime.date]:
+        return self._eod
+
+    def mark_eod(self, d: datetime.date):
+        """收盤整理做完就寫入（只會往後推）"""
+        if self._eod is not None and d <= self._eod:
+            return
+        self._eod = d
+        if self.db is not None:
+            self.db.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('eod_done', ?)", (d.isoformat(),))
+            self.db.commit()
+
+    def _roll(self, day: int, now: float):
+        """換日 / 定期：丟掉不可能再擋住任何推播的項目"""
+        if self._daily:
+            stale = [k for k, (d, _) in self._last.items() if d < day]
+        else:
+            horizon = now - self._max_window_s
+            stale = [k for k, (_, ts) in self._last.items() if ts < horizon]
+        for k in stale:
+            del self._last[k]
+            self._dirty[k] = None
+        self._day = day
+        self._next_purge = now + self._purge_every_s
+
+    def flush(self):
+        """把本輪變動寫進 SQLite（每輪呼叫一次）"""
+        if not self._dirty:
+            return
+        if self.db is not None:
+            ups = [(k[0], k[1], v[0], v[1]) for k, v in self._dirty.items() if v is not None]
+            dels = [k for k, v in self._dirty.items() if v is None]
+            if ups:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO last_push (symbol, rule, day, ts) VALUES (?, ?, ?, ?)", ups)
+            if dels:
+                self.db.executemany("DELETE FROM last_push WHERE symbol = ? AND rule = ?", dels)
+            self.db.commit()
+        self._dirty.clear()
+
+    def close(self):
+        self.flush()
+        if self.db is not None:
+            self.db.close()
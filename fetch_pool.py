@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# fetch_pool.py — 共用 keep-alive 連線池 + 有上限的併發抓取（Yahoo 報價 / K 線共用）
+import threading, time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+      "AppleWebKit/537.36 (KHTML, like Gecko) "
+      "Chrome/120.0 Safari/537.36")
+
+class HostRateLimiter:
+    """每個 host 一個 token bucket；rate <= 0 代表不限速"""
+    def __init__(self, rate_per_sec: float, burst: Optional[int] = None):
+        self.rate = float(rate_per_sec)
+        self.burst = float(burst if burst else max(1.0, self.rate))
+        self._buckets: Dict[str, List[float]] = {}   # host -> [tokens, last_ts]
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                b = self._buckets.setdefault(host, [self.burst, now])
+                b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+                b[1] = now
+                if b[0] >= 1.0:
+                    b[0] -= 1.0
+                    return
+                wait = (1.0 - b[0]) / self.rate
+            time.sleep(wait)
+
+class FetchPool:
+    """
+    固定大小的執行緒池 + 單一 requests.Session（連線重用）。
+    concurrency 同時決定 worker 數與每個 host 的連線池大小。
+    """
+    def __init__(self, concurrency: int = 8, rate_per_host: float = 0.0, timeout: float = 20):
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = timeout
+        self.limiter = HostRateLimiter(rate_per_host)
+        s = requests.Session()
+        s.headers.update({"User-Agent": UA})
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.concurrency)
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        self.session = s
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="fetch")
+
+    def get_json(self, url: str) -> Optional[Dict[str, Any]]:
+        """阻塞式抓 JSON；任何錯誤都回 None（與原本 fetch_* 行為一致）"""
+        host = urlsplit(url).netloc
+        outcome = "error"
+        try:
+            self.limiter.acquire(host)
+            t0 = time.perf_counter()
+            try:
+                r = self.session.get(url, timeout=self.timeout)
+            finally:
+                metrics.observe("http_seconds", time.perf_counter() - t0, host=host)
+            outcome = "ok" if r.status_code == 200 else "http_error"
+            return r.json()
+        except requests.Timeout:
+            outcome = "timeout"
+            return None
+        except Exception:
+            return None
+        finally:
+            metrics.inc("http_requests_total", host=host, outcome=outcome)
+
+    def submit(self, url: str) -> Future:
+        return self.executor.submit(self.get_json, url)
+
+    def map_json(self, urls: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """併發抓一批 URL，結果順序與輸入相同"""
+        if len(urls) <= 1:
+            return [self.get_json(u) for u in urls]
+        return list(self.executor.map(self.get_json, urls))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+_pool: Optional[FetchPool] = None
+_pool_lock = threading.Lock()
+
+def configure(concurrency: int = 8, rate_per_host: float = 0.0, timeout: float = 20) -> FetchPool:
+    """依 config.json 的 fetch 區塊重建全域連線池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = FetchPool(concurrency, rate_per_host, timeout)
+        return _pool
+
+def get_pool() -> FetchPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = FetchPool()
+        return _pool
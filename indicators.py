@@ -1,46 +1,231 @@
 
-from typing import List, Tuple, Optional
+from collections import deque
+from typing import List, Sequence, Tuple, Optional
 
-def sma(values: List[float], window: int) -> List[Optional[float]]:
+# 缺值可以是 None（list）或 NaN（BarSeries 的 array('d')）；v != v 只有 NaN 成立
+
+def sma(values: Sequence[Optional[float]], window: int) -> List[Optional[float]]:
     out = [None]*len(values)
     if window <= 0: 
         return out
     s = 0.0
+    missing = 0                      # 視窗內 None 的個數，取代逐窗 all(...) 檢查
     for i, v in enumerate(values):
-        if v is None:
-            out[i] = None
-            continue
-        s += v
+        if v is None or v != v:
+            missing += 1
+        else:
+            s += v
         if i >= window:
-            s -= (values[i-window] if values[i-window] is not None else 0.0)
-        if i >= window-1 and all(values[k] is not None for k in range(i-window+1, i+1)):
+            old = values[i-window]
+            if old is None or old != old:
+                missing -= 1
+            else:
+                s -= old
+        if i >= window-1 and missing == 0:
             out[i] = s / window
-        else:
-            out[i] = None
     return out
 
-def _ema(vals: List[Optional[float]], period: int) -> List[Optional[float]]:
+def _ema(vals: Sequence[Optional[float]], period: int) -> List[Optional[float]]:
     out = [None]*len(vals)
     if period <= 0:
         return out
     k = 2/(period+1)
     ema_prev = None
     for i, v in enumerate(vals):
-        if v is None: 
+        if v is None or v != v:
             out[i] = ema_prev
             continue
         if ema_prev is None:
-            ema_prev = v
+            ema_prev = float(v)
         else:
             ema_prev = v*k + ema_prev*(1-k)
         out[i] = ema_prev
     return out
 
-def macd(close: List[Optional[float]], fast=12, slow=26, signal=9) -> Tuple[list, list, list]:
-    vals = [ (float(v) if v is not None else None) for v in close ]
-    ema_fast = _ema(vals, fast)
-    ema_slow = _ema(vals, slow)
+def macd(close: Sequence[Optional[float]], fast=12, slow=26, signal=9) -> Tuple[list, list, list]:
+    ema_fast = _ema(close, fast)          # 直接走訪輸入（list 或 array），不另外複製一份
+    ema_slow = _ema(close, slow)
     dif = [ (f - s) if (f is not None and s is not None) else None for f, s in zip(ema_fast, ema_slow) ]
     dem = _ema(dif, signal)
     hist = [ (d - m) if (d is not None and m is not None) else None for d, m in zip(dif, dem) ]
     return dif, dem, hist
+
+# ---------------- 串流版（每根 K 棒 O(1)） ----------------
+# 與上面的批次函式做完全相同的浮點運算，seed 後逐根 update 的輸出逐位元一致。
+# replace_last() 用來更新仍在成形的最後一根 K 棒；values 只保留最近 history 個輸出，
+# 給 R1–R4/R8 取 [-1]/[-2]/[-3] 用。
+
+class RollingSMA:
+    __slots__ = ("window", "s", "missing", "n", "buf", "out", "_undo")
+
+    def __init__(self, window: int, history: int = 3):
+        self.window = window
+        self.s = 0.0
+        self.missing = 0
+        self.n = 0
+        self.buf = deque(maxlen=max(window, 0) + 1)   # 多留一格，replace_last 才能還原
+        self.out = deque(maxlen=history + 1)
+        self._undo = None
+
+    @classmethod
+    def restore(cls, window: int, s: float, s_prev: float, n: int,
+                inputs: List[Optional[float]], outputs: List[Optional[float]], history: int = 3) -> "RollingSMA":
+        """由批次引擎（indicators_np）算好的狀態直接還原，等同 seed(values)"""
+        st = cls(window, history)
+        st.s, st.n = s, n
+        st.out.extend(outputs[-(history + 1):])
+        if window > 0:
+            tail = list(inputs[-(window + 1):])
+            st.buf.extend(tail)
+            st.missing = sum(v is None for v in tail[-window:])
+            if n:
+                st._undo = (s_prev, sum(v is None for v in tail[:-1]))
+        elif n:
+            st._undo = (s_prev, 0)
+        return st
+
+    def seed(self, values: List[Optional[float]]) -> "RollingSMA":
+        for v in values:
+            self.update(v)
+        return self
+
+    def update(self, v: Optional[float]) -> Optional[float]:
+        if v != v:
+            v = None
+        self._undo = (self.s, self.missing)
+        w = self.window
+        if w <= 0:
+            res = None
+        else:
+            if v is None:
+                self.missing += 1
+            else:
+                self.s += v
+            self.buf.append(v)
+            if self.n >= w:
+                old = self.buf[0]
+                if old is None:
+                    self.missing -= 1
+                else:
+                    self.s -= old
+            res = self.s / w if (self.n >= w-1 and self.missing == 0) else None
+        self.n += 1
+        self.out.append(res)
+        return res
+
+    def replace_last(self, v: Optional[float]) -> Optional[float]:
+        if self._undo is None:
+            return self.update(v)
+        self.s, self.missing = self._undo
+        if self.window > 0:
+            self.buf.pop()
+        self.out.pop()
+        self.n -= 1
+        return self.update(v)
+
+    @property
+    def values(self) -> List[Optional[float]]:
+        return list(self.out)[-(self.out.maxlen - 1):]
+
+class EMAState:
+    __slots__ = ("period", "k", "prev", "out", "_undo")
+
+    def __init__(self, period: int, history: int = 3):
+        self.period = period
+        self.k = 2/(period+1) if period > 0 else 0.0
+        self.prev = None
+        self.out = deque(maxlen=history + 1)
+        self._undo = None
+
+    @classmethod
+    def restore(cls, period: int, prev: Optional[float], undo: Optional[float],
+                outputs: List[Optional[float]], history: int = 3) -> "EMAState":
+        st = cls(period, history)
+        st.prev = prev
+        st.out.extend(outputs[-(history + 1):])
+        if outputs:
+            st._undo = (undo,)
+        return st
+
+    def seed(self, values: List[Optional[float]]) -> "EMAState":
+        for v in values:
+            self.update(v)
+        return self
+
+    def update(self, v: Optional[float]) -> Optional[float]:
+        if v != v:
+            v = None
+        self._undo = (self.prev,)
+        if self.period <= 0:
+            res = None
+        else:
+            if v is not None:
+                k = self.k
+                self.prev = v if self.prev is None else v*k + self.prev*(1-k)
+            res = self.prev                      # None 時沿用前值（同 _ema）
+        self.out.append(res)
+        return res
+
+    def replace_last(self, v: Optional[float]) -> Optional[float]:
+        if self._undo is None:
+            return self.update(v)
+        (self.prev,) = self._undo
+        self.out.pop()
+        return self.update(v)
+
+    @property
+    def values(self) -> List[Optional[float]]:
+        return list(self.out)[-(self.out.maxlen - 1):]
+
+class MACDState:
+    __slots__ = ("fast", "slow", "signal", "dif", "dem", "hist")
+
+    def __init__(self, fast=12, slow=26, signal=9, history: int = 3):
+        self.fast = EMAState(fast, 0)
+        self.slow = EMAState(slow, 0)
+        self.signal = EMAState(signal, 0)
+        self.dif = deque(maxlen=history + 1)
+        self.dem = deque(maxlen=history + 1)
+        self.hist = deque(maxlen=history + 1)
+
+    @classmethod
+    def restore(cls, fast: EMAState, slow: EMAState, signal: EMAState,
+                dif: list, dem: list, hist: list, history: int = 3) -> "MACDState":
+        st = cls(history=history)
+        st.fast, st.slow, st.signal = fast, slow, signal
+        st.dif.extend(dif[-(history + 1):])
+        st.dem.extend(dem[-(history + 1):])
+        st.hist.extend(hist[-(history + 1):])
+        return st
+
+    def seed(self, close: List[Optional[float]]) -> "MACDState":
+        for v in close:
+            self.update(v)
+        return self
+
+    def _push(self, v: Optional[float]):
+        v = float(v) if v is not None and v == v else None
+        f = self.fast.update(v)
+        s = self.slow.update(v)
+        d = (f - s) if (f is not None and s is not None) else None
+        m = self.signal.update(d)
+        self.dif.append(d)
+        self.dem.append(m)
+        self.hist.append((d - m) if (d is not None and m is not None) else None)
+
+    def update(self, v: Optional[float]) -> Optional[float]:
+        self._push(v)
+        return self.hist[-1]
+
+    def replace_last(self, v: Optional[float]) -> Optional[float]:
+        if self.fast._undo is None:
+            return self.update(v)
+        for e in (self.fast, self.slow, self.signal):
+            (e.prev,) = e._undo
+        self.dif.pop(); self.dem.pop(); self.hist.pop()
+        return self.update(v)
+
+    @property
+    def values(self) -> Tuple[list, list, list]:
+        h = self.hist.maxlen - 1
+        return list(self.dif)[-h:], list(self.dem)[-h:], list(self.hist)[-h:]
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+indicators_np.py — 全市場批次指標引擎（NumPy）
+所有代號的收盤價放進同一個 2-D 陣列（代號 × K 棒，右對齊，缺值 NaN），
+沿時間軸逐欄推進、在代號軸上向量化。每一步的浮點運算與 indicators.py 相同，
+所以結果（含 None/NaN 語意、_ema 遇缺值沿用前值）逐位元一致。
+"""
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from indicators import RollingSMA, EMAState, MACDState
+
+def to_matrix(series: Sequence[Sequence[Optional[float]]], width: Optional[int] = None) -> np.ndarray:
+    """list-of-lists（None 表缺值）或 array('d')（NaN 表缺值）→ 右對齊 float64 矩陣，左側不足補 NaN"""
+    m = width if width is not None else max((len(r) for r in series), default=0)
+    X = np.full((len(series), m), np.nan)
+    for i, row in enumerate(series):
+        if len(row) > m:
+            row = row[-m:]
+        if m and len(row):
+            # array('d') 走 buffer protocol 直接複製進矩陣；list 的 None → nan
+            X[i, m - len(row):] = np.frombuffer(row, dtype=float) if isinstance(row, array) else \
+                np.array(row, dtype=float)
+    return X
+
+def to_lists(A: np.ndarray, lengths: Sequence[int]) -> List[List[Optional[float]]]:
+    """矩陣 → 各代號原長度的 list（NaN 還原成 None）"""
+    m = A.shape[1]
+    out = []
+    for row, n in zip(A, lengths):
+        out.append([None if x != x else x for x in row[m - n:].tolist()] if n else [])
+    return out
+
+def _sma_run(X: np.ndarray, window: int):
+    n, m = X.shape
+    out = np.full((n, m), np.nan)
+    s = np.zeros(n)
+    s_prev = s.copy()
+    if window <= 0 or m == 0:
+        return out, s, s_prev
+    valid = ~np.isnan(X)
+    Z = np.where(valid, X, 0.0)          # 缺值加 0.0 / 減 0.0 與「跳過」結果相同
+    bad = (~valid).astype(np.int64)
+    missing = np.zeros(n, dtype=np.int64)
+    for i in range(m):
+        s_prev = s.copy()
+        s += Z[:, i]
+        missing += bad[:, i]
+        if i >= window:
+            s -= Z[:, i - window]
+            missing -= bad[:, i - window]
+        if i >= window - 1:
+            out[:, i] = np.where(missing == 0, s / window, np.nan)
+    return out, s, s_prev
+
+def sma_2d(X: np.ndarray, window: int) -> np.ndarray:
+    return _sma_run(X, window)[0]
+
+def ema_2d(X: np.ndarray, period: int) -> np.ndarray:
+    n, m = X.shape
+    out = np.full((n, m), np.nan)
+    if period <= 0:
+        return out
+    k = 2/(period+1)
+    prev = np.full(n, np.nan)
+    for i in range(m):
+        v = X[:, i]
+        nxt = np.where(np.isnan(prev), v, v*k + prev*(1-k))
+        prev = np.where(np.isnan(v), prev, nxt)
+        out[:, i] = prev
+    return out
+
+def macd_2d(X: np.ndarray, fast=12, slow=26, signal=9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    ema_fast = ema_2d(X, fast)
+    ema_slow = ema_2d(X, slow)
+    dif = ema_fast - ema_slow            # 任一為 NaN → NaN，同 macd() 的 None 規則
+    dem = ema_2d(dif, signal)
+    return dif, dem, dif - dem
+
+# ---------------- 批次 seed 串流狀態 ----------------
+def _opt(x: float) -> Optional[float]:
+    return None if x != x else float(x)
+
+def _col(A: np.ndarray, i: int, j: int) -> Optional[float]:
+    return _opt(A[i, j]) if A.shape[1] >= -j else None
+
+def _tail(A: np.ndarray, i: int, n: int, k: int) -> List[Optional[float]]:
+    k = min(k, n)
+    return [_opt(x) for x in A[i, A.shape[1] - k:].tolist()] if k else []
+
+def seed_states(specs, closes: Sequence[Sequence[Optional[float]]], history: int = 3):
+    """
+    一次替多檔代號建立串流指標（specs 同 series_feed.SeriesFeed），
+    結果等同對每檔各自 st.seed(close)，但整個 universe 只跑幾趟向量化迴圈。
+    回傳 [[state, ...], ...]，順序與 closes 相同。
+    """
+    X = to_matrix(closes)
+    lengths = [len(c) for c in closes]
+    per_symbol = [[] for _ in closes]
+    for kind, *args in specs:
+        if kind == "sma":
+            window = args[0]
+            out, s, s_prev = _sma_run(X, window)
+            for i, n in enumerate(lengths):
+                inputs = _tail(X, i, n, window + 1)
+                per_symbol[i].append(RollingSMA.restore(
+                    window, float(s[i]), float(s_prev[i]), n, inputs, _tail(out, i, n, history + 1), history))
+        else:
+            fast, slow, signal = args
+            vals = [ema_2d(X, fast), ema_2d(X, slow)]
+            dif = vals[0] - vals[1]
+            dem = ema_2d(dif, signal)
+            hist = dif - dem
+            for i, n in enumerate(lengths):
+                emas = []
+                for period, A in ((fast, vals[0]), (slow, vals[1]), (signal, dem)):
+                    emas.append(EMAState.restore(period, _col(A, i, -1) if n else None,
+                                                 _col(A, i, -2) if n >= 2 else None,
+                                                 _tail(A, i, n, 1), 0))
+                per_symbol[i].append(MACDState.restore(
+                    *emas, _tail(dif, i, n, history + 1), _tail(dem, i, n, history + 1),
+                    _tail(hist, i, n, history + 1), history))
+    return per_symbol
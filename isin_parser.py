@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+isin_parser.py — ISIN 公開頁面（C_public.jsp）的輕量解析器
+只掃第一個有資料列的 <table>，每列只取第一格（「1101　台泥」）；
+代號符合 4 碼時才再往後取「市場別」那格。不需要 pandas / lxml。
+頁面宣告 charset=Big5，實際是 MS950（cp950，含 Big5 沒有的延伸字），一律用 decode_page 解碼後再解析。
+"""
+import re
+from html import unescape
+from typing import List, Tuple
+
+_TR_TD = re.compile(r"<tr\b[^>]*>\s*<td\b[^>]*>(.*?)</td>", re.S | re.I)
+_TD = re.compile(r"<td\b[^>]*>(.*?)</td>", re.S | re.I)
+_TR = re.compile(r"<tr\b", re.I)
+_TABLE_END = re.compile(r"</table>", re.I)
+_TAG = re.compile(r"<[^>]*>")
+_WS = re.compile(r"[\r\n]+|\s{2,}")               # 與 pandas.read_html 的空白正規化相同
+_CODE = re.compile(r"^\s*(\d{4})\b\s*(.*)$", re.S)
+MARKET_COL = 3                                     # 有價證券代號及名稱 / ISIN / 上市日 / 市場別 / ...
+PAGE_ENCODING = "cp950"
+
+def decode_page(raw: bytes) -> str:
+    return raw.decode(PAGE_ENCODING, errors="replace")
+
+def read_page(path: str) -> str:
+    """本機存下的 twse.html / tpex.html"""
+    with open(path, "rb") as f:
+        return decode_page(f.read())
+
+def _cell_text(raw: str) -> str:
+    if "<" in raw:
+        raw = _TAG.sub("", raw)
+    if "&" in raw:
+        raw = unescape(raw)
+    return _WS.sub(" ", raw.strip())
+
+def _table_span(html: str) -> Tuple[int, int]:
+    """第一個含 <tr> 的表格範圍（pandas 取 dfs[0] 的同一張表）"""
+    m = _TR.search(html)
+    if not m:
+        return 0, 0
+    e = _TABLE_END.search(html, m.start())
+    return m.start(), (e.start() if e else len(html))
+
+def parse_isin_rows(html: str) -> List[Tuple[str, str, str]]:
+    """回傳 [(代號, 名稱, 市場別), ...]，順序同頁面"""
+    start, end = _table_span(html)
+    out = []
+    for m in _TR_TD.finditer(html, start, end):
+        text = _cell_text(m.group(1)).replace("\u3000", " ")
+        cm = _CODE.match(text)
+        if not cm:
+            continue
+        market = ""
+        pos = m.end()
+        for _ in range(MARKET_COL):                   # 只有代號列才往後取市場別
+            td = _TD.search(html, pos, end)
+            if not td or "</tr" in html[pos:td.start()].lower():
+                break
+            market, pos = _cell_text(td.group(1)), td.end()
+        out.append((cm.group(1), cm.group(2).strip(), market))
+    return out
+
+def parse_isin_codes(html: str) -> List[str]:
+    return [code for code, _, _ in parse_isin_rows(html)]
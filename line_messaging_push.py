@@ -1,13 +1,42 @@
 # line_messaging_push.py — LINE Messaging API 主動推播
+import os, json, queue, threading, time, uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
 import requests
-import json
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+API_BASE = "https://api.line.me"
+MAX_MESSAGES_PER_REQUEST = 5        # push / multicast 一次最多 5 則
+MAX_TEXT_LEN = 5000                 # 單則文字訊息上限
+MAX_MULTICAST_TO = 500              # multicast 一次最多 500 人
+
+_cfg_cache: Dict[str, Tuple[float, dict]] = {}
 
 def _load_cfg(config_path="config.json"):
+    """依檔案 mtime 快取，不必每次推播都重讀 config.json"""
+    mtime = os.path.getmtime(config_path)
+    hit = _cfg_cache.get(config_path)
+    if hit and hit[0] == mtime:
+        return hit[1]
     with open(config_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        cfg = json.load(f)
+    _cfg_cache[config_path] = (mtime, cfg)
+    return cfg
+
+def _session(pool: int = 4) -> requests.Session:
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+_shared_session: Optional[requests.Session] = None
 
 def push_message(text: str, config_path: str = "config.json"):
-    """將文字訊息推播給 config.json/messaging_api/recipients 列表"""
+    """將文字訊息推播給 config.json/messaging_api/recipients 列表（同步、共用連線）"""
+    global _shared_session
     cfg = _load_cfg(config_path).get("messaging_api", {})
     token = cfg.get("channel_access_token")
     recipients = cfg.get("recipients", [])
@@ -19,13 +48,178 @@ def push_message(text: str, config_path: str = "config.json"):
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
     }
-    url = "https://api.line.me/v2/bot/message/push"
+    url = f"{cfg.get('api_base', API_BASE)}/v2/bot/message/push"
+    if _shared_session is None:
+        _shared_session = _session()
 
     for uid in recipients:
         body = {"to": uid, "messages": [{"type": "text", "text": text}]}
         try:
-            r = requests.post(url, headers=headers, json=body, timeout=15)
+            r = _shared_session.post(url, headers=headers, json=body, timeout=15)
             if r.status_code != 200:
                 print(f"[ERROR] LINE push 失敗 uid={uid}: {r.status_code} {r.text}")
         except Exception as e:
-            print(f"[ERROR] LINE push 例外 uid={uid}: {e}")
\ No newline at end of file
+            print(f"[ERROR] LINE push 例外 uid={uid}: {e}")
+
+# ---------------- 非同步批次推播 ----------------
+def pack_digest(texts: Sequence[str], limit: int = MAX_TEXT_LEN, sep: str = "\n\n") -> List[str]:
+    """同一輪觸發的多則警示合併成少數幾則（每則不超過 limit 字）"""
+    out, cur = [], ""
+    for t in texts:
+        t = t[:limit]
+        if cur and len(cur) + len(sep) + len(t) > limit:
+            out.append(cur)
+            cur = t
+        else:
+            cur = f"{cur}{sep}{t}" if cur else t
+    if cur:
+        out.append(cur)
+    return out
+
+class PushDispatcher:
+    """
+    背景執行緒消化推播佇列：共用連線池、多人用 multicast、一次請求塞滿 5 則，
+    遇到 429 / 5xx 以 Retry-After 或指數退避重送（帶 X-Line-Retry-Key 避免重複送達）。
+    掃描迴圈只需 submit / submit_digest，不會被 LINE 的延遲卡住。
+    """
+    def __init__(self, token: str, recipients: Sequence[str], api_base: str = API_BASE,
+                 max_retries: int = 5, backoff: float = 1.0, timeout: float = 15):
+        self.token = token
+        self.recipients = tuple(recipients)
+        self.api_base = api_base.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = _session()
+        self.q: "queue.Queue[Optional[Tuple[Tuple[str, ...], dict]]]" = queue.Queue()
+        self.stats = {"requests": 0, "messages": 0, "retries": 0, "failed": 0}
+        self._t = threading.Thread(target=self._run, name="line-push", daemon=True)
+        self._t.start()
+
+    # ---- 生產端 ----
+    def _target(self, to: Optional[Sequence[str]], n_msgs: int) -> Optional[Tuple[str, ...]]:
+        """收件人；沒有 token 或收件人時回 None（這些訊息不排入佇列，計為 skipped）"""
+        target = tuple(to) if to is not None else self.recipients
+        if not self.token or not target:
+            print("[WARN] Messaging API 未設定（channel_access_token 或 recipients），略過推播。")
+            metrics.inc("line_messages_total", n_msgs, outcome="skipped")
+            return None
+        return target
+
+    def _put(self, target: Tuple[str, ...], text: str):
+        self.q.put((target, {"type": "text", "text": text[:MAX_TEXT_LEN]}))
+        metrics.inc("line_messages_total", outcome="queued")
+
+    def submit(self, text: str, to: Optional[Sequence[str]] = None) -> bool:
+        """排入佇列；未設定而略過時回傳 False"""
+        target = self._target(to, 1)
+        if target is None:
+            return False
+        self._put(target, text)
+        return True
+
+    def submit_digest(self, texts: Sequence[str], to: Optional[Sequence[str]] = None) -> int:
+        """把一輪的警示合併成摘要訊息後排入佇列，回傳實際排入的訊息則數（未設定時為 0）"""
+        msgs = pack_digest(texts)
+        target = self._target(to, len(msgs)) if msgs else None
+        if target is None:
+            return 0
+        for m in msgs:
+            self._put(target, m)
+        return len(msgs)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等佇列送完（測試 / 關機用）"""
+        deadline = None if timeout is None else time.time() + timeout
+        while self.q.unfinished_tasks:
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = 10):
+        self.flush(timeout)
+        self.q.put(None)
+        self._t.join(timeout)
+
+    # ---- 消費端 ----
+    def _drain(self, first) -> List:
+        items = [first]
+        while True:
+            try:
+                items.append(self.q.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _run(self):
+        while True:
+            first = self.q.get()
+            if first is None:
+                self.q.task_done()
+                return
+            items = self._drain(first)
+            stop = None in items
+            # 依收件人分組（保留順序），每組 5 則一包
+            groups: Dict[Tuple[str, ...], List[dict]] = {}
+            for it in items:
+                if it is not None:
+                    groups.setdefault(it[0], []).append(it[1])
+            for to, msgs in groups.items():
+                for i in range(0, len(msgs), MAX_MESSAGES_PER_REQUEST):
+                    self._send(to, msgs[i:i + MAX_MESSAGES_PER_REQUEST])
+            for _ in items:
+                self.q.task_done()
+            if stop:
+                return
+
+    def _send(self, to: Tuple[str, ...], msgs: List[dict]):
+        if len(to) == 1:
+            self._post("/v2/bot/message/push", {"to": to[0], "messages": msgs}, len(msgs))
+            return
+        for i in range(0, len(to), MAX_MULTICAST_TO):
+            self._post("/v2/bot/message/multicast", {"to": list(to[i:i + MAX_MULTICAST_TO]), "messages": msgs},
+                       len(msgs))
+
+    def _post(self, path: str, body: dict, n_msgs: int):
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+            "X-Line-Retry-Key": str(uuid.uuid4()),
+        }
+        url = self.api_base + path
+        for attempt in range(self.max_retries + 1):
+            try:
+                r = self.session.post(url, headers=headers, json=body, timeout=self.timeout)
+                self.stats["requests"] += 1
+                metrics.inc("line_requests_total", status=r.status_code)
+                if r.status_code == 200:
+                    self.stats["messages"] += n_msgs
+                    return
+                if r.status_code == 409:        # 同一 retry key 已送達
+                    return
+                if r.status_code != 429 and r.status_code < 500:
+                    print(f"[ERROR] LINE {path} 失敗: {r.status_code} {r.text}")
+                    self.stats["failed"] += 1
+                    return
+                ra = r.headers.get("Retry-After")
+                wait = float(ra) if ra and ra.replace(".", "", 1).isdigit() else self.backoff * (2 ** attempt)
+            except Exception as e:
+                print(f"[ERROR] LINE {path} 例外: {e}")
+                metrics.inc("line_requests_total", status="timeout" if isinstance(e, requests.Timeout) else "error")
+                wait = self.backoff * (2 ** attempt)
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+                time.sleep(wait)
+        print(f"[ERROR] LINE {path} 重試 {self.max_retries} 次仍失敗，放棄 {n_msgs} 則")
+        self.stats["failed"] += 1
+
+_dispatcher: Optional[PushDispatcher] = None
+
+def get_dispatcher(config_path: str = "config.json") -> PushDispatcher:
+    """依 config.json/messaging_api 建立（一次）全域推播器"""
+    global _dispatcher
+    if _dispatcher is None:
+        cfg = _load_cfg(config_path).get("messaging_api", {})
+        _dispatcher = PushDispatcher(cfg.get("channel_access_token", ""), cfg.get("recipients", []),
+                                     api_base=cfg.get("api_base", API_BASE))
+    return _dispatcher
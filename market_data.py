@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+market_data.py — 行情來源介面
+- YahooPoller：原本的作法，每 poll_seconds 整批查 v7 quote（complete=True，回全部代號）
+- StreamSource：推播式來源的共同底座，外部（websocket 客戶端等）呼叫 push() 餵 tick，
+  掃描端 wait() 拿到「這段時間有變動的代號」只重算這些
+- TickFileSource：本機 tick 檔回放（測試 / 重現用），也是 StreamSource 的範例實作
+回傳的報價一律是 Yahoo quote 欄位格式（regularMarketPrice / regularMarketVolume ...），
+串流來源另外帶 tickTime，掃描端據此更新仍在成形的日 K。tick 只有價量，串流來源會把它疊在該代號
+上一份完整報價（seed() 給的底稿 + 之前的 tick）上，名稱 / 市場 / 昨收 / 漲跌幅才會齊。
+"""
+import csv, threading, time
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+from tw_time import tw_day
+
+Quote = Dict[str, Any]
+
+class YahooPoller:
+    complete = True             # 每次都回整批快照，交給排程器挑
+    streaming = False
+    replay = False              # 回放歷史資料時不看交易時段
+
+    def __init__(self, fetch_bulk: Callable[[List[str], int], Dict[str, Quote]], chunk: int = 50):
+        self.fetch_bulk = fetch_bulk
+        self.chunk = chunk
+
+    def fetch(self, symbols: List[str]) -> Dict[str, Quote]:
+        with metrics.stage("quote_fetch"):
+            return self.fetch_bulk(symbols, self.chunk)
+
+    def close(self):
+        pass
+
+class StreamSource:
+    """
+    tick 先進 _pending（同一代號只留最新一筆），wait() 等到有資料後再多收 window_s 秒，
+    把一整串連續成交合成一次重算。合併掉的 tick 不丟價格：tickOpen / tickHigh / tickLow 記這批
+    （同一台北日）第一筆 / 最高 / 最低價，新的一天的日 K 才會以第一筆開盤。
+    每筆 tick 疊在 _full（該代號最新的完整報價）上再算漲跌幅；跨日的第一筆 tick 以前一天最後的價格當昨收。
+    """
+    complete = False
+    streaming = True
+    replay = False
+
+    def __init__(self, window_s: float = 0.5):
+        self.window_s = window_s
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Quote] = {}
+        self._full: Dict[str, Quote] = {}
+        self._event = threading.Event()
+        self.ticks = 0
+        self.done = False           # 來源已結束（檔案讀完 / 連線關閉）
+
+    def seed(self, quotes: Dict[str, Quote]):
+        """完整報價（Yahoo quote 等）當底稿；None 的欄位不蓋掉已知的值"""
+        with self._lock:
+            for y, q in quotes.items():
+                base = self._full.setdefault(y, {"symbol": y})
+                base.update((k, v) for k, v in q.items() if v is not None)
+
+    def push(self, y_symbol: str, price: float, volume: Optional[float] = None, ts: Optional[float] = None,
+             **extra):
+        ts = ts if ts is not None else time.time()
+        with self._lock:
+            q = dict(self._full.get(y_symbol) or {"symbol": y_symbol})
+            prev_t = q.get("tickTime") or q.get("regularMarketTime")
+            if prev_t and tw_day(ts) > tw_day(prev_t):
+                if q.get("regularMarketPrice") is not None:
+                    q["regularMarketPreviousClose"] = q["regularMarketPrice"]
+                q["regularMarketVolume"] = None
+            q["regularMarketPrice"] = price
+            if volume is not None:
+                q["regularMarketVolume"] = volume
+            p = self._pending.get(y_symbol)
+            if p is None or tw_day(p["tickTime"]) != tw_day(ts):
+                q["tickOpen"] = q["tickHigh"] = q["tickLow"] = price
+            else:
+                q["tickOpen"] = p["tickOpen"]
+                q["tickHigh"] = max(p["tickHigh"], price)
+                q["tickLow"] = min(p["tickLow"], price)
+            q["tickTime"] = ts
+            q.update(extra)
+            yc = q.get("regularMarketPreviousClose")
+            if yc:
+                q["regularMarketChange"] = price - yc
+                q["regularMarketChangePercent"] = (price / yc - 1.0) * 100.0
+            self._full[y_symbol] = q
+            self._pending[y_symbol] = q
+            self.ticks += 1
+        metrics.inc("ticks_total")
+        self._event.set()
+
+    def wait(self, timeout: float) -> Dict[str, Quote]:
+        """最多等 timeout 秒；回傳有變動的 {代號: quote}（可能是空的）"""
+        if not self._event.wait(timeout):
+            return {}
+        if self.window_s > 0 and not self.done:
+            time.sleep(self.window_s)
+        with self._lock:
+            out, self._pending = self._pending, {}
+            if not self.done:
+                self._event.clear()     # 已結束就保持 set，之後的 wait 立刻回來（exhausted）
+        return out
+
+    @property
+    def exhausted(self) -> bool:
+        return self.done and not self._pending
+
+    def close(self):
+        self.done = True
+        self._event.set()
+
+class TickFileSource(StreamSource):
+    """
+    CSV 回放：ts,symbol,price,volume（ts 為 epoch 秒，volume 為當日累計成交量，可留空）；
+    可另加 name、prev_close 欄（留空 = 沿用底稿），沒網路也能還原完整的警示內容。
+    speed=1 依原始間隔播放、speed=60 快轉 60 倍、speed=0 盡快播完。
+    """
+    replay = True
+
+    def __init__(self, path: str, speed: float = 0.0, window_s: float = 0.5):
+        super().__init__(window_s)
+        self.path = path
+        self.speed = speed
+        self._t = threading.Thread(target=self._run, name="tick-replay", daemon=True)
+
+    def wait(self, timeout: float) -> Dict[str, Quote]:
+        if self._t.ident is None:       # 第一次 wait 才開始播：seed() 的底稿先到，第一批 tick 就有名稱 / 昨收
+            self._t.start()
+        return super().wait(timeout)
+
+    def _run(self):
+        prev = None
+        try:
+            with open(self.path, "r", encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    if self.done:
+                        break
+                    ts = float(row["ts"])
+                    if self.speed > 0 and prev is not None and ts > prev:
+                        time.sleep((ts - prev) / self.speed)
+                    prev = ts
+                    vol = row.get("volume")
+                    extra = {}
+                    if row.get("name"):
+                        extra["shortName"] = row["name"]
+                    if row.get("prev_close"):
+                        extra["regularMarketPreviousClose"] = float(row["prev_close"])
+                    self.push(row["symbol"], float(row["price"]), float(vol) if vol else None, ts, **extra)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"[ERROR] tick 檔 {self.path} 讀取失敗：{e}")
+        self.done = True
+        self._event.set()
+
+def make_source(cfg: Dict[str, Any], fetch_bulk, chunk: int):
+    """依 config.json 的 market_data 區塊建立行情來源（預設 Yahoo 輪詢）"""
+    mcfg = cfg.get("market_data", {})
+    kind = mcfg.get("source", "yahoo_poll")
+    if kind == "tick_file":
+        return TickFileSource(mcfg["tick_file"], float(mcfg.get("speed", 1.0)),
+                              float(mcfg.get("window_seconds", 0.5)))
+    if kind != "yahoo_poll":
+        print(f"[WARN] 未知的 market_data.source={kind}，改用 yahoo_poll")
+    return YahooPoller(fetch_bulk, chunk)
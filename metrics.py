@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+metrics.py — 掃描熱路徑的計時 / 計數，輸出 Prometheus 文字格式（不依賴 prometheus_client）
+- stage(name)：各階段耗時直方圖（quote_fetch / chart_fetch / indicators / rules / push ...）
+- inc(name, **labels)：計數器（快取命中、HTTP 錯誤 / 逾時、LINE 請求）
+- set_gauge(name, v)：最新值（本輪耗時、落後 poll_seconds 多少）
+- start_server(port)：內建 HTTP 伺服器提供 /metrics
+- install_profile_signal()：送 SIGUSR1 開始 cProfile，再送一次停止並寫出 .prof
+- take() / merge()：分片子行程每輪把計數器 / 直方圖的增量送回協調端，併進同一個 /metrics
+"""
+import os, signal, threading, time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Sequence, Tuple
+
+PREFIX = "xq_"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+HELP = {
+    "stage_seconds": "掃描各階段耗時",
+    "cycle_seconds": "整輪掃描耗時",
+    "shard_seconds": "分片子行程每輪耗時",
+    "http_seconds": "單一 HTTP 請求耗時",
+    "chart_cache_total": "K 線快取查詢（hit / stale 背景更新 / coalesced 已在途 / tail 增量 / full 整段）",
+    "chart_fetch_failures_total": "K 線抓取失敗（進入退避）",
+    "http_requests_total": "對外 HTTP 請求結果（ok / http_error / timeout / error）",
+    "line_requests_total": "LINE Messaging API 請求結果",
+    "line_messages_total": "推播訊息（queued 已排入佇列 / skipped 未設定 token 或收件人而略過）",
+    "cycles_total": "已完成的掃描輪數",
+    "ticks_total": "串流來源收到的 tick 數",
+    "cycle_last_seconds": "最近一輪耗時",
+    "cycle_lag_seconds": "最近一輪超出 poll_seconds 的秒數",
+    "session_open": "目前是否在交易時段內（1 / 0）",
+    "eval_staleness_seconds": "排程器：各代號距上次評估的秒數（stat = max / p90 / p50 / mean）",
+    "eval_never_symbols": "排程器：從未評估過的代號數",
+}
+
+def _key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+def _fmt_num(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+class Registry:
+    def __init__(self, buckets: Sequence[float] = BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._hists: Dict[str, Dict[LabelKey, List[float]]] = {}   # [各 bucket 次數..., sum, count]
+
+    def inc(self, name: str, n: float = 1, **labels):
+        with self._lock:
+            d = self._counters.setdefault(name, {})
+            k = _key(labels)
+            d[k] = d.get(k, 0) + n
+
+    def set_gauge(self, name: str, v: float, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_key(labels)] = float(v)
+
+    def observe(self, name: str, v: float, **labels):
+        with self._lock:
+            d = self._hists.setdefault(name, {})
+            k = _key(labels)
+            h = d.get(k)
+            if h is None:
+                h = d[k] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if v <= b:
+                    h[i] += 1
+                    break
+            h[-2] += v
+            h[-1] += 1
+
+    def take(self) -> Dict[str, Any]:
+        """取出並清空計數器 / 直方圖（量表只反映本行程，不送）"""
+        with self._lock:
+            out = {"counters": self._counters, "hists": self._hists}
+            self._counters, self._hists = {}, {}
+        return out
+
+    def merge(self, delta: Dict[str, Any]):
+        """把另一個 registry take() 出來的增量加進來（bucket 設定相同）"""
+        with self._lock:
+            for name, d in delta.get("counters", {}).items():
+                mine = self._counters.setdefault(name, {})
+                for k, v in d.items():
+                    mine[k] = mine.get(k, 0) + v
+            for name, d in delta.get("hists", {}).items():
+                mine = self._hists.setdefault(name, {})
+                for k, h in d.items():
+                    cur = mine.get(k)
+                    if cur is None:
+                        mine[k] = list(h)
+                    else:
+                        for i, x in enumerate(h):
+                            cur[i] += x
+
+    def value(self, name: str, **labels) -> float:
+        """計數器 / 量表目前值（除錯、bench 用）"""
+        k = _key(labels)
+        with self._lock:
+            for d in (self._counters, self._gauges):
+                if name in d and k in d[name]:
+                    return d[name][k]
+        return 0.0
+
+    def render(self) -> str:
+        out = []
+        with self._lock:
+            for kind, table in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted(table):
+                    full = PREFIX + name
+                    out.append(f"# HELP {full} {HELP.get(name, name)}")
+                    out.append(f"# TYPE {full} {kind}")
+                    for k, v in sorted(table[name].items()):
+                        out.append(f"{full}{_fmt_labels(k)} {_fmt_num(v)}")
+            for name in sorted(self._hists):
+                full = PREFIX + name
+                out.append(f"# HELP {full} {HELP.get(name, name)}")
+                out.append(f"# TYPE {full} histogram")
+                for k, h in sorted(self._hists[name].items()):
+                    acc = 0.0
+                    for b, c in zip(self.buckets, h):
+                        acc += c
+                        out.append(f"{full}_bucket{_fmt_labels(k, [('le', _fmt_num(b))])} {_fmt_num(acc)}")
+                    out.append(f"{full}_bucket{_fmt_labels(k, [('le', '+Inf')])} {_fmt_num(h[-1])}")
+                    out.append(f"{full}_sum{_fmt_labels(k)} {_fmt_num(h[-2])}")
+                    out.append(f"{full}_count{_fmt_labels(k)} {_fmt_num(h[-1])}")
+        return "\n".join(out) + "\n"
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+set_gauge = REGISTRY.set_gauge
+observe = REGISTRY.observe
+
+@contextmanager
+def stage(name: str):
+    """with stage("rules"): ... → stage_seconds{stage="rules"}"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe("stage_seconds", time.perf_counter() - t0, stage=name)
+
+def record_cycle(secs: float, poll_seconds: float):
+    REGISTRY.observe("cycle_seconds", secs)
+    REGISTRY.set_gauge("cycle_last_seconds", secs)
+    REGISTRY.set_gauge("cycle_lag_seconds", max(0.0, secs - poll_seconds))
+    REGISTRY.inc("cycles_total")
+
+def record_staleness(sl: Dict[str, float]):
+    """QuoteDiffScheduler.staleness() 的結果"""
+    for stat in ("max", "p90", "p50", "mean"):
+        REGISTRY.set_gauge("eval_staleness_seconds", sl[stat], stat=stat)
+    REGISTRY.set_gauge("eval_never_symbols", sl["never"])
+
+# ---------------- /metrics ----------------
+def start_server(port: int, host: str = "0.0.0.0", registry: Registry = REGISTRY):
+    """回傳 ThreadingHTTPServer（http.server 只有開 /metrics 時才載入）"""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class H(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] == "/metrics":
+                body = registry.render().encode("utf-8")
+                ctype = "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path == "/healthz":
+                body, ctype = b"ok", "text/plain"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer((host, port), H)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="metrics", daemon=True).start()
+    print(f"[INFO] metrics 伺服器：http://{host}:{srv.server_address[1]}/metrics")
+    return srv
+
+# ---------------- cProfile ----------------
+class _ProfileToggle:
+    def __init__(self, out_dir: str, top: int):
+        self.out_dir = out_dir
+        self.top = top
+        self.prof: Any = None       # cProfile.Profile，第一次收到訊號才載入 cProfile / pstats
+
+    def __call__(self, signum, frame):
+        import cProfile, io, pstats
+        if self.prof is None:
+            self.prof = cProfile.Profile()
+            self.prof.enable()
+            print("[INFO] cProfile 開始（再送一次同一訊號停止並輸出）")
+            return
+        self.prof.disable()
+        path = os.path.join(self.out_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        self.prof.dump_stats(path)
+        buf = io.StringIO()
+        pstats.Stats(self.prof, stream=buf).sort_stats("cumulative").print_stats(self.top)
+        print(f"[INFO] cProfile 已寫出 {path}\n{buf.getvalue()}")
+        self.prof = None
+
+def install_profile_signal(signame: str = "SIGUSR1", out_dir: str = ".", top: int = 25) -> bool:
+    """掃描迴圈在主執行緒，訊號處理也在主執行緒，所以 profile 到的就是掃描本身"""
+    sig = getattr(signal, signame, None)
+    if sig is None:
+        print(f"[WARN] 此平台沒有 {signame}，略過 cProfile 訊號")
+        return False
+    signal.signal(sig, _ProfileToggle(out_dir, top))
+    return True
@@ -6,12 +6,13 @@
 import os
 import re
 import requests
-import pandas as pd
-from io import StringIO
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from requests.exceptions import RequestException
 
+from isin_parser import decode_page, parse_isin_rows, read_page
+from symbol_meta import build_meta, save_meta
+
 TWSE_HTTP = "http://isin.twse.com.tw/isin/C_public.jsp?strMode=2"
 TPEX_HTTP = "http://isin.twse.com.tw/isin/C_public.jsp?strMode=4"
 TWSE_HTTPS = "https://isin.twse.com.tw/isin/C_public.jsp?strMode=2"
@@ -32,9 +33,8 @@ def _session():
 def _fetch(url: str) -> str:
     s = _session()
     r = s.get(url, timeout=25, verify=False)  # 放寬驗證避免 SSL 問題
-    r.encoding = "utf-8"
     r.raise_for_status()
-    return r.text
+    return decode_page(r.content)             # 頁面是 Big5 / MS950，不是 utf-8
 
 def _get_html_pair():
     # 1) HTTP 優先
@@ -61,34 +61,37 @@ def _get_html_pair():
     if not (os.path.exists("twse.html") and os.path.exists("tpex.html")):
         raise RuntimeError("網路抓取失敗，且找不到本機 twse.html / tpex.html")
     print("[INFO] 讀取本機 twse.html / tpex.html ...")
-    with open("twse.html", "r", encoding="utf-8", errors="ignore") as f:
-        twse_html = f.read()
-    with open("tpex.html", "r", encoding="utf-8", errors="ignore") as f:
-        tpex_html = f.read()
-    return twse_html, tpex_html
+    return read_page("twse.html"), read_page("tpex.html")
+
+def _extract_rows_from_html(html: str):
+    """回傳 [(代號, 名稱, 市場別), ...]，只取 4 碼代號的列"""
+    return parse_isin_rows(html)
 
 def _extract_codes_from_html(html: str):
-    try:
-        dfs = pd.read_html(StringIO(html))
-    except ValueError:
-        return []
-    if not dfs:
-        return []
-    df = dfs[0]
-    # 第一欄通常是「1101　台泥」；將全形空白換成半形，正則取前 4 碼
-    first_col = df.iloc[:, 0].astype(str).str.replace("\u3000", " ", regex=False)
-    codes = first_col.str.extract(r"^\s*(\d{4})\b")[0].dropna().tolist()
-    return codes
+    return [r[0] for r in _extract_rows_from_html(html)]
 
-def refresh_symbols_all() -> int:
+def _fetch_rows():
     twse_html, tpex_html = _get_html_pair()
-    codes_twse = _extract_codes_from_html(twse_html)
-    codes_tpex = _extract_codes_from_html(tpex_html)
+    return _extract_rows_from_html(twse_html), _extract_rows_from_html(tpex_html)
+
+def refresh_symbols_meta() -> int:
+    """只重建 symbols_meta.json（symbols_all.txt 已在、meta 不在時用，不動清單）；回傳筆數"""
+    rows_twse, rows_tpex = _fetch_rows()
+    meta = build_meta({"TWSE": rows_twse, "TPEX": rows_tpex})
+    save_meta(meta)
+    return len(meta)
+
+def refresh_symbols_all() -> int:
+    rows_twse, rows_tpex = _fetch_rows()
+    codes_twse = [r[0] for r in rows_twse]
+    codes_tpex = [r[0] for r in rows_tpex]
 
     all_codes = sorted(set(codes_twse + codes_tpex), key=lambda x: int(x))
     with open("symbols_all.txt", "w", encoding="utf-8") as f:
         for c in all_codes:
             f.write(c + "\n")
+    # 市場別已在頁面上（strMode=2 上市、4 上櫃），順手存下來，啟動時就不必線上試 .TW/.TWO
+    save_meta(build_meta({"TWSE": rows_twse, "TPEX": rows_tpex}))
 
     print(f"[OK] symbols_all.txt updated: {len(all_codes)} codes "
           f"(TWSE {len(codes_twse)}, TPEX {len(codes_tpex)})")
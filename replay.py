@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+replay.py — 離線回放 / 回測：把日 K 一根一根餵進與 main() 相同的串流指標與 R1–R8 規則引擎，
+記錄每次觸發並統計各規則訊號數與吞吐量（bars/s），也可當整條管線的可重現效能基準。
+週線與 main() 相同由 weekly_bars 從日線即時彙整（當週最後一根日 K 就是週 K 的收盤），不會偷看未來。
+
+用法：
+  python replay.py --synthetic 2000 --bars 250          # 合成資料
+  python replay.py --db bars.db [--symbols 2330.TW,...]  # bar_store 錄下來的日 K
+  加 --out triggers.csv 輸出每筆觸發
+"""
+import argparse, csv, datetime, json, math, random, time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from bar_series import BarSeries
+from rule_engine import feature_row, evaluate, match_all, require_all, to_matrix, FEATURES
+from series_feed import SymbolIndicators
+from tw_time import day_date, tw_day
+
+def synthetic_series(n_sym: int, n_bar: int, seed: int = 7) -> Dict[str, Dict[str, list]]:
+    """幾何布朗運動收盤 + 對數常態成交量，交易日為週一～週五"""
+    rnd = random.Random(seed)
+    days, d = [], datetime.date(2024, 1, 2)
+    while len(days) < n_bar:
+        if d.weekday() < 5:
+            days.append(int(datetime.datetime(d.year, d.month, d.day, 1, 0).timestamp()))
+        d += datetime.timedelta(days=1)
+    out = {}
+    for i in range(n_sym):
+        p = rnd.uniform(10, 600)
+        drift, vol = rnd.gauss(0.0003, 0.0005), rnd.uniform(0.01, 0.03)
+        close, volume = [], []
+        for _ in days:
+            p *= math.exp(rnd.gauss(drift, vol))
+            close.append(round(p, 2))
+            volume.append(int(rnd.lognormvariate(13.5, 1.0)))
+        out[f"{1000 + i}.TW"] = {"ts": list(days), "close": close, "volume": volume}
+    return out
+
+def recorded_series(db_path: str, symbols: Optional[List[str]] = None) -> Dict[str, Dict[str, list]]:
+    from bar_store import BarStore
+    store = BarStore(db_path, max_mb=0)
+    out = {}
+    for (sym, interval), ent in store.load_all().items():
+        if interval == "1d" and (not symbols or sym in symbols) and ent["ts"]:
+            out[sym] = {"ts": ent["ts"], "close": ent["close"], "volume": ent["volume"]}
+    store.close()
+    return out
+
+def replay(series: Dict[str, Dict[str, list]], cfg: Dict[str, Any], out_csv: Optional[str] = None) -> Dict[str, Any]:
+    syms = list(series)
+    by_day: Dict[int, List[tuple]] = {}
+    for sym in syms:
+        s = series[sym]
+        for i, ts in enumerate(s["ts"]):
+            by_day.setdefault(tw_day(ts), []).append((sym, i))     # 以台北日期對齊各檔 K 棒
+
+    inds = {sym: SymbolIndicators(cfg["macd"]) for sym in syms}
+    d_ent = {sym: BarSeries(gen=1) for sym in syms}
+    counts, turn_on = Counter(), Counter()
+    prev_hit: Dict[tuple, bool] = {}
+    writer, fh = None, None
+    if out_csv:
+        fh = open(out_csv, "w", newline="", encoding="utf-8")
+        writer = csv.writer(fh)
+        writer.writerow(["date", "symbol", "rule", "price"])
+
+    all_mode = match_all(cfg)
+    n_bars = 0
+    t0 = time.perf_counter()
+    for day in sorted(by_day):
+        active = by_day[day]
+        rows = []
+        for sym, i in active:
+            s = series[sym]
+            ts, c = s["ts"][i], s["close"][i]
+            v = s["volume"][i]
+            d = d_ent[sym]
+            d.ts.append(ts)
+            for col in (d.open, d.high, d.low, d.close):        # 只有收盤價，開高低都用收盤
+                col.append(c)
+            d.volume.append(float("nan") if v is None else v)
+            ind = inds[sym]
+            ma5_st, ma34_st, macd_st = ind.daily.sync(d)
+            (ma5w_st,) = ind.weekly.sync(ind.wbars.sync(d))
+            rows.append(feature_row(c, v, macd_st.values[2], ma34_st.values,
+                                    ma5w_st.values, ma5_st.values))
+        n_bars += len(active)
+        hits, rids = evaluate(cfg, to_matrix(rows))
+        if all_mode:                # 與 scan_cycle 相同：全部規則模式只留整列都命中的代號
+            hits = require_all(hits)
+        for k, (sym, _) in enumerate(active):
+            for j, rid in enumerate(rids):
+                hit = bool(hits[k, j])
+                if hit:
+                    counts[rid] += 1
+                    if not prev_hit.get((sym, rid)):
+                        turn_on[rid] += 1
+                    if writer:
+                        date = day_date(day).isoformat()
+                        writer.writerow([date, sym, rid, rows[k][FEATURES.index("price")]])
+                prev_hit[(sym, rid)] = hit
+    elapsed = time.perf_counter() - t0
+    if fh:
+        fh.close()
+    return {"symbols": len(syms), "days": len(by_day), "bars": n_bars, "elapsed": elapsed,
+            "bars_per_s": n_bars / elapsed if elapsed else 0.0,
+            "signals": dict(counts), "turn_on": dict(turn_on), "rules": rids if by_day else []}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default="config.json")
+    ap.add_argument("--synthetic", type=int, default=0, help="合成 N 檔")
+    ap.add_argument("--bars", type=int, default=250)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--db", default="bars.db")
+    ap.add_argument("--symbols", default="", help="逗號分隔的 Yahoo 代號（只回放這些）")
+    ap.add_argument("--out", default="", help="觸發明細 CSV")
+    args = ap.parse_args()
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+
+    t0 = time.perf_counter()
+    if args.synthetic:
+        series = synthetic_series(args.synthetic, args.bars, args.seed)
+        src = f"合成 {args.synthetic} 檔 × {args.bars} 根（seed={args.seed}）"
+    else:
+        series = recorded_series(args.db, [s for s in args.symbols.split(",") if s])
+        src = f"{args.db}（{len(series)} 檔）"
+    load_s = time.perf_counter() - t0
+
+    res = replay(series, cfg, args.out or None)
+    print(f"[REPLAY] 資料：{src}，載入 {load_s:.2f}s")
+    print(f"[REPLAY] {res['bars']:,} 根日 K / {res['days']} 個交易日，耗時 {res['elapsed']:.2f}s"
+          f" → {res['bars_per_s']:,.0f} bars/s")
+    print(f"{'規則':<6}{'觸發根數':>10}{'新觸發':>10}{'命中率':>10}")
+    for rid in res["rules"]:
+        n = res["signals"].get(rid, 0)
+        print(f"{rid:<6}{n:>10,}{res['turn_on'].get(rid, 0):>10,}{(n / res['bars'] if res['bars'] else 0):>10.2%}")
+
+if __name__ == "__main__":
+    main()
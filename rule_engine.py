@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+rule_engine.py — 整批向量化規則判斷
+每檔代號先濃縮成一列特徵（報價 + 各指標最後幾個值），整批一次算出
+「代號 × 規則」布林命中矩陣；訊息字串只替通過冷卻的命中格呼叫 rules.py 產生。
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rules import (r1_macd_combo, r2_ma34_up_daily, r3_weekly_ma5_pattern, r4_daily_ma5_up,
+                   r5_within_pct_to_ma5, r6_price_gt, r7_volume_gt, r8_price_gt_ma5)
+
+# (config.json rules 的 key, 規則代號) — 順序即訊息中的順序
+RULES: List[Tuple[str, str]] = [
+    ("r1_macd_combo", "R1"),
+    ("r2_ma34_up_daily", "R2"),
+    ("r3_weekly_ma5_pattern", "R3"),
+    ("r4_daily_ma5_up", "R4"),
+    ("r5_within_0_to_4pct_of_ma5", "R5"),
+    ("r6_price_gt_20", "R6"),
+    ("r7_volume_gt_1000_lots", "R7"),
+    ("r8_price_gt_ma5", "R8"),
+]
+
+# 特徵欄位：_2 = 前一根、_1 = 最新一根、_3 = 再前一根
+FEATURES = ("price", "vol", "hist_2", "hist_1", "ma34_2", "ma34_1",
+            "ma5w_3", "ma5w_2", "ma5w_1", "ma5d_2", "ma5d_1")
+_F = {name: i for i, name in enumerate(FEATURES)}
+
+def _last(vals: Sequence[Optional[float]], k: int) -> Optional[float]:
+    return vals[-k] if len(vals) >= k else None
+
+def feature_row(price, vol_now, hist_d, ma34_d, ma5_w, ma5_d) -> Tuple:
+    """單檔特徵列；各指標傳最後幾個值（list，None 表缺值）即可"""
+    return (price, vol_now,
+            _last(hist_d, 2), _last(hist_d, 1),
+            _last(ma34_d, 2), _last(ma34_d, 1),
+            _last(ma5_w, 3), _last(ma5_w, 2), _last(ma5_w, 1),
+            _last(ma5_d, 2), _last(ma5_d, 1))
+
+def enabled_rules(cfg: Dict[str, Any]) -> List[Tuple[str, str]]:
+    return [(key, rid) for key, rid in RULES if cfg["rules"].get(key, True)]
+
+def to_matrix(rows: Sequence[Tuple]) -> np.ndarray:
+    if not rows:
+        return np.empty((0, len(FEATURES)))
+    return np.array(rows, dtype=float)          # None → NaN
+
+def _masks(cfg: Dict[str, Any], F: np.ndarray) -> Dict[str, np.ndarray]:
+    col = lambda name: F[:, _F[name]]
+    ok = lambda *names: np.logical_and.reduce([~np.isnan(col(n)) for n in names])
+    price, vol = col("price"), col("vol")
+    h_prev, h_now = col("hist_2"), col("hist_1")
+    m34p, m34 = col("ma34_2"), col("ma34_1")
+    w3, w2, w1 = col("ma5w_3"), col("ma5w_2"), col("ma5w_1")
+    m5p, m5 = col("ma5d_2"), col("ma5d_1")
+    eps = float(cfg["macd"].get("eps", 1e-6))
+    pmin, pmax = cfg["diff_to_ma5_pct"]["min"], cfg["diff_to_ma5_pct"]["max"]
+    # 比較遇到 NaN 一律為 False，對應單檔規則遇 None 回 None
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cond1 = (h_now < -eps) & (h_prev < -eps) & (h_now > h_prev + eps)
+        cond2 = (h_prev < -eps) & (h_now >= -eps)
+        cond3 = (h_now > eps) & (h_prev > eps) & (h_now > h_prev + eps)
+        diff_pct = (price - m5) / m5 * 100.0
+        return {
+            "R1": ok("hist_2", "hist_1") & (cond1 | cond2 | cond3),
+            "R2": ok("ma34_2", "ma34_1") & (m34 > m34p),
+            "R3": ok("ma5w_3", "ma5w_2", "ma5w_1") & (w2 >= w3) & (w1 > w2),
+            "R4": ok("ma5d_2", "ma5d_1") & (m5 > m5p),
+            "R5": ok("price", "ma5d_1") & (diff_pct >= pmin) & (diff_pct <= pmax),
+            "R6": ok("price") & (price > cfg["limits"]["price_min"]),
+            "R7": ok("vol") & (vol > cfg["limits"]["min_volume_shares"]),
+            "R8": ok("price", "ma5d_1") & (price > m5),
+        }
+
+def evaluate(cfg: Dict[str, Any], F: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+    """回傳 (hits[代號, 規則] 布林矩陣, 規則代號list)，只含 cfg 啟用的規則"""
+    rules = enabled_rules(cfg)
+    rids = [rid for _, rid in rules]
+    if not rids or F.shape[0] == 0:
+        return np.zeros((F.shape[0], len(rids)), dtype=bool), rids
+    masks = _masks(cfg, F)
+    return np.column_stack([masks[rid] for rid in rids]), rids
+
+# ---------------- 預篩（只靠報價） ----------------
+# R6/R7 只看報價即可完整判斷；R5/R8 至少需要有價格。
+# 「全部規則都要成立」模式下，這些必要條件不過的代號不必再抓 K 線、算指標。
+QUOTE_ONLY = ("R6", "R7")
+QUOTE_NEEDS = {"R5": ("price",), "R8": ("price",)}
+
+def match_all(cfg: Dict[str, Any]) -> bool:
+    return str(cfg.get("match_mode", "any")).lower() == "all"
+
+def prefilter(cfg: Dict[str, Any], prices: Sequence, vols: Sequence) -> np.ndarray:
+    """回傳布林陣列：True = 仍可能全部規則成立（需要進下一階段）"""
+    n = len(prices)
+    F = np.full((n, len(FEATURES)), np.nan)
+    if n:
+        F[:, _F["price"]] = np.array(prices, dtype=float)
+        F[:, _F["vol"]] = np.array(vols, dtype=float)
+    keep = np.ones(n, dtype=bool)
+    rids = [rid for _, rid in enabled_rules(cfg)]
+    if any(rid in QUOTE_ONLY for rid in rids):
+        masks = _masks(cfg, F)
+        for rid in rids:
+            if rid in QUOTE_ONLY:
+                keep &= masks[rid]
+    for rid in rids:
+        for name in QUOTE_NEEDS.get(rid, ()):
+            keep &= ~np.isnan(F[:, _F[name]])
+    return keep
+
+def require_all(hits: np.ndarray) -> np.ndarray:
+    """全部規則模式：只保留整列都命中的代號"""
+    if hits.shape[1] == 0:
+        return hits
+    return hits & hits.all(axis=1, keepdims=True)
+
+def _opt(x: float) -> Optional[float]:
+    return None if x != x else float(x)
+
+def format_hit(cfg: Dict[str, Any], rid: str, row: Sequence[float]) -> Optional[str]:
+    """命中格 → 訊息字串（沿用 rules.py，文字與逐檔判斷完全相同）"""
+    f = {name: _opt(row[i]) for name, i in _F.items()}
+    price = f["price"]
+    if rid == "R1":
+        return r1_macd_combo(cfg, [f["hist_2"], f["hist_1"]])
+    if rid == "R2":
+        return r2_ma34_up_daily([f["ma34_2"], f["ma34_1"]])
+    if rid == "R3":
+        return r3_weekly_ma5_pattern([f["ma5w_3"], f["ma5w_2"], f["ma5w_1"]])
+    if rid == "R4":
+        return r4_daily_ma5_up([f["ma5d_2"], f["ma5d_1"]])
+    if rid == "R5":
+        return r5_within_pct_to_ma5(price, f["ma5d_1"],
+                                    cfg["diff_to_ma5_pct"]["min"], cfg["diff_to_ma5_pct"]["max"])
+    if rid == "R6":
+        return r6_price_gt(price, cfg["limits"]["price_min"])
+    if rid == "R7":
+        return r7_volume_gt(int(f["vol"]) if f["vol"] is not None else None,
+                            cfg["limits"]["min_volume_shares"])
+    if rid == "R8":
+        return r8_price_gt_ma5(price, f["ma5d_1"])
+    return None
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# rules.py — R1–R8 單檔規則（回傳觸發訊息字串或 None）
+from typing import List, Optional
+
+def r1_macd_combo(cfg, hist: List[Optional[float]]) -> Optional[str]:
+    if len(hist) < 2:
+        return None
+    eps = float(cfg["macd"].get("eps", 1e-6))
+    h_now, h_prev = hist[-1], hist[-2]
+    if h_now is None or h_prev is None:
+        return None
+    cond1 = (h_now < -eps) and (h_prev < -eps) and (h_now > h_prev + eps)
+    cond2 = (h_prev < -eps) and (h_now >= -eps)
+    cond3 = (h_now > eps) and (h_prev > eps) and (h_now > h_prev + eps)
+    if cond1 or cond2 or cond3:
+        tag = "綠柱縮短" if cond1 else ("綠轉紅" if cond2 else "紅柱變大")
+        return f"R1 MACD {tag} (hist 前:{h_prev:.5f} 今:{h_now:.5f})"
+    return None
+
+def r2_ma34_up_daily(ma34: List[Optional[float]]) -> Optional[str]:
+    if len(ma34) < 2 or ma34[-1] is None or ma34[-2] is None:
+        return None
+    return "R2 日34MA上揚" if ma34[-1] > ma34[-2] else None
+
+def r3_weekly_ma5_pattern(ma5w: List[Optional[float]]) -> Optional[str]:
+    if len(ma5w) < 3 or None in (ma5w[-1], ma5w[-2], ma5w[-3]):
+        return None
+    return "R3 週5MA型態成立" if (ma5w[-2] >= ma5w[-3] and ma5w[-1] > ma5w[-2]) else None
+
+def r4_daily_ma5_up(ma5d: List[Optional[float]]) -> Optional[str]:
+    if len(ma5d) < 2 or None in (ma5d[-1], ma5d[-2]):
+        return None
+    return "R4 日5MA上揚" if ma5d[-1] > ma5d[-2] else None
+
+def r5_within_pct_to_ma5(price: float, ma5d_last: Optional[float], pct_min: float, pct_max: float) -> Optional[str]:
+    if ma5d_last is None or price is None:
+        return None
+    diff_pct = (price - ma5d_last) / ma5d_last * 100.0
+    return (f"R5 價距日5MA {diff_pct:.2f}% 在 {pct_min}~{pct_max}%"
+            if (diff_pct >= pct_min and diff_pct <= pct_max) else None)
+
+def r6_price_gt(price: float, thr: float) -> Optional[str]:
+    if price is None:
+        return None
+    return f"R6 價>{thr}" if price > thr else None
+
+def r7_volume_gt(vol_now: Optional[int], min_shares: int) -> Optional[str]:
+    if vol_now is None:
+        return None
+    return (f"R7 量 {vol_now:,} > {min_shares:,} 股" if vol_now > min_shares else None)
+
+def r8_price_gt_ma5(price: float, ma5d_last: Optional[float]) -> Optional[str]:
+    if ma5d_last is None or price is None:
+        return None
+    return (f"R8 價>{ma5d_last:.2f}(日5MA)" if price > ma5d_last else None)
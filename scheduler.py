@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+scheduler.py — 報價差異排程
+每輪先整批報價全市場（50 檔一個 request，很便宜），再依「距上次評估的價量變化、
+離規則門檻多近、多久沒評估」排序，把 K 線 / 指標預算花在最可能翻轉的代號上。
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+class QuoteDiffScheduler:
+    def __init__(self, symbols: Sequence[str], max_staleness_s: float = 900.0):
+        self.symbols = list(symbols)
+        self.pos = {s: i for i, s in enumerate(self.symbols)}
+        self.max_staleness_s = float(max_staleness_s)
+        n = len(self.symbols)
+        self.last_eval = np.full(n, np.nan)     # 上次評估時間（NaN = 從未評估）
+        self.last_price = np.full(n, np.nan)
+        self.last_vol = np.full(n, np.nan)
+        self.last_ma5 = np.full(n, np.nan)      # 上次評估時的日 5MA，用來估 R5/R8 距離
+
+    def _quote_arrays(self, quotes: Dict[str, Dict[str, Any]]):
+        price = np.full(len(self.symbols), np.nan)
+        vol = np.full(len(self.symbols), np.nan)
+        for i, s in enumerate(self.symbols):
+            q = quotes.get(s)
+            if not q:
+                continue
+            p = q.get("regularMarketPrice") or q.get("postMarketPrice") or q.get("preMarketPrice")
+            v = q.get("regularMarketVolume")
+            if p is not None:
+                price[i] = p
+            if v is not None:
+                vol[i] = v
+        return price, vol
+
+    def scores(self, quotes: Dict[str, Dict[str, Any]], cfg: Dict[str, Any], now: float) -> np.ndarray:
+        price, vol = self._quote_arrays(quotes)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # 1) 距上次評估的變化：價格 %、成交量相對增幅
+            move = np.abs(price - self.last_price) / self.last_price * 100.0
+            vol_up = np.clip((vol - self.last_vol) / np.maximum(self.last_vol, 1.0), 0, 5)
+            # 2) 離門檻多近（越近越可能翻轉），距離以 % 計
+            pmin = float(cfg["limits"]["price_min"])
+            vmin = float(cfg["limits"]["min_volume_shares"])
+            near = np.fmax(1.0 / (1.0 + np.abs(price - pmin) / pmin * 100.0),
+                           1.0 / (1.0 + np.abs(vol - vmin) / vmin * 100.0))
+            diff = (price - self.last_ma5) / self.last_ma5 * 100.0
+            lo, hi = cfg["diff_to_ma5_pct"]["min"], cfg["diff_to_ma5_pct"]["max"]
+            band = np.fmin(np.abs(diff - lo), np.abs(diff - hi))
+            near = np.fmax(near, 1.0 / (1.0 + band))
+            # 3) 多久沒評估：線性老化，超過上限直接排最前
+            age = now - self.last_eval
+        score = np.nan_to_num(move) + np.nan_to_num(vol_up) + np.nan_to_num(near)
+        score += np.nan_to_num(age / self.max_staleness_s)
+        score[np.isnan(self.last_eval)] = np.inf
+        score[age >= self.max_staleness_s] += 1e6
+        return score
+
+    def pick(self, quotes: Dict[str, Dict[str, Any]], cfg: Dict[str, Any], budget: int, now: float) -> List[str]:
+        """依分數挑出本輪要做 K 線 / 指標的代號（最多 budget 檔）"""
+        if budget >= len(self.symbols):
+            return list(self.symbols)
+        score = self.scores(quotes, cfg, now)
+        idx = np.argpartition(-score, budget - 1)[:budget]
+        idx = idx[np.argsort(-score[idx], kind="stable")]
+        return [self.symbols[i] for i in idx]
+
+    def mark(self, symbols: Sequence[str], prices: Sequence, vols: Sequence,
+             ma5s: Optional[Sequence], now: float):
+        """記錄本輪評估結果（之後以此為基準算變化量）"""
+        for k, s in enumerate(symbols):
+            i = self.pos.get(s)
+            if i is None:
+                continue
+            self.last_eval[i] = now
+            if prices[k] is not None:
+                self.last_price[i] = prices[k]
+            if vols[k] is not None:
+                self.last_vol[i] = vols[k]
+            if ma5s is not None and ma5s[k] is not None and ma5s[k] == ma5s[k]:
+                self.last_ma5[i] = ma5s[k]
+
+    def staleness(self, now: float) -> Dict[str, float]:
+        """各代號距上次評估的秒數統計；never = 從未評估的檔數"""
+        seen = ~np.isnan(self.last_eval)
+        age = now - self.last_eval[seen]
+        if not age.size:
+            return {"max": 0.0, "p50": 0.0, "p90": 0.0, "mean": 0.0, "never": int((~seen).sum())}
+        return {"max": float(age.max()), "p50": float(np.percentile(age, 50)),
+                "p90": float(np.percentile(age, 90)), "mean": float(age.mean()),
+                "never": int((~seen).sum())}
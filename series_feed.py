@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+series_feed.py — 每檔代號的串流指標狀態（SeriesFeed / SymbolIndicators）
+獨立成模組：啟動快照 pickle 這些物件時記下的是 series_feed.*，
+不管 xq_alert_bot 是當腳本還是模組載入、在主行程還是分片子行程，都讀得回來。
+"""
+from typing import Any, Dict, Optional, Tuple
+
+from indicators import RollingSMA, MACDState
+from weekly_bars import WeeklyResampler
+
+def _make_states(specs):
+    out = []
+    for kind, *args in specs:
+        out.append(RollingSMA(*args) if kind == "sma" else MACDState(*args))
+    return out
+
+class SeriesFeed:
+    """
+    把一條快取 K 線餵給一組串流指標。每次 sync 只對「上次最後一根（可能仍在成形）
+    + 之後新增的」K 棒做 replace_last / update；序列被整段換掉（gen 變了）或對不上時才重新 seed。
+    """
+    __slots__ = ("specs", "states", "gen", "prev_ts")
+
+    def __init__(self, specs):
+        self.specs = specs
+        self.states = None
+        self.gen = None
+        self.prev_ts = None          # 倒數第二根（已完成）K 棒的 ts，用來對齊
+
+    def _tail_pos(self, ent: Dict[str, Any]) -> Optional[int]:
+        """上次最後一根 K 棒在目前序列中的位置；對不上（需重新 seed）回 None"""
+        if self.states is None or self.gen != ent.get("gen") or self.prev_ts is None:
+            return None
+        ts = ent["ts"]
+        j = len(ts) - 1
+        while j >= 0 and ts[j] > self.prev_ts:
+            j -= 1
+        if j >= 0 and ts[j] == self.prev_ts and j + 1 < len(ts):
+            return j + 1
+        return None
+
+    def needs_seed(self, ent: Dict[str, Any]) -> bool:
+        return self._tail_pos(ent) is None
+
+    def adopt(self, states, ent: Dict[str, Any]):
+        ts = ent["ts"]
+        self.states = states
+        self.gen = ent.get("gen")
+        self.prev_ts = ts[-2] if len(ts) >= 2 else None
+        return states
+
+    def sync(self, ent: Dict[str, Any]):
+        pos = self._tail_pos(ent)
+        if pos is None:
+            return self.adopt([st.seed(ent["close"]) for st in _make_states(self.specs)], ent)
+        close = ent["close"]
+        for st in self.states:
+            st.replace_last(close[pos])
+        for v in close[pos+1:]:
+            for st in self.states:
+                st.update(v)
+        self.prev_ts = ent["ts"][-2]
+        return self.states
+
+def indicator_specs(macd_cfg: Dict[str, Any]) -> Tuple[Tuple, Tuple]:
+    """(日線, 週線) 串流指標規格；也是快照裡的指標狀態能不能沿用的指紋"""
+    return ((("sma", 5), ("sma", 34), ("macd", macd_cfg["fast"], macd_cfg["slow"], macd_cfg["signal"])),
+            (("sma", 5),))
+
+class SymbolIndicators:
+    """單一代號的日線（5MA/34MA/MACD）與週線（5MA）串流狀態；週 K 由日 K 彙整（wbars）"""
+    __slots__ = ("daily", "weekly", "wbars")
+
+    def __init__(self, macd_cfg: Dict[str, Any]):
+        daily, weekly = indicator_specs(macd_cfg)
+        self.daily = SeriesFeed(daily)
+        self.weekly = SeriesFeed(weekly)
+        self.wbars = WeeklyResampler()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+# shard_pool.py — 多行程分片：每個子行程固定負責一部分代號的 K 線快取與串流指標，吃滿多核心
+import multiprocessing as mp
+import time, zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+
+def shard_of(y_symbol: str, n_shards: int) -> int:
+    """穩定雜湊：同一檔永遠落在同一個分片（快取 / 指標狀態才留得住）"""
+    return zlib.crc32(y_symbol.encode("utf-8")) % n_shards
+
+def shard_snapshot_path(path: str, shard_id: int, n_shards: int) -> str:
+    """分片數變了快照就對不上，檔名帶上分片數"""
+    return f"{path}.{shard_id}of{n_shards}"
+
+def _worker(conn, shard_id: int, n_shards: int, cfg: Dict[str, Any], chart_specs, symbols: List[str],
+            yahoo_base: Optional[str]):
+    """
+    子行程：載入自己那份快照（沒有才從 bar_store 載），之後每輪收 (metas, chart_specs) → 回特徵列，
+    連同這段期間的計數器 / 直方圖增量（K 線快取、HTTP、chart_fetch / indicators 階段耗時）一起送回；
+    收到 ("snapshot", 路徑) 就把自己的快取 / 指標狀態寫成快照。
+    """
+    import signal
+    import xq_alert_bot as bot
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)      # 由協調端寫完快照後再關掉
+    if yahoo_base:
+        bot.YAHOO_BASE = yahoo_base
+    # 併發數與每 host 限速由各分片平分，整體對 Yahoo 的壓力不變
+    fcfg = cfg.get("fetch", {})
+    bot.configure_fetch_pool(concurrency=max(2, int(fcfg.get("concurrency", 8)) // n_shards),
+                             rate_per_host=float(fcfg.get("rate_per_host", 0)) / n_shards,
+                             timeout=float(fcfg.get("timeout", 20)))
+    bot.configure_chart_cache(cfg)
+    snap_path, max_age = bot.snapshot_settings(cfg)
+    snap = bot.snapshot.load(shard_snapshot_path(snap_path, shard_id, n_shards), max_age) if snap_path else None
+    bot.open_bar_store(cfg, symbols, prune=False, load=snap is None)
+    if snap is not None:
+        bot.restore_snapshot(snap, symbols, cfg)
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if msg is None:
+            break
+        if msg[0] == "snapshot":
+            try:
+                conn.send({"bytes": bot.save_snapshot(msg[1], cfg)})
+            except Exception as e:
+                conn.send({"error": repr(e)})
+            continue
+        metas, specs = msg
+        t0 = time.perf_counter()
+        try:
+            rows, fetched = bot.compute_features(metas, cfg, specs or chart_specs)
+            conn.send({"rows": rows, "fetched": fetched, "secs": time.perf_counter() - t0,
+                       "metrics": metrics.REGISTRY.take()})
+        except Exception as e:
+            conn.send({"error": repr(e), "secs": time.perf_counter() - t0, "metrics": metrics.REGISTRY.take()})
+    if bot._bar_store is not None:
+        bot._bar_store.close()
+
+class ShardPool:
+    """
+    協調端：把候選代號依 shard_of 分給 N 個子行程並行算特徵列，再依原順序拼回。
+    報價、冷卻檢查與 LINE 推播都留在協調端，不會重複推播；子行程的指標增量併進協調端的 /metrics
+    （各分片同時跑，stage_seconds 的 chart_fetch / indicators 是各分片耗時的總和，不是牆鐘時間）。
+    子行程掛掉時重開（從 bar_store 載回），該輪它負責的代號以無指標的特徵列補上。
+    """
+    def __init__(self, workers: int, cfg: Dict[str, Any], chart_specs, symbols: List[str],
+                 yahoo_base: Optional[str] = None):
+        self.n = workers
+        self.cfg = cfg
+        self.chart_specs = chart_specs
+        self.yahoo_base = yahoo_base
+        self.owned: List[List[str]] = [[] for _ in range(workers)]
+        for ysym in symbols:
+            self.owned[shard_of(ysym, workers)].append(ysym)
+        self._ctx = mp.get_context("spawn")      # 主行程已有連線池 / 推播執行緒，不用 fork
+        self.procs: List[Any] = [None] * workers
+        self.conns: List[Any] = [None] * workers
+        for i in range(workers):
+            self._start(i)
+        print(f"[INFO] 分片 {workers} 個子行程，各負責 {[len(o) for o in self.owned]} 檔")
+
+    def _start(self, i: int):
+        parent, child = self._ctx.Pipe()
+        p = self._ctx.Process(target=_worker, name=f"shard-{i}", daemon=True,
+                              args=(child, i, self.n, self.cfg, self.chart_specs, self.owned[i], self.yahoo_base))
+        p.start()
+        child.close()
+        self.procs[i], self.conns[i] = p, parent
+
+    def _restart(self, i: int):
+        print(f"[WARN] 分片 #{i} 子行程異常，重新啟動")
+        try:
+            self.conns[i].close()
+        except OSError:
+            pass
+        if self.procs[i].is_alive():
+            self.procs[i].terminate()
+        self.procs[i].join(5)
+        self._start(i)
+
+    def features(self, metas: List[Dict[str, Any]],
+                 chart_specs=None) -> Tuple[List[Tuple], int, List[Tuple[int, int, float]]]:
+        """回傳 (與 metas 同序的特徵列, 抓的 K 線張數, [(分片, 檔數, 秒數), ...])；chart_specs 省略則用建立時的"""
+        from rule_engine import feature_row
+        parts: List[List[int]] = [[] for _ in range(self.n)]
+        for k, m in enumerate(metas):
+            parts[shard_of(m["ysym"], self.n)].append(k)
+
+        sent = []
+        for i, idxs in enumerate(parts):
+            if not idxs:
+                continue
+            payload = ([metas[k] for k in idxs], chart_specs)
+            try:
+                self.conns[i].send(payload)
+            except (BrokenPipeError, EOFError, OSError):
+                self._restart(i)
+                self.conns[i].send(payload)
+            sent.append(i)
+
+        rows: List[Optional[Tuple]] = [None] * len(metas)
+        fetched, timings = 0, []
+        for i in sent:
+            try:
+                res = self.conns[i].recv()
+            except (EOFError, OSError):
+                res = {"error": "子行程結束", "secs": 0.0}
+                self._restart(i)
+            if "metrics" in res:
+                metrics.REGISTRY.merge(res["metrics"])
+            if "error" in res:
+                print(f"[ERROR] 分片 #{i} 計算失敗：{res['error']}")
+                for k in parts[i]:
+                    rows[k] = feature_row(metas[k]["price"], metas[k]["vol_now"], [], [], [], [])
+            else:
+                for k, row in zip(parts[i], res["rows"]):
+                    rows[k] = row
+                fetched += res["fetched"]
+            timings.append((i, len(parts[i]), res["secs"]))
+        return rows, fetched, timings
+
+    def save_snapshots(self, path: str) -> int:
+        """請各分片寫出自己的快照；回傳總 bytes（失敗的分片略過，下次啟動該分片改走冷啟動）"""
+        asked = []
+        for i, conn in enumerate(self.conns):
+            try:
+                conn.send(("snapshot", shard_snapshot_path(path, i, self.n)))
+                asked.append(i)
+            except (BrokenPipeError, EOFError, OSError):
+                pass
+        total = 0
+        for i in asked:
+            try:
+                res = self.conns[i].recv()
+            except (EOFError, OSError):
+                continue
+            if "error" in res:
+                print(f"[WARN] 分片 #{i} 快照寫出失敗：{res['error']}")
+            else:
+                total += res["bytes"]
+        return total
+
+    def close(self, timeout: float = 10):
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for p in self.procs:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+snapshot.py — 啟動快照：把「可以直接開始掃描」的狀態打包成單一 pickle
+（代號對應、K 線快取、串流指標狀態、冷卻狀態），重新部署後幾百毫秒載回，
+不必重新對應代號、從 bar_store 解 blob、再把全市場指標重新 seed 一遍。
+- save()：先寫暫存檔再 os.replace，寫到一半被砍也不會留下壞檔
+- load()：版本不符 / 超過 max_age_s / 檔案壞掉都回 None，呼叫端照舊冷啟動
+快照只是加速用的快取，真正的持久層仍是 bar_store / cooldown_store。
+"""
+import os, pickle, time
+from typing import Any, Dict, Optional
+
+VERSION = 1
+
+def save(path: str, bundle: Dict[str, Any]) -> int:
+    """寫出快照，回傳 bytes"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump({"version": VERSION, "created": time.time(), **bundle}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    size = os.path.getsize(tmp)
+    os.replace(tmp, path)
+    return size
+
+def load(path: str, max_age_s: float) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            snap = pickle.load(f)
+    except Exception as e:          # 截斷 / 類別改名等：當作沒有快照
+        print(f"[WARN] 快照 {path} 讀取失敗，改走冷啟動：{e!r}")
+        return None
+    if not isinstance(snap, dict) or snap.get("version") != VERSION:
+        print(f"[INFO] 快照 {path} 版本不符，改走冷啟動")
+        return None
+    age = time.time() - snap.get("created", 0)
+    if age > max_age_s:
+        print(f"[INFO] 快照 {path} 已是 {age / 3600:.1f} 小時前，改走冷啟動")
+        return None
+    return snap
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+subscriptions.py — 多使用者訂閱：每人自己的觀察清單與規則組合，SQLite 持久化
+- app.py（Webhook）收到指令 → handle_command 改寫資料庫；資料庫只有 Webhook 這一份
+- 掃描端只掃所有人清單的聯集，命中後用 SubscriberIndex 查「代號 × 規則 → 訂閱者」扇出
+掃描成本因此跟「不重複代號數」成正比，跟使用者人數無關。
+
+掃描端怎麼讀到 Webhook 的資料（config.json/subscriptions/mode）：
+- "http"（預設）：Webhook 與 Worker 是兩個服務、各有自己的磁碟（例如 Render 的 Web Service + Background
+  Worker）。掃描端以 RemoteSubscriptions 定期 GET Webhook 的 /subscriptions（Bearer SUBSCRIPTIONS_TOKEN，
+  ETag 沒變回 304）。Webhook 的 SUBSCRIPTIONS_DB 要放在持久磁碟上，否則重新部署就清空。
+- "sqlite"：兩者跑在同一台機器、讀寫同一個檔（單機部署）；檔案必須已由 Webhook 建立。
+"""
+import json, re, sqlite3, time, zlib
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import requests
+
+from rule_engine import RULES
+
+ALL = "*"                       # 全市場
+RULE_IDS = [rid for _, rid in RULES]
+MAX_SYMBOLS_PER_USER = 300
+_CODE_RE = re.compile(r"^[0-9A-Z]{4,6}$")
+
+class SubscriptionStore:
+    """subs(user, symbol) 與 user_rules(user, rule)；沒有規則列的使用者 = 全部規則"""
+    def __init__(self, path: str = "subscriptions.db"):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS subs (
+                user   TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                ts     REAL NOT NULL,
+                PRIMARY KEY (user, symbol)
+            )""")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS user_rules (
+                user TEXT NOT NULL,
+                rule TEXT NOT NULL,
+                PRIMARY KEY (user, rule)
+            )""")
+        self.db.commit()
+
+    def data_version(self) -> int:
+        """別的連線（Webhook 行程）commit 後會變，掃描端據此決定要不要重建索引"""
+        (v,) = self.db.execute("PRAGMA data_version").fetchone()
+        return v
+
+    # ---- 寫 ----
+    def add(self, user: str, symbols: Iterable[str]) -> int:
+        now = time.time()
+        cur = self.db.executemany("INSERT OR IGNORE INTO subs (user, symbol, ts) VALUES (?, ?, ?)",
+                                  [(user, s, now) for s in symbols])
+        self.db.commit()
+        return cur.rowcount
+
+    def remove(self, user: str, symbols: Iterable[str]) -> int:
+        cur = self.db.executemany("DELETE FROM subs WHERE user = ? AND symbol = ?", [(user, s) for s in symbols])
+        self.db.commit()
+        return cur.rowcount
+
+    def set_rules(self, user: str, rules: Optional[Sequence[str]]):
+        """rules=None → 全部規則"""
+        self.db.execute("DELETE FROM user_rules WHERE user = ?", (user,))
+        if rules:
+            self.db.executemany("INSERT INTO user_rules (user, rule) VALUES (?, ?)", [(user, r) for r in rules])
+        self.db.commit()
+
+    def drop_user(self, user: str):
+        self.db.execute("DELETE FROM subs WHERE user = ?", (user,))
+        self.db.execute("DELETE FROM user_rules WHERE user = ?", (user,))
+        self.db.commit()
+
+    # ---- 讀 ----
+    def symbols_of(self, user: str) -> List[str]:
+        return [s for (s,) in self.db.execute("SELECT symbol FROM subs WHERE user = ? ORDER BY symbol", (user,))]
+
+    def rules_of(self, user: str) -> Optional[List[str]]:
+        rules = [r for (r,) in self.db.execute("SELECT rule FROM user_rules WHERE user = ?", (user,))]
+        return sorted(rules) if rules else None
+
+    def snapshot(self) -> Tuple[List[Tuple[str, str]], Dict[str, List[str]]]:
+        subs = self.db.execute("SELECT user, symbol FROM subs").fetchall()
+        rules: Dict[str, List[str]] = {}
+        for user, rule in self.db.execute("SELECT user, rule FROM user_rules"):
+            rules.setdefault(user, []).append(rule)
+        return subs, rules
+
+    def close(self):
+        self.db.close()
+
+# ---------------- 跨服務讀取 ----------------
+def export_snapshot(store: SubscriptionStore) -> Tuple[bytes, str]:
+    """Webhook 端：整份訂閱 → (JSON body, ETag)；內容沒變 ETag 就不變"""
+    subs, rules = store.snapshot()
+    body = json.dumps({"subs": sorted(subs), "rules": {u: sorted(rs) for u, rs in sorted(rules.items())}},
+                      ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return body, f'"{zlib.crc32(body):08x}"'
+
+class RemoteSubscriptions:
+    """
+    掃描端：經 HTTP 讀 Webhook 的訂閱（介面同 SubscriptionStore 的 data_version / snapshot）。
+    最多每 poll_s 秒問一次；連不上時沿用上一份，不讓 Webhook 當機拖垮掃描。
+    """
+    def __init__(self, url: str, token: str, poll_s: float = 60, timeout: float = 10):
+        self.url = url
+        self.token = token
+        self.poll_s = poll_s
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.etag: Optional[str] = None
+        self.data: Tuple[List[Tuple[str, str]], Dict[str, List[str]]] = ([], {})
+        self._next = 0.0
+
+    def data_version(self) -> Optional[str]:
+        now = time.time()
+        if now < self._next:
+            return self.etag
+        self._next = now + self.poll_s
+        headers = {"Authorization": f"Bearer {self.token}"}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        try:
+            r = self.session.get(self.url, headers=headers, timeout=self.timeout)
+            if r.status_code == 304:
+                return self.etag
+            r.raise_for_status()
+            js = r.json()
+        except Exception as e:
+            print(f"[WARN] 讀取訂閱失敗（沿用上一份）：{e}")
+            return self.etag
+        self.data = ([tuple(x) for x in js.get("subs", [])], js.get("rules", {}))
+        self.etag = r.headers.get("ETag") or f'"{zlib.crc32(r.content):08x}"'
+        return self.etag
+
+    def snapshot(self) -> Tuple[List[Tuple[str, str]], Dict[str, List[str]]]:
+        return self.data
+
+    def close(self):
+        self.session.close()
+
+class SubscriberIndex:
+    """
+    代號 → {使用者: 規則集合（None = 全部）}；全市場訂閱者另外放 wildcard。
+    recipients(code, rid) 一次字典查詢就拿到要通知的人。
+    """
+    def __init__(self, subs: Iterable[Tuple[str, str]] = (), rules: Optional[Dict[str, List[str]]] = None,
+                 wildcard_users: Iterable[str] = ()):
+        rules = rules or {}
+        rs = lambda u: frozenset(rules[u]) if u in rules else None
+        self.by_symbol: Dict[str, Dict[str, Optional[FrozenSet[str]]]] = {}
+        self.wildcard: Dict[str, Optional[FrozenSet[str]]] = {u: None for u in wildcard_users}
+        for user, sym in subs:
+            if sym == ALL:
+                self.wildcard[user] = rs(user)
+            else:
+                self.by_symbol.setdefault(sym, {})[user] = rs(user)
+
+    @classmethod
+    def from_store(cls, store: Union[SubscriptionStore, RemoteSubscriptions], wildcard_users: Iterable[str] = ()) -> "SubscriberIndex":
+        subs, rules = store.snapshot()
+        return cls(subs, rules, wildcard_users)
+
+    def universe(self) -> Optional[Set[str]]:
+        """要掃的代號聯集；有人訂全市場時回 None（= 全部）"""
+        return None if self.wildcard else set(self.by_symbol)
+
+    def recipients(self, code: str, rid: str) -> List[str]:
+        out = [u for u, rs in self.wildcard.items() if rs is None or rid in rs]
+        for u, rs in self.by_symbol.get(code, {}).items():
+            if (rs is None or rid in rs) and u not in self.wildcard:
+                out.append(u)
+        return out
+
+    def __len__(self):
+        return len(set(self.wildcard) | {u for d in self.by_symbol.values() for u in d})
+
+# ---------------- Webhook 指令 ----------------
+HELP_TEXT = ("指令：\n"
+             "加 2330 2317 — 加入觀察\n"
+             "刪 2330 — 移除觀察\n"
+             "全市場 — 訂閱全市場（刪 全市場 取消）\n"
+             "規則 R1 R5 — 只收這些規則（規則 全部 = 恢復全部）\n"
+             "清單 — 查看目前設定")
+
+_ADD = {"加", "add", "+"}
+_DEL = {"刪", "del", "-"}
+_RULES = {"規則", "rules"}
+_LIST = {"清單", "list"}
+_ALL = {"全市場", "all"}
+
+def _codes(args: Sequence[str]) -> Tuple[List[str], List[str]]:
+    ok, bad = [], []
+    for a in args:
+        a = a.upper().split(".")[0]
+        (ok if _CODE_RE.match(a) else bad).append(a)
+    return ok, bad
+
+def handle_command(store: SubscriptionStore, user: str, text: str) -> str:
+    """解析一則文字訊息並套用；回傳要回覆給使用者的文字"""
+    parts = text.replace("，", " ").replace(",", " ").split()
+    if not parts:
+        return HELP_TEXT
+    cmd, args = parts[0].lower(), parts[1:]
+    if cmd in _ALL:
+        store.add(user, [ALL])
+        return "已訂閱全市場 ✅"
+    if cmd in _ADD or cmd in _DEL:
+        if args and args[0].lower() in _ALL:
+            codes, bad = [ALL], []
+        else:
+            codes, bad = _codes(args)
+        if not codes:
+            return "請輸入代號，例如：加 2330 2317"
+        if cmd in _ADD:
+            room = MAX_SYMBOLS_PER_USER - len(store.symbols_of(user))
+            if len(codes) > room:
+                return f"觀察清單上限 {MAX_SYMBOLS_PER_USER} 檔，目前還能加 {max(room, 0)} 檔"
+            n = store.add(user, codes)
+            msg = f"已加入 {n} 檔：{' '.join(codes)}"
+        else:
+            n = store.remove(user, codes)
+            msg = f"已移除 {n} 檔"
+        return msg + (f"（略過無效代號：{' '.join(bad)}）" if bad else "")
+    if cmd in _RULES:
+        if not args or args[0] in ("全部", "all", "ALL"):
+            store.set_rules(user, None)
+            return "已恢復接收全部規則"
+        rules = sorted({a.upper() for a in args})
+        bad = [r for r in rules if r not in RULE_IDS]
+        if bad:
+            return f"未知規則：{' '.join(bad)}（可用：{' '.join(RULE_IDS)}）"
+        store.set_rules(user, rules)
+        return f"只接收：{' '.join(rules)}"
+    if cmd in _LIST:
+        syms = store.symbols_of(user)
+        rules = store.rules_of(user)
+        watch = "全市場" if ALL in syms else (" ".join(syms) if syms else "（空）")
+        return f"觀察：{watch}\n規則：{' '.join(rules) if rules else '全部'}"
+    return HELP_TEXT
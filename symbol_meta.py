@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# symbol_meta.py — 代號中繼資料（市場別 / Yahoo 代號 / 名稱），與 symbols_all.txt 放在一起
+import json, os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+META_PATH = "symbols_meta.json"
+MARKET_SUFFIX = {"TWSE": ".TW", "TPEX": ".TWO"}     # 上市 / 上櫃
+
+def make_entry(code: str, market: str, name: str = "", source: str = "isin") -> Dict[str, str]:
+    return {"code": code, "market": market, "yahoo": code + MARKET_SUFFIX[market],
+            "name": name, "source": source}
+
+def build_meta(rows_by_market: Dict[str, Iterable[Tuple]]) -> Dict[str, Dict[str, str]]:
+    """{'TWSE': [(code, name, ...), ...], 'TPEX': [...]} → {code: entry}"""
+    meta: Dict[str, Dict[str, str]] = {}
+    for market, rows in rows_by_market.items():
+        for code, name, *_ in rows:
+            meta.setdefault(code, make_entry(code, market, name))
+    return meta
+
+def market_of(y_symbol: str) -> Optional[str]:
+    for market, suffix in MARKET_SUFFIX.items():
+        if y_symbol.endswith(suffix):
+            return market
+    return None
+
+def load_meta(path: str = META_PATH) -> Dict[str, Dict[str, str]]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] 讀取 {path} 失敗，改用線上判斷 suffix：", e)
+        return {}
+
+def save_meta(meta: Dict[str, Dict[str, str]], path: str = META_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=0, sort_keys=True)
+    os.replace(tmp, path)
+
+def resolve(codes: List[str], meta: Dict[str, Dict[str, str]]) -> Tuple[Dict[str, str], List[str]]:
+    """回傳 ({code: yahoo代號}, 仍需線上判斷的代號)"""
+    sym_map, missing = {}, []
+    for c in codes:
+        ent = meta.get(c)
+        if ent and ent.get("yahoo"):
+            sym_map[c] = ent["yahoo"]
+        else:
+            missing.append(c)
+    return sym_map, missing
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+get_chart_cached / prefetch_charts 的失敗退避與 chart_cache_total 計數（假的連線池與 fetch_chart，不連網）。
+用法：python -m pytest -q test_chart_cache.py
+"""
+from concurrent.futures import Future
+
+import pytest
+
+import metrics
+import xq_alert_bot as bot
+from bar_series import BarSeries
+
+KEY = ("2330.TW", "1d")
+
+class _Pool:
+    """submit 的 Future 一直不完成（背景更新在途）；map_json 一律抓不到"""
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, url):
+        self.submitted.append(url)
+        return Future()
+
+    def map_json(self, urls):
+        return [None for _ in urls]
+
+@pytest.fixture
+def cache(monkeypatch):
+    calls = []
+    monkeypatch.setattr(bot, "_chart_cache", {})
+    monkeypatch.setattr(bot, "_inflight", {})
+    monkeypatch.setattr(bot, "_fail", {})
+    monkeypatch.setattr(bot, "_counted", set())
+    monkeypatch.setattr(bot, "_bar_store", None)
+    monkeypatch.setattr(bot, "_swr", True)
+    monkeypatch.setattr(bot, "get_pool", lambda pool=_Pool(): pool)
+    monkeypatch.setattr(bot, "fetch_chart", lambda y, rng, interval: calls.append(rng))
+    return calls
+
+def _count(result: str) -> float:
+    return metrics.REGISTRY.value("chart_cache_total", interval="1d", result=result)
+
+def test_empty_placeholder_retries_after_backoff_not_refresh(cache):
+    ent = bot.get_chart_cached(KEY[0], "8mo", "1d", refresh_minutes=10)
+    assert len(ent) == 0 and ent.last == 0.0
+    assert cache == ["8mo"]
+    bot.get_chart_cached(KEY[0], "8mo", "1d", refresh_minutes=10)             # 退避中：不重抓
+    assert cache == ["8mo"]
+    n, _ = bot._fail[KEY]
+    bot._fail[KEY] = (n, 0.0)                                                 # 退避時間到（遠早於 10 分鐘）
+    bot.get_chart_cached(KEY[0], "8mo", "1d", refresh_minutes=10)
+    assert cache == ["8mo", "8mo"]
+    assert bot._fail[KEY][0] == 2
+
+def test_stale_lookup_is_counted_once_per_cycle(cache):
+    bot._chart_cache[KEY] = BarSeries([1, 2], [1.0] * 2, [1.0] * 2, [1.0] * 2, [1.0] * 2, [1.0] * 2, last=1.0, gen=1)
+    stale, coalesced = _count("stale"), _count("coalesced")
+    for _ in range(2):                                # 兩輪：第二輪背景更新仍在途
+        bot.prefetch_charts([KEY[0]], [("8mo", "1d", 10)])
+        bot.get_chart_cached(KEY[0], "8mo", "1d", refresh_minutes=10)
+    assert (_count("stale") - stale, _count("coalesced") - coalesced) == (1, 1)
+    assert len(bot.get_pool().submitted) == 1
+    bot.get_chart_cached(KEY[0], "8mo", "1d", refresh_minutes=10)             # 沒經過 prefetch 的查詢照常計
+    assert _count("coalesced") - coalesced == 2
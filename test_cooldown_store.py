@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+CooldownStore 重啟：從 cooldown.db 載回的冷卻狀態，重啟後第一次清理不能丟掉（否則重新部署就重推）。
+purge_every_s=0 讓每次 should_push 都先清理，重現重啟 600 秒後那一次。
+用法：python -m pytest -q test_cooldown_store.py
+"""
+import datetime
+
+from cooldown_store import CooldownStore
+
+def _noon() -> float:
+    """明天中午：一定晚於下次清理時間，之後幾小時也還是同一天"""
+    return datetime.datetime.combine(datetime.date.today() + datetime.timedelta(days=1), datetime.time(12)).timestamp()
+
+def _pushed_then_restarted(path: str, t: float, **kw) -> CooldownStore:
+    store = CooldownStore(path, purge_every_s=0)
+    assert store.should_push("2330", "R1", now=t, **kw)
+    store.flush()
+    store.close()
+    return CooldownStore(path, purge_every_s=0)
+
+def test_once_per_day_survives_restart(tmp_path):
+    t = _noon()
+    store = _pushed_then_restarted(str(tmp_path / "cooldown.db"), t, cooldown_minutes=30, once_per_day=True)
+    assert not store.should_push("2330", "R1", 30, True, now=t + 660)
+    assert not store.should_push("2330", "R1", 30, True, now=t + 3 * 3600)
+    assert store.should_push("2330", "R2", 30, True, now=t + 3 * 3600)
+    store.close()
+
+def test_cooldown_window_survives_restart(tmp_path):
+    t = _noon()
+    store = _pushed_then_restarted(str(tmp_path / "cooldown.db"), t, cooldown_minutes=30, once_per_day=False)
+    assert not store.should_push("2330", "R1", 30, False, now=t + 660)
+    assert not store.should_push("2330", "R1", 30, False, now=t + 1799)
+    assert store.should_push("2330", "R1", 30, False, now=t + 1801)
+    store.close()
+
+def test_purge_still_drops_expired_entries(tmp_path):
+    t = _noon()
+    store = _pushed_then_restarted(str(tmp_path / "cooldown.db"), t, cooldown_minutes=30, once_per_day=False)
+    store.should_push("2317", "R1", 30, False, now=t + 3600)
+    assert len(store) == 1                              # 2330 已過 30 分鐘視窗
+    store.close()
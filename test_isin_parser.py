@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""
+isin_parser 對本機 tpex.html（ISIN 上櫃頁面，Big5 / MS950）：名稱要解成正確的中文，不連網。
+用法：python -m pytest -q test_isin_parser.py
+"""
+import os
+
+from isin_parser import parse_isin_rows, read_page
+from symbol_meta import build_meta
+
+TPEX_HTML = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tpex.html")
+
+def test_tpex_names_decode_as_cp950():
+    rows = parse_isin_rows(read_page(TPEX_HTML))
+    assert rows[:2] == [("1240", "茂生農經", "上櫃"), ("1259", "安心", "上櫃")]
+    assert not [r for r in rows if "�" in r[1]]         # 沒有解不出來的字
+    meta = build_meta({"TPEX": rows})
+    assert meta["1240"] == {"code": "1240", "market": "TPEX", "yahoo": "1240.TWO", "name": "茂生農經", "source": "isin"}
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+PushDispatcher 對本機 stub LINE server（bench_line_push.StubLine）的行為檢查：不連網。
+用法：python -m pytest -q test_line_dispatcher.py
+"""
+import time
+
+import pytest
+
+import line_messaging_push as lmp
+import metrics
+from bench_line_push import start_stub
+
+@pytest.fixture
+def stub():
+    st, srv, base = start_stub(0.0)
+    yield st, base
+    st.gate.set()
+    srv.shutdown()
+
+def _wait(cond, timeout: float = 5):
+    deadline = time.time() + timeout
+    while not cond():
+        assert time.time() < deadline, "等候逾時"
+        time.sleep(0.01)
+
+def test_429_retry_after_delivers_once(stub):
+    st, base = stub
+    st.script = [(429, False)]
+    d = lmp.PushDispatcher("x", ["U1"], api_base=base, backoff=5)     # backoff 很長：只有照 Retry-After 才會很快送完
+    t0 = time.time()
+    d.submit("hello")
+    assert d.flush(3)
+    d.close()
+    assert time.time() - t0 < 3
+    assert [code for _, _, code in st.log] == [429, 200]
+    assert len({key for _, key, _ in st.log}) == 1                  # 重送沿用同一個 X-Line-Retry-Key
+    assert st.delivered == [("/v2/bot/message/push", 1, 1)]
+    assert d.stats["retries"] == 1
+
+def test_lost_response_is_not_delivered_twice(stub):
+    st, base = stub
+    st.script = [(500, True)]                                        # 已送達但回應遺失
+    d = lmp.PushDispatcher("x", ["U1", "U2"], api_base=base, backoff=0.01)
+    d.submit("hello")
+    assert d.flush(3)
+    d.close()
+    assert [code for _, _, code in st.log] == [500, 409]
+    assert len({key for _, key, _ in st.log}) == 1
+    assert st.delivered == [("/v2/bot/message/multicast", 2, 1)]
+
+def test_packs_five_messages_per_request(stub):
+    st, base = stub
+    d = lmp.PushDispatcher("x", ["U1"], api_base=base, backoff=0.01)
+    st.gate.clear()                             # 卡住第一個請求，其餘 12 則排在佇列裡一起被取出
+    d.submit("first")
+    _wait(lambda: st.arrived == 1)
+    for i in range(12):
+        d.submit(f"m{i}")
+    st.gate.set()
+    assert d.flush(3)
+    d.close()
+    assert [n for _, _, n in st.delivered] == [1, 5, 5, 2]
+    assert all(path == "/v2/bot/message/push" for path, _, _ in st.delivered)
+
+def test_multicast_splits_over_500_recipients(stub):
+    st, base = stub
+    recipients = [f"U{i:032d}" for i in range(1201)]
+    d = lmp.PushDispatcher("x", recipients, api_base=base, backoff=0.01)
+    d.submit("hello")
+    assert d.flush(3)
+    d.close()
+    assert st.delivered == [("/v2/bot/message/multicast", 500, 1), ("/v2/bot/message/multicast", 500, 1),
+                            ("/v2/bot/message/multicast", 201, 1)]
+
+def test_unconfigured_queues_nothing():
+    skipped = metrics.REGISTRY.value("line_messages_total", outcome="skipped")
+    queued = metrics.REGISTRY.value("line_messages_total", outcome="queued")
+    d = lmp.PushDispatcher("", ["U1"])
+    assert d.submit("hello") is False
+    assert d.submit_digest(["a", "b"]) == 0
+    d.close()
+    d = lmp.PushDispatcher("x", [])
+    assert d.submit_digest(["a"]) == 0
+    assert d.submit("hello", to=[]) is False
+    assert d.q.unfinished_tasks == 0
+    d.close()
+    assert metrics.REGISTRY.value("line_messages_total", outcome="skipped") - skipped == 4     # ["a", "b"] 併成 1 則摘要
+    assert metrics.REGISTRY.value("line_messages_total", outcome="queued") == queued
+
+def test_pack_digest_respects_text_limit():
+    texts = [("警" * n) for n in (10, 4990, 3, 5000, 7000, 2500, 2500, 1)]
+    msgs = lmp.pack_digest(texts)
+    assert all(len(m) <= lmp.MAX_TEXT_LEN for m in msgs)
+    assert len(msgs) == 6                      # 10+4990 超過上限 → 拆開；2500 + 2 + 2500 也超過
+    assert msgs[0] == "警" * 10
+    assert msgs[3] == "警" * lmp.MAX_TEXT_LEN  # 超長的單則截到上限
+    assert "".join(msgs).count("警") == sum(min(len(t), lmp.MAX_TEXT_LEN) for t in texts)
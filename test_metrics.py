@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+metrics.Registry：分片子行程 take() 的增量併進協調端後，/metrics 要看得到；排程器延遲量表。
+用法：python -m pytest -q test_metrics.py
+"""
+import metrics
+
+def _child_round(reg: metrics.Registry, secs: float):
+    reg.inc("chart_cache_total", 3, interval="1d", result="tail")
+    reg.inc("http_requests_total", host="query1.finance.yahoo.com", outcome="ok")
+    reg.observe("stage_seconds", secs, stage="chart_fetch")
+
+def test_merge_child_deltas():
+    parent, child = metrics.Registry(), metrics.Registry()
+    _child_round(child, 0.02)
+    parent.merge(child.take())
+    _child_round(child, 3.0)
+    parent.merge(child.take())
+    assert child.take() == {"counters": {}, "hists": {}}         # 送過的不會再送一次
+
+    assert parent.value("chart_cache_total", interval="1d", result="tail") == 6
+    out = parent.render()
+    assert 'xq_http_requests_total{host="query1.finance.yahoo.com",outcome="ok"} 2' in out
+    assert 'xq_stage_seconds_bucket{stage="chart_fetch",le="0.025"} 1' in out
+    assert 'xq_stage_seconds_bucket{stage="chart_fetch",le="5"} 2' in out
+    assert 'xq_stage_seconds_sum{stage="chart_fetch"} 3.02' in out
+    assert 'xq_stage_seconds_count{stage="chart_fetch"} 2' in out
+
+def test_record_staleness():
+    metrics.record_staleness({"max": 900.0, "p90": 600.0, "p50": 120.5, "mean": 200.0, "never": 7})
+    out = metrics.REGISTRY.render()
+    assert 'xq_eval_staleness_seconds{stat="p50"} 120.5' in out
+    assert 'xq_eval_staleness_seconds{stat="max"} 900' in out
+    assert "xq_eval_never_symbols 7" in out
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+replay 與 scan_cycle 的規則組合要一致（合成資料，不連網）。
+用法：python -m pytest -q test_replay.py
+"""
+import csv, json, os
+from collections import Counter
+
+import pytest
+
+from replay import replay, synthetic_series
+
+RULES = ("r4_daily_ma5_up", "r6_price_gt_20", "r8_price_gt_ma5")
+
+@pytest.fixture
+def cfg():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json"), "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    cfg["rules"] = {key: key in RULES for key in cfg["rules"]}
+    return cfg
+
+def test_all_mode_only_counts_symbols_that_hit_every_rule(tmp_path, cfg):
+    series = synthetic_series(40, 120)
+    any_res = replay(series, dict(cfg, match_mode="any"))
+    out = tmp_path / "triggers.csv"
+    all_res = replay(series, dict(cfg, match_mode="all"), str(out))
+
+    n_all = all_res["signals"]["R4"]
+    assert n_all > 0
+    assert all_res["signals"] == {rid: n_all for rid in ("R4", "R6", "R8")}
+    assert n_all < min(any_res["signals"][rid] for rid in ("R4", "R6", "R8"))
+    with open(out, "r", encoding="utf-8", newline="") as f:
+        per_row = Counter((r["date"], r["symbol"]) for r in csv.DictReader(f))
+    assert len(per_row) == n_all and set(per_row.values()) == {3}
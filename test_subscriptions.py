@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+訂閱：Webhook 指令 → SQLite → SubscriberIndex → notify_hits 依「代號 × 規則」扇出給各使用者（暫存 SQLite，不連網）。
+用法：python -m pytest -q test_subscriptions.py
+"""
+import json, os
+
+import numpy as np
+import pytest
+
+import line_messaging_push as lmp
+import xq_alert_bot as bot
+from cooldown_store import CooldownStore
+from rule_engine import FEATURES
+from subscriptions import ALL, MAX_SYMBOLS_PER_USER, SubscriberIndex, SubscriptionStore, export_snapshot, handle_command
+
+class _Digests:
+    def __init__(self):
+        self.sent = []
+
+    def submit_digest(self, texts, to=None):
+        self.sent.append((sorted(to) if to is not None else None, list(texts)))
+        return 1
+
+@pytest.fixture
+def store(tmp_path):
+    st = SubscriptionStore(str(tmp_path / "subscriptions.db"))
+    yield st
+    st.close()
+
+@pytest.fixture
+def cfg():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def test_handle_command(store):
+    assert handle_command(store, "U1", "加 2330, 2317.TW abc") == "已加入 2 檔：2330 2317（略過無效代號：ABC）"
+    assert handle_command(store, "U1", "加") == "請輸入代號，例如：加 2330 2317"
+    assert handle_command(store, "U1", "規則 r8 R5") == "只接收：R5 R8"
+    assert handle_command(store, "U1", "規則 R9").startswith("未知規則：R9")
+    assert handle_command(store, "U1", "清單") == "觀察：2317 2330\n規則：R5 R8"
+    assert handle_command(store, "U1", "刪 2317") == "已移除 1 檔"
+    assert handle_command(store, "U1", "規則 全部") == "已恢復接收全部規則"
+    assert handle_command(store, "U1", "清單") == "觀察：2330\n規則：全部"
+    assert handle_command(store, "U2", "全市場") == "已訂閱全市場 ✅"
+    assert store.symbols_of("U2") == [ALL]
+    assert handle_command(store, "U2", "刪 全市場") == "已移除 1 檔"
+    assert handle_command(store, "U3", "說明").startswith("指令：")
+
+def test_handle_command_limit(store):
+    store.add("U1", [f"{1000 + i}" for i in range(MAX_SYMBOLS_PER_USER - 1)])
+    assert handle_command(store, "U1", "加 2330 2317") == f"觀察清單上限 {MAX_SYMBOLS_PER_USER} 檔，目前還能加 1 檔"
+    assert handle_command(store, "U1", "加 2330").startswith("已加入 1 檔")
+
+def test_index_recipients_and_universe(store):
+    handle_command(store, "U1", "加 2330 2317")
+    handle_command(store, "U2", "加 2330")
+    handle_command(store, "U2", "規則 R8")
+    idx = SubscriberIndex.from_store(store)
+    assert idx.universe() == {"2330", "2317"}
+    assert len(idx) == 2
+    assert sorted(idx.recipients("2330", "R8")) == ["U1", "U2"]
+    assert idx.recipients("2330", "R6") == ["U1"]
+    assert idx.recipients("1101", "R6") == []
+
+    idx = SubscriberIndex.from_store(store, wildcard_users=["Ucfg"])        # config 收件人 = 全市場
+    assert idx.universe() is None
+    assert sorted(idx.recipients("1101", "R6")) == ["Ucfg"]
+    handle_command(store, "U2", "全市場")
+    idx = SubscriberIndex.from_store(store)
+    assert idx.recipients("1101", "R6") == []                             # U2 全市場但只收 R8
+    assert idx.recipients("1101", "R8") == ["U2"]
+    assert sorted(idx.recipients("2330", "R8")) == ["U1", "U2"]             # 不會重複
+
+def test_export_snapshot_etag_follows_content(store):
+    store.add("U1", ["2330"])
+    body, etag = export_snapshot(store)
+    assert json.loads(body) == {"subs": [["U1", "2330"]], "rules": {}}
+    assert export_snapshot(store)[1] == etag
+    store.set_rules("U1", ["R1"])
+    assert export_snapshot(store)[1] != etag
+
+def _hits(cfg, monkeypatch, idx, digests=None):
+    """2330 命中 R6 + R8、2317 命中 R6、1101 命中 R6；回傳 (推播器, 冷卻狀態, notify_hits 回傳的則數)"""
+    digests, cooldown = digests or _Digests(), CooldownStore(path=None)
+    monkeypatch.setattr(bot, "_subs_index", idx)
+    monkeypatch.setattr(bot, "_cooldown", cooldown)
+    monkeypatch.setattr(bot, "get_dispatcher", lambda: digests)
+    metas = [{"ysym": f"{c}.TW", "tkr": c, "name": c, "ex": "TWSE", "price": 110.0, "yclose": 100.0, "chg": 10.0}
+             for c in ("2330", "2317", "1101")]
+    F = np.full((3, len(FEATURES)), np.nan)
+    F[:, FEATURES.index("price")] = 110.0
+    F[:, FEATURES.index("ma5d_1")] = 100.0
+    hits = np.array([[True, True], [True, False], [True, False]])
+    pushed = bot.notify_hits(cfg, metas, F, hits, ["R6", "R8"], cooldown=30, once_per_day=False)
+    return digests, cooldown, pushed
+
+def test_notify_hits_fans_out_per_user(store, cfg, monkeypatch):
+    handle_command(store, "U1", "加 2330 2317")
+    handle_command(store, "U2", "加 2330")
+    handle_command(store, "U2", "規則 R8")
+    handle_command(store, "U3", "加 2317")
+    digests, cooldown, pushed = _hits(cfg, monkeypatch, SubscriberIndex.from_store(store))
+    assert pushed == len(digests.sent)                                      # 假推播器每組回 1 則
+
+    by_user = {}
+    for to, texts in digests.sent:
+        for uid in to:
+            by_user[uid] = texts
+    assert sorted(by_user) == ["U1", "U2", "U3"]
+    u1 = by_user["U1"]
+    assert [t.split("\n")[0] for t in u1] == ["【觸發】2330 (2330) TWSE", "【觸發】2317 (2317) TWSE"]
+    assert "R6 價>20.0；R8 價>100.00(日5MA)" in u1[0]
+    (u2,) = by_user["U2"]
+    assert u2.startswith("【觸發】2330") and "R8" in u2 and "R6" not in u2
+    (u3,) = by_user["U3"]
+    assert u3.startswith("【觸發】2317")
+    assert ["U1"] in [to for to, _ in digests.sent]
+    assert sorted(k for k in cooldown.entries()) == [("2317", "R6"), ("2330", "R6"), ("2330", "R8")]  # 1101 沒人訂：不佔冷卻
+
+def test_notify_hits_same_digest_shares_one_multicast(store, cfg, monkeypatch):
+    handle_command(store, "U1", "加 2317")
+    handle_command(store, "U2", "加 2317")
+    digests, _, _ = _hits(cfg, monkeypatch, SubscriberIndex.from_store(store))
+    assert len(digests.sent) == 1 and digests.sent[0][0] == ["U1", "U2"]
+
+def test_notify_hits_counts_only_queued(store, cfg, monkeypatch):
+    handle_command(store, "U1", "加 2330 2317")
+    d = lmp.PushDispatcher("", [])                                          # 沒有 token：全部略過
+    try:
+        _, cooldown, pushed = _hits(cfg, monkeypatch, SubscriberIndex.from_store(store), digests=d)
+    finally:
+        d.close()
+    assert pushed == 0
+    assert len(cooldown.entries()) == 3
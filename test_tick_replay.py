@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+tick 檔回放走完整條串流路徑（不連網）：TickFileSource → scan_cycle → apply_tick → SeriesFeed → 規則 → 推播。
+日 K 歷史直接放進 _chart_cache（last 設在很久以後，不會到期下載），推播器換成收集訊息的假物件。
+用法：python -m pytest -q test_tick_replay.py
+"""
+import json, os
+
+import pytest
+
+import xq_alert_bot as bot
+from bar_series import BarSeries
+from cooldown_store import CooldownStore
+from market_data import TickFileSource
+from tw_time import bar_ts
+
+YSYM = "1000.TW"
+DAY = 19800                         # 2024-03-18（週一）
+TICKS = [                           # ts,price,volume：同一批合併，開盤要是第一筆 100
+    (bar_ts(DAY) + 1, 100.0, 1000),
+    (bar_ts(DAY) + 60, 99.0, 5000),
+    (bar_ts(DAY) + 120, 104.0, 8000),
+]
+
+class _Digests:
+    def __init__(self):
+        self.texts = []
+
+    def submit_digest(self, texts, to=None):
+        self.texts.extend(texts)
+        return len(texts)
+
+@pytest.fixture
+def cfg():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json"), "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    cfg["rules"] = {key: key in ("r4_daily_ma5_up", "r8_price_gt_ma5") for key in cfg["rules"]}
+    cfg["match_mode"] = "all"
+    return cfg
+
+@pytest.fixture
+def bot_state(monkeypatch):
+    """30 根收盤 100 的日 K（前一天為止）；全域狀態每個測試各自一份"""
+    days = range(DAY - 30, DAY)
+    hist = BarSeries([bar_ts(d) for d in days], *([100.0] * 30 for _ in range(4)), [1e6] * 30,
+                     last=1e18, gen=1)
+    digests = _Digests()
+    monkeypatch.setattr(bot, "_chart_cache", {(YSYM, "1d"): hist})
+    monkeypatch.setattr(bot, "_indicator_state", {})
+    monkeypatch.setattr(bot, "_cooldown", CooldownStore(path=None))
+    monkeypatch.setattr(bot, "_subs_index", None)
+    monkeypatch.setattr(bot, "get_dispatcher", lambda: digests)
+    return hist, digests
+
+def _write_ticks(path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("ts,symbol,price,volume,name,prev_close\n")
+        for i, (ts, px, vol) in enumerate(TICKS):
+            f.write(f"{ts},{YSYM},{px},{vol},{'測試' if i == 0 else ''},{'100' if i == 0 else ''}\n")
+
+def _drain(src):
+    quotes = {}
+    while not src.exhausted:
+        quotes.update(src.wait(timeout=5))
+    return quotes
+
+def test_tick_file_replay_builds_bar_and_alerts(tmp_path, cfg, bot_state):
+    hist, digests = bot_state
+    _write_ticks(tmp_path / "ticks.csv")
+    src = TickFileSource(str(tmp_path / "ticks.csv"), speed=0, window_s=0.2)
+    src.seed({YSYM: {"fullExchangeName": "TWSE"}})          # seed_stream 的底稿：第一次 wait 才開始播
+    quotes = _drain(src)
+    assert list(quotes) == [YSYM]
+    q = quotes[YSYM]
+    assert (q["tickOpen"], q["tickHigh"], q["tickLow"], q["regularMarketPrice"]) == (100.0, 104.0, 99.0, 104.0)
+
+    st = bot.scan_cycle(list(quotes), cfg, [("8mo", "1d", 10)], 50, 30, False, quotes=quotes)
+    assert (st["charts_fetched"], st["hit_symbols"], st["pushed"]) == (0, 1, 1)
+
+    assert len(hist) == 31
+    assert hist.ts[-1] == bar_ts(DAY)
+    assert [hist[name][-1] for name in ("open", "high", "low", "close", "volume")] == [100.0, 104.0, 99.0, 104.0, 8000]
+    ind = bot._indicator_state[YSYM]
+    assert ind.daily.sync(hist)[0].values[-2:] == [100.0, 100.8]           # 日 5MA：(4×100 + 104) / 5
+
+    (text,) = digests.texts
+    assert text.startswith("【觸發】測試 (1000) TWSE\n價：104.0（昨收：100.0，漲跌：4.00%）")
+    assert "R4 日5MA上揚" in text and "R8 價>100.80(日5MA)" in text
+
+def test_later_ticks_update_the_forming_bar(tmp_path, cfg, bot_state):
+    hist, digests = bot_state
+    _write_ticks(tmp_path / "ticks.csv")
+    quotes = _drain(TickFileSource(str(tmp_path / "ticks.csv"), speed=0, window_s=0.2))
+    bot.scan_cycle(list(quotes), cfg, [("8mo", "1d", 10)], 50, 30, False, quotes=quotes)
+
+    src = TickFileSource(os.devnull, speed=0, window_s=0)       # 同一天稍後的一筆：只改寫最後一根
+    src.seed({YSYM: quotes[YSYM]})
+    src.push(YSYM, 98.0, 9000.0, bar_ts(DAY) + 600)
+    quotes = src.wait(timeout=5)
+    st = bot.scan_cycle(list(quotes), cfg, [("8mo", "1d", 10)], 50, 30, False, quotes=quotes)
+    assert len(hist) == 31
+    assert [hist[name][-1] for name in ("open", "high", "low", "close", "volume")] == [100.0, 104.0, 98.0, 98.0, 9000.0]
+    assert st["hit_symbols"] == 0 and len(digests.texts) == 1
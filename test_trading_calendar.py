@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+收盤整理與重啟：做完的交易日記在 cooldown_store，收盤後重新部署不會再跑一次（不會重推當天警示）。
+用法：python -m pytest -q test_trading_calendar.py
+"""
+import datetime
+
+from cooldown_store import CooldownStore
+from trading_calendar import TZ, TradingCalendar
+
+WED = datetime.date(2024, 3, 13)
+
+def _at(d: datetime.date, hh: int, mm: int = 0) -> float:
+    return TZ.localize(datetime.datetime.combine(d, datetime.time(hh, mm))).timestamp()
+
+def test_restart_at_1500_after_eod_does_not_redo_it(tmp_path):
+    cal = TradingCalendar("09:00", "13:30")
+    path = str(tmp_path / "cooldown.db")
+    store = CooldownStore(path)
+    assert cal.eod_pending(_at(WED, 12), store.last_eod()) is None          # 盤中
+    assert cal.eod_pending(_at(WED, 14, 30), store.last_eod()) == (WED, _at(WED, 13, 30))
+    store.mark_eod(WED)
+    store.close()
+
+    store = CooldownStore(path)                     # 15:00 重新部署
+    assert store.last_eod() == WED
+    assert cal.eod_pending(_at(WED, 15), store.last_eod()) is None
+    nxt = WED + datetime.timedelta(days=1)
+    assert cal.eod_pending(_at(nxt, 15), store.last_eod()) == (nxt, _at(nxt, 13, 30))
+    store.close()
+
+def test_restart_before_eod_ran_still_runs_it(tmp_path):
+    cal = TradingCalendar("09:00", "13:30")
+    store = CooldownStore(str(tmp_path / "cooldown.db"))
+    store.mark_eod(WED - datetime.timedelta(days=1))
+    assert cal.eod_pending(_at(WED, 15), store.last_eod()) == (WED, _at(WED, 13, 30))
+    store.mark_eod(WED - datetime.timedelta(days=2))                        # 只會往後推
+    assert store.last_eod() == WED - datetime.timedelta(days=1)
+    store.close()
+
+def test_missed_eod_is_not_caught_up_on_a_later_day():
+    cal = TradingCalendar("09:00", "13:30", holidays=[WED + datetime.timedelta(days=1)])
+    assert cal.eod_pending(_at(WED + datetime.timedelta(days=1), 10), None) is None    # 休市日
+    assert cal.eod_pending(_at(WED + datetime.timedelta(days=3), 10), None) is None    # 週六
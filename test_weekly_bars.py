@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+weekly_bars 的日 K → 週 K 彙整（不連網）：
+- fixtures/synthetic/holiday_weeks_1d.json：人工編的日 K（Yahoo chart JSON 格式，價量不是真實行情），
+  日期照 2024-01 ～ 2024-03-13 的台股行事曆：元旦、春節休市週（只剩週四五）、228 補假、
+  一根整列 null 的日 K，以及最後盤中未收的本週（ts 是最後成交時間）；
+  預期週 K 是逐週手算的（EXPECTED），不是拿被測程式產生的
+真實 Yahoo 週 K 的對照需要連網，不在測試裡：python weekly_bars.py 2330.TW
+用法：python -m pytest -q test_weekly_bars.py
+"""
+import datetime, json, os
+
+from bar_series import FIELDS, BarSeries
+from tw_time import EPOCH_ORD, bar_ts
+from weekly_bars import WeeklyResampler, resample_weekly, _same
+from xq_alert_bot import extract_ohlcv
+
+SYNTHETIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "synthetic", "holiday_weeks_1d.json")
+
+# (該週週一, 開, 高, 低, 收, 量)：開 = 第一個交易日開盤、收 = 最後一個有值的收盤、量 = 各日相加
+EXPECTED = [
+    ("2024-01-01", 593, 594, 572, 581, 59168381 + 46250162 + 35201977 + 29807846),              # 元旦週一休市
+    ("2024-01-08", 578, 604, 573, 589, 54675455 + 38887005 + 42761407 + 28804101 + 49722506),
+    ("2024-01-15", 586, 604, 577, 588, 33123708 + 24263531 + 56781373 + 43337215 + 57525392),
+    ("2024-01-22", 586, 600, 583, 590, 39966816 + 45610401 + 19428872 + 29377575),              # 週三整列 null
+    ("2024-01-29", 593, 603, 580, 586, 36773524 + 20651833 + 52536908 + 49172802 + 35341304),
+    ("2024-02-05", 590, 591, 580, 582, 57368942),                                               # 春節前只有週一
+    ("2024-02-12", 581, 585, 556, 557, 19330610 + 39463426),                                    # 春節後只有週四五
+    ("2024-02-19", 558, 576, 555, 571, 30138199 + 38834669 + 58527117 + 34346606 + 20629767),
+    ("2024-02-26", 571, 601, 564, 596, 42164997 + 19479416 + 30121072 + 50494304),              # 228 週三休市
+    ("2024-03-04", 594, 595, 568, 568, 31664555 + 47297816 + 26023904 + 38175781 + 54041825),
+    ("2024-03-11", 572, 582, 571, 573, 46597011 + 45041650 + 16345290),                         # 成形中的本週
+]
+
+def _chart(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _expected() -> BarSeries:
+    out = BarSeries()
+    for monday, *vals in EXPECTED:
+        out.ts.append(bar_ts(datetime.date.fromisoformat(monday).toordinal() - EPOCH_ORD))
+        for name, v in zip(("open", "high", "low", "close", "volume"), vals):
+            out[name].append(float(v))
+    return out
+
+def _replay_daily(ts, cols) -> WeeklyResampler:
+    """
+    模擬實盤：先有前 20 根，之後每天先以 tick 接一根成形中的日 K、盤中改寫幾次，
+    收盤後再以 Yahoo 的 5 根窗口併入（last 變了）；每一步都要等於整段重算。
+    """
+    daily = BarSeries(ts[:20], *(c[:20] for c in cols), last=1.0, gen=1)
+    r = WeeklyResampler()
+    r.sync(daily)
+    for k in range(20, len(ts)):
+        o = cols[0][k]
+        if o is not None:
+            daily.ts.append(ts[k])
+            for name in ("open", "high", "low", "close"):
+                daily[name].append(o)
+            daily.volume.append(0.0)
+            for px in (cols[1][k], cols[2][k]):
+                daily.close[-1] = px
+                daily.high[-1] = max(daily.high[-1], px)
+                daily.low[-1] = min(daily.low[-1], px)
+                r.sync(daily)
+        lo = max(0, k - 4)
+        if ts[lo] <= daily.ts[-1]:
+            assert daily.merge(ts[lo:k + 1], [c[lo:k + 1] for c in cols])
+        else:
+            daily.ts.append(ts[k])
+            for name, c in zip(("open", "high", "low", "close", "volume"), cols):
+                daily[name].append(float("nan") if c[k] is None else c[k])
+        daily.last += 1
+        w = r.sync(daily)
+        full = resample_weekly(daily)
+        assert all(_same(getattr(w, f), getattr(full, f)) for f in FIELDS), f"第 {k} 根日 K 後增量結果與整段重算不同"
+    return r
+
+def test_resample_matches_hand_computed_weeks():
+    ours = resample_weekly(BarSeries(*extract_ohlcv(_chart(SYNTHETIC))))
+    exp = _expected()
+    assert all(_same(getattr(ours, f), getattr(exp, f)) for f in FIELDS)
+
+def test_incremental_sync_matches_full_resample():
+    ts, *cols = extract_ohlcv(_chart(SYNTHETIC))
+    r = _replay_daily(ts, cols)
+    exp = _expected()
+    assert all(_same(getattr(r.bars, f), getattr(exp, f)) for f in FIELDS)
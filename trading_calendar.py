@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+trading_calendar.py — 台股交易時段 / 休市日
+- 時段以 Asia/Taipei 計（預設 09:00–13:30），週六日與假日檔裡的日期休市
+- 假日檔一行一個 YYYY-MM-DD，# 之後是註解；每年依證交所公告的「市場休市日期」更新
+掃描迴圈據此決定：盤中全速輪詢、收盤後做一次收盤整理（做完的日期記在 cooldown_store，重啟不重做）、
+盤外睡到下次開盤前預熱。
+"""
+import datetime, os
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+import pytz
+
+TZ = pytz.timezone("Asia/Taipei")
+
+def _hm(s: str) -> datetime.time:
+    h, m = s.split(":")
+    return datetime.time(int(h), int(m))
+
+def load_holidays(path: str) -> Set[datetime.date]:
+    out: Set[datetime.date] = set()
+    if not os.path.exists(path):
+        print(f"[WARN] 找不到休市日檔 {path}，只以週末判斷休市")
+        return out
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            s = line.split("#", 1)[0].strip()
+            if not s:
+                continue
+            try:
+                out.add(datetime.date.fromisoformat(s))
+            except ValueError:
+                print(f"[WARN] {path}:{n} 日期格式錯誤：{s!r}")
+    return out
+
+class TradingCalendar:
+    def __init__(self, open_hm: str = "09:00", close_hm: str = "13:30",
+                 holidays: Iterable[datetime.date] = ()):
+        self.open = _hm(open_hm)
+        self.close = _hm(close_hm)
+        self.holidays = set(holidays)
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "TradingCalendar":
+        scfg = cfg.get("session", {})
+        return cls(scfg.get("open", "09:00"), scfg.get("close", "13:30"),
+                   load_holidays(scfg.get("holidays_file", "holidays_tw.txt")))
+
+    def today(self, now: float) -> datetime.date:
+        return datetime.datetime.fromtimestamp(now, TZ).date()
+
+    def is_trading_day(self, d: datetime.date) -> bool:
+        return d.weekday() < 5 and d not in self.holidays
+
+    def session(self, d: datetime.date) -> Tuple[float, float]:
+        """當日 (開盤, 收盤) 的 epoch 秒"""
+        o = TZ.localize(datetime.datetime.combine(d, self.open))
+        c = TZ.localize(datetime.datetime.combine(d, self.close))
+        return o.timestamp(), c.timestamp()
+
+    def in_session(self, now: float) -> bool:
+        d = self.today(now)
+        if not self.is_trading_day(d):
+            return False
+        o, c = self.session(d)
+        return o <= now < c
+
+    def next_open(self, now: float) -> float:
+        """now 之後（含今天還沒開盤）最近一次開盤的 epoch 秒"""
+        d = self.today(now)
+        for _ in range(370):
+            if self.is_trading_day(d):
+                o, _ = self.session(d)
+                if o > now:
+                    return o
+            d += datetime.timedelta(days=1)
+        raise ValueError("一年內找不到交易日，休市日檔可能有誤")
+
+    def last_close(self, now: float) -> Optional[Tuple[datetime.date, float]]:
+        """now 之前最近一次已收盤的 (交易日, 收盤 epoch 秒)"""
+        d = self.today(now)
+        for _ in range(370):
+            if self.is_trading_day(d):
+                _, c = self.session(d)
+                if c <= now:
+                    return d, c
+            d -= datetime.timedelta(days=1)
+        return None
+
+    def eod_pending(self, now: float, done: Optional[datetime.date]) -> Optional[Tuple[datetime.date, float]]:
+        """
+        今天已收盤、收盤整理還沒做（done 是最後做完的交易日）→ (交易日, 收盤 epoch 秒)；
+        過了收盤當天就不補做（隔天開盤前的預熱會補齊 K 線），避免隔日才推出前一天的警示。
+        """
+        last = self.last_close(now)
+        if last is None or last[0] != self.today(now) or last[0] == done:
+            return None
+        return last
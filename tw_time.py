@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# tw_time.py — 台北日期換算（台灣沒有日光節約，固定 UTC+8）：串流換日、日 K / 週 K 對齊、回放都用這裡
+import datetime
+
+TW_OFFSET = 8 * 3600
+EPOCH_ORD = datetime.date(1970, 1, 1).toordinal()
+
+def tw_day(ts: float) -> int:
+    """ts 所在的台北日期，以 1970-01-01 起的天數表示（1970-01-01 是週四）"""
+    return int((ts + TW_OFFSET) // 86400)
+
+def day_date(day: int) -> datetime.date:
+    return datetime.date.fromordinal(EPOCH_ORD + day)
+
+def tw_date(ts: float) -> datetime.date:
+    return day_date(tw_day(ts))
+
+def bar_ts(day: int) -> int:
+    """台北該日 09:00 的 epoch 秒（與 Yahoo 日 K 的 ts 慣例相同）"""
+    return day * 86400 + 9 * 3600 - TW_OFFSET
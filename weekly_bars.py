@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+weekly_bars.py — 由日 K 彙整週 K，取代另外下載 range=5y&interval=1wk
+- 台股交易週：同一個（台北時間）週一～週日的交易日併成一根；整週休市就沒有那一根，與 Yahoo 相同
+- 開 = 第一個有值的開盤、高 / 低 = 最高 / 最低、收 = 最後一個有值的收盤、量 = 加總；缺值日 K 略過
+- 週 K 的 ts 取該週週一台北 09:00
+WeeklyResampler 掛在每檔的指標狀態上：日 K 只動到尾巴時只重算最後一兩週，週 K 的 gen 不變，
+週 5MA 因此照樣走 SeriesFeed 的 replace_last / update；日 K 整段換掉（gen 變了）才整段重算。
+
+對照 Yahoo 週 K：python weekly_bars.py 2330.TW 2317.TW 6488.TWO
+"""
+import argparse, itertools, sys
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+from bar_series import NAN, COLS, FIELDS, BarSeries
+from tw_time import bar_ts, tw_day
+
+_gen = itertools.count(1)
+REDO_BARS = 5           # 與增量抓取最短的 5d 窗口相同：最後這幾根日 K 可能被改寫
+
+def advance_gen(past: int):
+    """快照載回後呼叫：之後發的 gen 都大於 past"""
+    global _gen
+    _gen = itertools.count(max(past + 1, next(_gen)))
+
+def week_start(ts: float) -> int:
+    """ts 所在那週週一台北 09:00 的 epoch 秒（1970-01-01 是週四）"""
+    day = tw_day(ts)
+    return bar_ts(day - (day + 3) % 7)
+
+def _append_week(out: BarSeries, daily: Dict[str, Any], k: int, j: int, wk: int):
+    o = h = l = c = NAN
+    v, has_v = 0.0, False
+    op, hi, lo, cl, vo = daily["open"], daily["high"], daily["low"], daily["close"], daily["volume"]
+    for i in range(k, j):
+        x = cl[i]
+        if x != x:
+            continue
+        if o != o:
+            o = op[i]
+        if not hi[i] <= h:          # h 是 NaN 時也成立
+            h = hi[i]
+        if not lo[i] >= l:
+            l = lo[i]
+        c = x
+        if vo[i] == vo[i]:
+            v += vo[i]
+            has_v = True
+    if c != c:
+        return                      # 整週都沒有有效收盤
+    out.ts.append(wk)
+    out.open.append(o)
+    out.high.append(h)
+    out.low.append(l)
+    out.close.append(c)
+    out.volume.append(v if has_v else NAN)
+
+def _resample_into(out: BarSeries, daily: Dict[str, Any], k: int) -> Optional[int]:
+    """日 K 從 k 起彙整接到 out 後面；回傳最後一週第一根日 K 的 ts"""
+    ts = daily["ts"]
+    n = len(ts)
+    first = None
+    while k < n:
+        wk = week_start(ts[k])
+        j = k + 1
+        while j < n and week_start(ts[j]) == wk:
+            j += 1
+        _append_week(out, daily, k, j, wk)
+        first, k = ts[k], j
+    return first
+
+def resample_weekly(daily: Dict[str, Any]) -> BarSeries:
+    """整段日 K → 週 K"""
+    out = BarSeries(gen=next(_gen))
+    _resample_into(out, daily, 0)
+    return out
+
+def _same(a, b) -> bool:
+    return len(a) == len(b) and all(x == y or (x != x and y != y) for x, y in zip(a, b))
+
+class WeeklyResampler:
+    """
+    單一代號的週 K；sync(日 K) 回傳最新的週 K（BarSeries）。
+    只有 tick / 接新 K 棒（日 K 的 last 沒變）時只重算最後一根週 K 起的部分；
+    剛從 Yahoo 併入（last 變了）再多重算「最後 REDO_BARS 根日 K」所在的週（增量抓取會改寫的範圍），
+    已完成的週因此有變動（前一週最後一天的收盤定案）就換 gen，讓週 5MA 重新 seed。
+    """
+    __slots__ = ("bars", "src_gen", "src_last")
+
+    def __init__(self):
+        self.bars = BarSeries(gen=next(_gen))
+        self.src_gen = None
+        self.src_last = None
+
+    def sync(self, daily: Dict[str, Any]) -> BarSeries:
+        ts = daily["ts"]
+        n = len(ts)
+        if not n:
+            return self.bars
+        bars = self.bars
+        old = None
+        if self.src_gen != daily.get("gen") or not len(bars):
+            self.bars = bars = BarSeries(gen=next(_gen))
+            k = j = 0
+        else:
+            wk = bars.ts[-1]
+            if daily.get("last") != self.src_last:
+                wk = min(wk, week_start(ts[max(0, n - REDO_BARS)]))
+            k = bisect_left(ts, wk - 9 * 3600)          # 該週週一 00:00（台北）起的第一根日 K
+            j = bisect_left(bars.ts, wk)
+            old = [getattr(bars, name)[j:-1] for name in FIELDS]     # 最後一根本來就還在成形
+            for name in FIELDS:
+                del getattr(bars, name)[j:]
+        self.src_gen, self.src_last = daily.get("gen"), daily.get("last")
+        _resample_into(bars, daily, k)
+        if old and len(old[0]) and not all(_same(o, getattr(bars, name)[j:j + len(o)])
+                                           for name, o in zip(FIELDS, old)):
+            bars.gen = next(_gen)
+        return bars
+
+# ---------------- 對照 Yahoo 週 K ----------------
+def _close_enough(a, b, tol: float) -> bool:
+    if a is None or b is None or a != a or b != b:
+        return (a is None or a != a) == (b is None or b != b)
+    return abs(a - b) <= tol * max(abs(a), abs(b), 1.0)
+
+def compare(ysym: str, ours: BarSeries, w_json: Dict[str, Any], rel_tol: float = 1e-6,
+            vol_tol: float = 1e-3) -> Tuple[int, int]:
+    """彙整出的週 K 與 Yahoo 週 K（chart JSON）逐週比對（只比兩邊都有的週）；回傳 (比對週數, 不一致週數)"""
+    from xq_alert_bot import extract_ohlcv
+    yts, *ycols = extract_ohlcv(w_json)
+    mine = {t: i for i, t in enumerate(ours.ts)}
+    n_cmp = n_bad = 0
+    for r, t in enumerate(yts):
+        i = mine.get(week_start(t))
+        if i is None or ycols[3][r] is None:
+            continue
+        n_cmp += 1
+        diffs = [(nm, ours[nm][i], col[r]) for nm, col in zip(COLS, ycols)
+                 if not _close_enough(ours[nm][i], col[r], vol_tol if nm == "volume" else rel_tol)]
+        if diffs:
+            n_bad += 1
+            print(f"[WARN] {ysym} 週 {ours.ts[i]} 不一致：" +
+                  "，".join(f"{nm} 彙整 {a} vs Yahoo {y}" for nm, a, y in diffs))
+    print(f"[INFO] {ysym}：比對 {n_cmp} 週，不一致 {n_bad} 週（Yahoo {len(yts)} 根 / 彙整 {len(ours)} 根）")
+    return n_cmp, n_bad
+
+def check(symbols: List[str], rng: str = "1y", rel_tol: float = 1e-6, vol_tol: float = 1e-3) -> int:
+    """抓 Yahoo 日 K 自行彙整，與 Yahoo 週 K 比對；回傳不一致的週數"""
+    from xq_alert_bot import fetch_chart, extract_ohlcv
+    bad = 0
+    for ysym in symbols:
+        d_json, w_json = fetch_chart(ysym, rng=rng, interval="1d"), fetch_chart(ysym, rng=rng, interval="1wk")
+        if not d_json or not w_json:
+            print(f"[WARN] {ysym} 抓不到日 K / 週 K，略過")
+            continue
+        bad += compare(ysym, resample_weekly(BarSeries(*extract_ohlcv(d_json))), w_json, rel_tol, vol_tol)[1]
+    return bad
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("symbols", nargs="*", default=["2330.TW", "2317.TW", "2454.TW"])
+    ap.add_argument("--range", default=None)
+    args = ap.parse_args()
+    sys.exit(1 if check(args.symbols, args.range or "1y") else 0)
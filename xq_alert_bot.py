@@ -1,40 +1,71 @@
 # -*- coding: utf-8 -*-
 # xq_worker.py — 常駐掃描台股並用 LINE Messaging API 推播
-import os, time, json, requests, datetime
-from typing import Optional, Dict, Any, List
+import os, time, json, datetime, itertools, signal, threading
+import numpy as np
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Set, Tuple, Union
 
 # 你現有的工具
-from indicators import sma, macd
-from refresh_symbols_all import refresh_symbols_all
+from indicators_np import seed_states
+from rule_engine import (feature_row, evaluate as evaluate_rules, format_hit, to_matrix as feature_matrix,
+                         match_all, prefilter, require_all, FEATURES)
+from scheduler import QuoteDiffScheduler
+from market_data import make_source
+import metrics
+import snapshot
+import weekly_bars
+from tw_time import bar_ts, tw_day
+from fetch_pool import configure as configure_fetch_pool, get_pool
+from bar_store import BarStore
+from bar_series import BarSeries
+from series_feed import SymbolIndicators, indicator_specs
+from cooldown_store import CooldownStore
+from subscriptions import SubscriptionStore, SubscriberIndex, RemoteSubscriptions
+from symbol_meta import META_PATH, load_meta, save_meta, make_entry, market_of, resolve as resolve_meta
 
 # 用 Messaging API 推播（先前我們做好的）
-from line_messaging_push import push_message
+from line_messaging_push import get_dispatcher
+
+# 只有特定路徑才用到的模組（清單更新、多行程、交易日曆）在用到時才 import，啟動不必全部載入
+if TYPE_CHECKING:
+    from shard_pool import ShardPool
 
 # ---------------- Yahoo helpers ----------------
-def fetch_quote_multi(y_symbols: List[str]) -> Dict[str, Dict[str, Any]]:
-    res = {}
-    if not y_symbols:
-        return res
-    joined = ",".join(y_symbols)
-    url = f"https://query1.finance.yahoo.com/v7/finance/quote?symbols={joined}"
+YAHOO_BASE = "https://query1.finance.yahoo.com"
+
+def _quote_url(y_symbols: List[str]) -> str:
+    return f"{YAHOO_BASE}/v7/finance/quote?symbols={','.join(y_symbols)}"
+
+def _chart_url(y_symbol: str, rng: str, interval: str) -> str:
+    return f"{YAHOO_BASE}/v8/finance/chart/{y_symbol}?range={rng}&interval={interval}"
+
+def _quote_items(data: Optional[Dict[str, Any]], res: Dict[str, Dict[str, Any]]):
+    if not data:
+        return
     try:
-        r = requests.get(url, timeout=20)
-        data = r.json()
         for item in data.get("quoteResponse", {}).get("result", []):
             sym = item.get("symbol")
             if sym:
                 res[sym] = item
     except Exception:
         pass
+
+def fetch_quote_multi(y_symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    res = {}
+    if not y_symbols:
+        return res
+    _quote_items(get_pool().get_json(_quote_url(y_symbols)), res)
+    return res
+
+def fetch_quotes_bulk(y_symbols: List[str], chunk: int = 50) -> Dict[str, Dict[str, Any]]:
+    """切成 chunk 檔一組，透過連線池併發查報價"""
+    res: Dict[str, Dict[str, Any]] = {}
+    urls = [_quote_url(y_symbols[i:i+chunk]) for i in range(0, len(y_symbols), chunk)]
+    for data in get_pool().map_json(urls):
+        _quote_items(data, res)
     return res
 
 def fetch_chart(y_symbol: str, rng="6mo", interval="1d") -> Optional[Dict[str, Any]]:
-    try:
-        url = f"https://query1.finance.yahoo.com/v8/finance/chart/{y_symbol}?range={rng}&interval={interval}"
-        r = requests.get(url, timeout=20)
-        return r.json()
-    except Exception:
-        return None
+    return get_pool().get_json(_chart_url(y_symbol, rng, interval))
 
 def extract_ohlcv(chart_json: Dict[str, Any]):
     result = chart_json.get("chart", {}).get("result", [])
@@ -58,220 +89,840 @@ def choose_symbol_suffix_bulk(tickers: List[str], chunk: int = 300) -> Dict[str,
     out: Dict[str, str] = {}
 
     # 先試 .TW（上市）
-    for i in range(0, len(tickers), chunk):
-        seg = tickers[i:i+chunk]
-        tw_syms = [t + ".TW" for t in seg]
-        resp = fetch_quote_multi(tw_syms)  # {'2330.TW': {...}, ...}
-        for ysym in resp.keys():
-            base = ysym.split(".")[0]
-            out[base] = ysym
+    resp = fetch_quotes_bulk([t + ".TW" for t in tickers], chunk)  # {'2330.TW': {...}, ...}
+    for ysym in resp.keys():
+        base = ysym.split(".")[0]
+        out[base] = ysym
 
     # 再補 .TWO（上櫃）—只查還沒判斷出的
     remaining = [t for t in tickers if t not in out]
-    for i in range(0, len(remaining), chunk):
-        seg = remaining[i:i+chunk]
-        two_syms = [t + ".TWO" for t in seg]
-        resp = fetch_quote_multi(two_syms)
-        for ysym in resp.keys():
-            base = ysym.split(".")[0]
-            out[base] = ysym
+    resp = fetch_quotes_bulk([t + ".TWO" for t in remaining], chunk)
+    for ysym in resp.keys():
+        base = ysym.split(".")[0]
+        out[base] = ysym
 
     # 診斷輸出
     print(f"[DEBUG] 判斷 suffix：輸入 {len(tickers)} 檔 → OK {len(out)} 檔，未判斷 {len(tickers)-len(out)} 檔")
     return out
 
-_chart_cache = {}
-def get_chart_cached(y_symbol: str, rng: str, interval: str, refresh_minutes: int):
-    key = (y_symbol, interval)
-    now = time.time()
+def resolve_symbols(codes: List[str], meta_path: str = META_PATH) -> Dict[str, str]:
+    """
+    先用 symbols_meta.json（ISIN 頁面解析時存下的市場別）離線對應 suffix，
+    只有新代號 / 還沒判斷出的才線上試 .TW/.TWO，試出來的結果寫回檔案。
+    """
+    meta = load_meta(meta_path)
+    sym_map, missing = resolve_meta(codes, meta)
+    print(f"[DEBUG] symbols_meta 離線對應 {len(sym_map)} 檔，需線上判斷 {len(missing)} 檔")
+    if missing:
+        probed = choose_symbol_suffix_bulk(missing, chunk=300)
+        for code, ysym in probed.items():
+            meta[code] = make_entry(code, market_of(ysym), source="probe")
+        sym_map.update(probed)
+        if probed:
+            save_meta(meta, meta_path)
+    return sym_map
+
+_chart_cache: Dict[Tuple[str, str], BarSeries] = {}
+MAX_BARS = 400          # 增量模式下每條序列最多保留的 K 棒數
+_gen = itertools.count(1)   # 序列被整段換掉 / 剪頭時遞增，串流指標據此判斷要不要重新 seed
+_bar_store: Optional[BarStore] = None
+
+# 能蓋住「最後一根 → 現在」缺口的最小 Yahoo range（天數預留假日）
+_TAIL_RANGES = [("5d", 5), ("1mo", 31), ("3mo", 92), ("6mo", 183), ("1y", 366), ("2y", 731), ("5y", 1827)]
+
+def _range_days(rng: str) -> int:
+    if rng.endswith("mo"):
+        return int(rng[:-2]) * 31
+    if rng.endswith("y"):
+        return int(rng[:-1]) * 366
+    if rng.endswith("d"):
+        return int(rng[:-1])
+    return 10 ** 6
+
+def _tail_range(ent: BarSeries, full_rng: str, now: float) -> str:
+    gap_days = (now - ent.ts[-1]) / 86400.0 + 3
+    for rng, days in _TAIL_RANGES:
+        if days >= gap_days:
+            return rng if days < _range_days(full_rng) else full_rng
+    return full_rng
+
+def _fetch_range(key: Tuple[str, str], rng: str, now: float) -> str:
+    """已有快取就只抓蓋住缺口的短窗口；沒有才照原 range 整段抓"""
     ent = _chart_cache.get(key)
-    if not ent or now - ent["last"] > refresh_minutes * 60:
-        j = fetch_chart(y_symbol, rng=rng, interval=interval)
-        ts, o, h, l, c, v = extract_ohlcv(j) if j else ([],[],[],[],[],[])
-        ent = {"ts": ts, "open": o, "high": h, "low": l, "close": c, "volume": v, "last": now}
-        _chart_cache[key] = ent
-    return ent
-
-# ---------------- 規則 ----------------
-def r1_macd_combo(cfg, hist: List[Optional[float]]) -> Optional[str]:
-    if len(hist) < 2:
-        return None
-    eps = float(cfg["macd"].get("eps", 1e-6))
-    h_now, h_prev = hist[-1], hist[-2]
-    if h_now is None or h_prev is None:
-        return None
-    cond1 = (h_now < -eps) and (h_prev < -eps) and (h_now > h_prev + eps)
-    cond2 = (h_prev < -eps) and (h_now >= -eps)
-    cond3 = (h_now > eps) and (h_prev > eps) and (h_now > h_prev + eps)
-    if cond1 or cond2 or cond3:
-        tag = "綠柱縮短" if cond1 else ("綠轉紅" if cond2 else "紅柱變大")
-        return f"R1 MACD {tag} (hist 前:{h_prev:.5f} 今:{h_now:.5f})"
-    return None
-
-def r2_ma34_up_daily(ma34: List[Optional[float]]) -> Optional[str]:
-    if len(ma34) < 2 or ma34[-1] is None or ma34[-2] is None:
-        return None
-    return "R2 日34MA上揚" if ma34[-1] > ma34[-2] else None
+    if ent is not None and ent.ts:
+        return _tail_range(ent, rng, now)
+    return rng
 
-def r3_weekly_ma5_pattern(ma5w: List[Optional[float]]) -> Optional[str]:
-    if len(ma5w) < 3 or None in (ma5w[-1], ma5w[-2], ma5w[-3]):
-        return None
-    return "R3 週5MA型態成立" if (ma5w[-2] >= ma5w[-3] and ma5w[-1] > ma5w[-2]) else None
+def _merge_bars(ent: BarSeries, ts, cols) -> bool:
+    """
+    就地把短窗口併進快取（見 BarSeries.merge）；沒有重疊時回 False，交給呼叫端整段重抓。
+    只增不減的序列定期從頭修剪（攤提成本），剪過就換 gen 讓串流指標重新 seed。
+    """
+    if not ent.merge(ts, cols):
+        return False
+    if len(ent) > MAX_BARS * 3 // 2 and ent.trim(MAX_BARS):
+        ent.gen = next(_gen)
+    return True
 
-def r4_daily_ma5_up(ma5d: List[Optional[float]]) -> Optional[str]:
-    if len(ma5d) < 2 or None in (ma5d[-1], ma5d[-2]):
-        return None
-    return "R4 日5MA上揚" if ma5d[-1] > ma5d[-2] else None
+# ---- stale-while-revalidate / 合併請求 / 失敗退避 ----
+_swr = True                     # 有舊資料就先回舊的，背景更新
+_backoff_base_s = 30.0          # 抓取失敗後的重試間隔：base × 2^(n-1)，上限 max
+_backoff_max_s = 1800.0
+_inflight: Dict[Tuple[str, str], Tuple[Any, str, str]] = {}   # key -> (Future, 完整 range, 這次 range)
+_fail: Dict[Tuple[str, str], Tuple[int, float]] = {}          # key -> (連續失敗次數, 下次可重試時間)
+_counted: Set[Tuple[str, str]] = set()      # prefetch_charts 本輪已計入 chart_cache_total 的 key，get_chart_cached 不再計
+
+def configure_chart_cache(cfg: Dict[str, Any]):
+    global _swr, _backoff_base_s, _backoff_max_s
+    ccfg = cfg.get("chart_cache", {})
+    _swr = bool(ccfg.get("stale_while_revalidate", True))
+    _backoff_base_s = float(ccfg.get("backoff_base_seconds", 30))
+    _backoff_max_s = float(ccfg.get("backoff_max_seconds", 1800))
+
+def _chart_expired(key: Tuple[str, str], refresh_minutes: int, now: float) -> bool:
+    ent = _chart_cache.get(key)
+    if ent is not None and now - ent.last <= refresh_minutes * 60:
+        return False
+    f = _fail.get(key)
+    return not (f and now < f[1])       # 退避中：先不重抓
+
+def _note_failure(key: Tuple[str, str], now: float):
+    n = _fail.get(key, (0, 0.0))[0] + 1
+    _fail[key] = (n, now + min(_backoff_max_s, _backoff_base_s * 2 ** (n - 1)))
+    metrics.inc("chart_fetch_failures_total", interval=key[1])
 
-def r5_within_pct_to_ma5(price: float, ma5d_last: Optional[float], pct_min: float, pct_max: float) -> Optional[str]:
-    if ma5d_last is None or price is None:
+def _store_chart(key: Tuple[str, str], j: Optional[Dict[str, Any]], now: float,
+                 merge: bool = False) -> Optional[bool]:
+    """
+    寫入快取。回傳 True 成功；False 為 merge 遇到缺口（需整段重抓）；
+    None 為抓取失敗：既有資料原封不動，該 key 進入指數退避。
+    """
+    ts, o, h, l, c, v = extract_ohlcv(j) if j else ([],[],[],[],[],[])
+    old = _chart_cache.get(key)
+    if not ts:
+        _note_failure(key, now)
+        if old is None:             # 從沒抓到過：放空序列（last=0，何時重試只看退避），指標回 None、規則不觸發
+            _chart_cache[key] = BarSeries(gen=next(_gen))
         return None
-    diff_pct = (price - ma5d_last) / ma5d_last * 100.0
-    return (f"R5 價距日5MA {diff_pct:.2f}% 在 {pct_min}~{pct_max}%"
-            if (diff_pct >= pct_min and diff_pct <= pct_max) else None)
+    _fail.pop(key, None)
+    if merge and old is not None and old.ts:
+        if not _merge_bars(old, ts, (o, h, l, c, v)):
+            return False
+        old.last = now
+        return True
+    _chart_cache[key] = BarSeries(ts, o, h, l, c, v, last=now, gen=next(_gen))
+    return True
+
+def _persist(keys: List[Tuple[str, str]]):
+    if _bar_store is not None and keys:
+        _bar_store.save_many((k, _chart_cache[k]) for k in keys)
+
+def _revalidate(key: Tuple[str, str], rng: str, now: float, fr: Optional[str] = None):
+    """背景抓（同一 key 同時只會有一個請求在途）；結果由 _drain_refreshes 在掃描執行緒套用"""
+    if key in _inflight:
+        return
+    fr = fr or _fetch_range(key, rng, now)
+    _inflight[key] = (get_pool().submit(_chart_url(key[0], fr, key[1])), rng, fr)
+
+def _drain_refreshes() -> int:
+    """把已完成的背景更新寫進快取；快取只在掃描執行緒改動，串流指標不會讀到寫到一半的序列"""
+    done = [key for key, (fut, _, _) in _inflight.items() if fut.done()]
+    if not done:
+        return 0
+    now = time.time()
+    ok = []
+    for key in done:
+        fut, rng, fr = _inflight.pop(key)
+        res = _store_chart(key, fut.result(), now, merge=(fr != rng))
+        if res is False:
+            _revalidate(key, rng, now, fr=rng)       # 有缺口 → 背景整段補抓
+        elif res:
+            ok.append(key)
+    _persist(ok)
+    return len(done)
+
+def _count_lookup(key: Tuple[str, str], result: str):
+    """每次查詢只計一次：prefetch_charts 本輪已計過的 key，之後 get_chart_cached 就不再計"""
+    if key in _counted:
+        _counted.discard(key)
+    else:
+        metrics.inc("chart_cache_total", interval=key[1], result=result)
 
-def r6_price_gt(price: float, thr: float) -> Optional[str]:
+def get_chart_cached(y_symbol: str, rng: str, interval: str, refresh_minutes: int):
+    key = (y_symbol, interval)
+    now = time.time()
+    _drain_refreshes()
+    if key in _inflight:
+        _count_lookup(key, "coalesced")
+    elif _chart_expired(key, refresh_minutes, now):
+        ent = _chart_cache.get(key)
+        if _swr and ent is not None and ent.ts:
+            _count_lookup(key, "stale")
+            _revalidate(key, rng, now)
+            return ent
+        fr = _fetch_range(key, rng, now)
+        merge = fr != rng
+        _count_lookup(key, "tail" if merge else "full")
+        res = _store_chart(key, fetch_chart(y_symbol, rng=fr, interval=interval), now, merge=merge)
+        if res is False:
+            res = _store_chart(key, fetch_chart(y_symbol, rng=rng, interval=interval), now)   # 有缺口 → 整段
+        if res:
+            _persist([key])
+    return _chart_cache[key]
+
+def prefetch_charts(y_symbols: List[str], specs: List[Tuple[str, str, int]]):
+    """
+    把一整批過期的 K 線（specs = [(range, interval, refresh_minutes), ...]）
+    一次丟進連線池併發下載，之後 get_chart_cached 直接命中快取。
+    已有快取的只抓短窗口增量合併；有缺口的再整段補抓一輪。
+    開啟 stale-while-revalidate 時，有舊資料的改成背景更新，只有完全沒資料的才擋住本輪；
+    refresh_minutes=0 代表「現在就要最新的」（收盤整理 / 開盤前預熱），一律同步抓。
+    """
+    _drain_refreshes()
+    _counted.clear()
+    now = time.time()
+    todo = []       # (key, 完整 range, 這次要抓的 range)
+    counts: Dict[Tuple[str, str], int] = {}
+    for ysym in y_symbols:
+        for rng, interval, refresh_minutes in specs:
+            key = (ysym, interval)
+            if key in _inflight:
+                result = "coalesced"
+            elif not _chart_expired(key, refresh_minutes, now):
+                result = "hit"
+            elif _swr and refresh_minutes > 0 and len(_chart_cache.get(key, ())):
+                _revalidate(key, rng, now)
+                result = "stale"
+            else:
+                fr = _fetch_range(key, rng, now)
+                todo.append((key, rng, fr))
+                result = "tail" if fr != rng else "full"
+            counts[(interval, result)] = counts.get((interval, result), 0) + 1
+            _counted.add(key)
+    for (interval, result), n in counts.items():
+        metrics.inc("chart_cache_total", n, interval=interval, result=result)
+    urls = [_chart_url(key[0], fr, key[1]) for key, _, fr in todo]
+    gaps, ok = [], []
+    for (key, rng, fr), j in zip(todo, get_pool().map_json(urls)):
+        res = _store_chart(key, j, now, merge=(fr != rng))
+        if res is False:
+            gaps.append((key, rng))
+        elif res:
+            ok.append(key)
+    if gaps:
+        urls = [_chart_url(key[0], rng, key[1]) for key, rng in gaps]
+        for (key, _), j in zip(gaps, get_pool().map_json(urls)):
+            if _store_chart(key, j, now):
+                ok.append(key)
+    _persist(ok)
+    stale = sum(n for (_, r), n in counts.items() if r == "stale")
+    return len(todo) + len(gaps) + stale
+
+# ---- 串流 tick → 仍在成形的 K 棒 ----
+def apply_tick(y_symbol: str, price: Optional[float], volume: Optional[float], ts: float,
+               open_: Optional[float] = None, high: Optional[float] = None, low: Optional[float] = None) -> bool:
+    """
+    串流成交價直接改寫最後一根日 K（同一天）；跨日就接一根新的。週 K 由日 K 彙整，不必另外改。
+    open_ / high / low 是合併成這一筆的那批 tick 的第一筆 / 最高 / 最低價（省略 = 只有 price 這一筆）。
+    之後 SeriesFeed.sync 只會對最後一根做 replace_last / update。下次 K 線到期重抓時以 Yahoo 為準覆蓋。
+    """
     if price is None:
-        return None
-    return f"R6 價>{thr}" if price > thr else None
+        return False
+    ent = _chart_cache.get((y_symbol, "1d"))
+    if ent is None or not ent.ts:
+        return False
+    d, last = tw_day(ts), tw_day(ent.ts[-1])
+    if d < last:
+        return False                # 比最後一根還舊的 tick
+    hi = price if high is None else high
+    lo = price if low is None else low
+    if d == last:
+        h, l = ent.high[-1], ent.low[-1]
+        ent.close[-1] = price
+        ent.high[-1] = hi if h != h else max(h, hi)
+        ent.low[-1] = lo if l != l else min(l, lo)
+        if volume is not None:
+            ent.volume[-1] = volume
+    else:
+        ent.ts.append(bar_ts(d))
+        ent.open.append(price if open_ is None else open_)
+        ent.high.append(hi)
+        ent.low.append(lo)
+        ent.close.append(price)
+        ent.volume.append(volume if volume is not None else float("nan"))
+    return True
 
-def r7_volume_gt(vol_now: Optional[int], min_shares: int) -> Optional[str]:
-    if vol_now is None:
+def open_bar_store(cfg: Dict[str, Any], keep_symbols: List[str], prune: bool = True,
+                   load: bool = True) -> Optional[BarStore]:
+    """
+    開啟 K 線持久層、清掉下市代號，並把既有序列載回 _chart_cache。
+    分片子行程用 prune=False：不動別人的資料，只載 keep_symbols；協調端用 load=False 只做清理。
+    """
+    global _bar_store
+    bcfg = cfg.get("bar_store", {})
+    if not bcfg.get("enabled", True):
         return None
-    return (f"R7 量 {vol_now:,} > {min_shares:,} 股" if vol_now > min_shares else None)
+    _bar_store = BarStore(bcfg.get("path", "bars.db"), float(bcfg.get("max_mb", 200)))
+    dropped = _bar_store.prune(keep_symbols, keep_intervals=("1d",)) if prune else 0
+    if not load:
+        print(f"[INFO] bar_store 清除下市 {dropped} 檔（序列由快照 / 分片子行程載入）")
+        return _bar_store
+    t0 = time.time()
+    loaded = _bar_store.load_all(None if prune else keep_symbols)
+    for ent in loaded.values():
+        ent.gen = next(_gen)
+    _chart_cache.update(loaded)
+    print(f"[INFO] bar_store 載入 {len(loaded)} 條序列（{time.time() - t0:.2f}s），清除下市 {dropped} 檔")
+    return _bar_store
+
+# ---------------- 串流指標狀態 ----------------
+_indicator_state: Dict[str, SymbolIndicators] = {}
+def get_indicators(y_symbol: str, cfg: Dict[str, Any]) -> SymbolIndicators:
+    ind = _indicator_state.get(y_symbol)
+    if ind is None:
+        ind = _indicator_state[y_symbol] = SymbolIndicators(cfg["macd"])
+    return ind
+
+def seed_indicators_bulk(y_symbols: List[str], cfg: Dict[str, Any], min_batch: int = 8) -> int:
+    """
+    冷啟動 / 整段重抓後需要重新 seed 的序列，集中交給 indicators_np 一次向量化算完；
+    之後各檔 sync 只剩 O(1) 的尾端更新。回傳 seed 的序列數。
+    """
+    n = 0
+    for attr in ("daily", "weekly"):
+        todo = []
+        for ysym in y_symbols:
+            ent = _chart_cache.get((ysym, "1d"))
+            if ent is None:
+                continue
+            ind = get_indicators(ysym, cfg)
+            if attr == "weekly":
+                ent = ind.wbars.sync(ent)
+            feed = getattr(ind, attr)
+            if feed.needs_seed(ent):
+                todo.append((feed, ent))
+        if len(todo) < min_batch:
+            continue            # 零星幾檔交給 sync 逐檔 seed 就好
+        states = seed_states(todo[0][0].specs, [ent["close"] for _, ent in todo])
+        for (feed, ent), sts in zip(todo, states):
+            feed.adopt(sts, ent)
+        n += len(todo)
+    return n
+
+_cooldown = CooldownStore(path=None)      # main() 依 config 換成持久化版本
+def should_push(symbol: str, rule_id: str, cooldown_minutes: int, once_per_day: bool) -> bool:
+    return _cooldown.should_push(symbol, rule_id, cooldown_minutes, once_per_day)
 
-def r8_price_gt_ma5(price: float, ma5d_last: Optional[float]) -> Optional[str]:
-    if ma5d_last is None or price is None:
-        return None
-    return (f"R8 價>{ma5d_last:.2f}(日5MA)" if price > ma5d_last else None)
+def open_cooldown_store(cfg: Dict[str, Any]) -> CooldownStore:
+    global _cooldown
+    ccfg = cfg.get("cooldown_store", {})
+    _cooldown = CooldownStore(path=ccfg.get("path", "cooldown.db") if ccfg.get("enabled", True) else None)
+    print(f"[INFO] cooldown_store 載入 {len(_cooldown)} 筆冷卻狀態")
+    return _cooldown
 
-_last_push = {}
-def should_push(symbol: str, rule_id: str, cooldown_minutes: int, once_per_day: bool) -> bool:
-    key = (symbol, rule_id, datetime.date.today() if once_per_day else None)
-    now = time.time()
-    last = _last_push.get(key)
-    if once_per_day:
-        if last:
-            return False
-        _last_push[key] = now
-        return True
-    if last and now - last < cooldown_minutes * 60:
+# ---------------- 訂閱 ----------------
+_subs: Optional[Union[SubscriptionStore, RemoteSubscriptions]] = None
+_subs_index: Optional[SubscriberIndex] = None     # None = 沒開訂閱，照舊推給 config 收件人
+_subs_version: Any = None
+
+def open_subscriptions(cfg: Dict[str, Any]) -> Optional[Union[SubscriptionStore, RemoteSubscriptions]]:
+    """
+    http：讀 Webhook 的 /subscriptions（兩個服務各自的磁碟，例如 Render）；
+    sqlite：與 Webhook 同機共用檔案，檔案不存在就當作不是單機部署。設定不完整 → 不開訂閱。
+    """
+    global _subs
+    scfg = cfg.get("subscriptions", {})
+    if not scfg.get("enabled", False):
+        return None
+    mode = scfg.get("mode", "http")
+    if mode == "http":
+        url = scfg.get("url", "")
+        token = os.environ.get(scfg.get("token_env", "SUBSCRIPTIONS_TOKEN"), "")
+        if not url or not token:
+            print("[ERROR] 訂閱 mode=http 需要 subscriptions.url 與 Webhook 相同的 token 環境變數，"
+                  "本次不開訂閱（推給 config 收件人）")
+            return None
+        _subs = RemoteSubscriptions(url, token, poll_s=float(scfg.get("poll_seconds", 60)))
+    elif mode == "sqlite":
+        path = scfg.get("path", "subscriptions.db")
+        if not os.path.exists(path):
+            print(f"[ERROR] 訂閱 mode=sqlite 找不到 {path}：只有 Webhook 與掃描端同機、共用這個檔時才能用"
+                  f"（分開部署請改 mode=http），本次不開訂閱")
+            return None
+        _subs = SubscriptionStore(path)
+    else:
+        print(f"[ERROR] 未知的訂閱 mode={mode!r}，本次不開訂閱")
+    return _subs
+
+def refresh_subscriptions(cfg: Dict[str, Any]) -> bool:
+    """Webhook 那邊有改動（data_version / ETag 變了）才重建索引；config 收件人視為全市場訂閱者"""
+    global _subs_index, _subs_version
+    if _subs is None:
+        return False
+    v = _subs.data_version()
+    if v == _subs_version:
         return False
-    _last_push[key] = now
+    _subs_version = v
+    _subs_index = SubscriberIndex.from_store(_subs, cfg.get("messaging_api", {}).get("recipients", []))
+    uni = _subs_index.universe()
+    print(f"[INFO] 訂閱索引更新：{len(_subs_index)} 位使用者，掃描範圍 {'全市場' if uni is None else f'{len(uni)} 檔'}")
     return True
 
+def scan_universe(y_list: List[str]) -> List[str]:
+    """只掃所有訂閱的聯集（有人訂全市場就是全部）"""
+    uni = _subs_index.universe() if _subs_index is not None else None
+    return y_list if uni is None else [y for y in y_list if y.split(".")[0] in uni]
+
+# ---------------- 啟動快照 ----------------
+def snapshot_settings(cfg: Dict[str, Any]) -> Tuple[Optional[str], float]:
+    """(快照路徑 或 None = 關閉, 可沿用的最大年齡秒數)"""
+    scfg = cfg.get("snapshot", {})
+    if not scfg.get("enabled", False):
+        return None, 0.0
+    return scfg.get("path", "snapshot.pkl"), float(scfg.get("max_age_hours", 72)) * 3600
+
+def save_snapshot(path: str, cfg: Dict[str, Any], sym_map: Optional[Dict[str, str]] = None) -> int:
+    """K 線快取 / 指標狀態 / 冷卻狀態寫成快照；背景更新先收回來，存到的才是同一時間點的狀態"""
+    _drain_refreshes()
+    return snapshot.save(path, {"sym_map": sym_map, "charts": _chart_cache,
+                                "indicator_specs": indicator_specs(cfg["macd"]), "indicators": _indicator_state,
+                                "cooldowns": _cooldown.entries(), "eod_done": _cooldown.last_eod()})
+
+def write_snapshots(path: str, cfg: Dict[str, Any], sym_map: Dict[str, str],
+                    shards: Optional["ShardPool"] = None) -> int:
+    """本行程 + 各分片的快照一起寫出；回傳總 bytes"""
+    t0 = time.time()
+    n = save_snapshot(path, cfg, sym_map)
+    if shards is not None:
+        n += shards.save_snapshots(path)
+    print(f"[INFO] 快照寫出 {path}（{n / (1024 * 1024):.1f} MB，{time.time() - t0:.2f}s）")
+    return n
+
+def restore_snapshot(snap: Dict[str, Any], y_symbols: List[str], cfg: Dict[str, Any]) -> int:
+    """
+    快照載回（只留 y_symbols 的日 K 與指標狀態），快照裡沒有的代號再從 bar_store 補；回傳載回的代號數。
+    指標設定（MACD 參數 / 均線週期）跟快照不同時不沿用指標狀態，改由 K 線重新 seed。
+    gen 計數器要接在快照裡最大的 gen 之後，新抓的序列才不會跟載回的撞號。
+    """
+    global _gen
+    keep = set(y_symbols)
+    charts = {k: ent for k, ent in snap.get("charts", {}).items() if k[0] in keep and k[1] == "1d"}
+    _chart_cache.update(charts)
+    if snap.get("indicator_specs") == indicator_specs(cfg["macd"]):
+        _indicator_state.update((y, ind) for y, ind in snap.get("indicators", {}).items() if y in keep)
+    elif keep:
+        print("[INFO] 指標設定與快照不同，快照裡的指標狀態不沿用（由 K 線重新 seed）")
+    _gen = itertools.count(max((ent.gen for ent in charts.values()), default=0) + 1)
+    weekly_bars.advance_gen(max((ind.wbars.bars.gen for ind in _indicator_state.values()), default=0))
+    _cooldown.restore(snap.get("cooldowns") or {})
+    if snap.get("eod_done"):
+        _cooldown.mark_eod(snap["eod_done"])
+    missing = [y for y in y_symbols if (y, "1d") not in _chart_cache]
+    if missing and _bar_store is not None:
+        loaded = _bar_store.load_all(missing)
+        for ent in loaded.values():
+            ent.gen = next(_gen)
+        _chart_cache.update(loaded)
+    return len(charts)
+
+# ---------------- 掃描 ----------------
+def quote_meta(ysym: str, q: Dict[str, Any]) -> Dict[str, Any]:
+    tkr = ysym.split(".")[0]
+    return {
+        "ysym": ysym, "tkr": tkr,
+        "name": q.get("shortName") or q.get("longName") or tkr,
+        "ex": q.get("fullExchangeName") or q.get("exchange"),
+        "price": q.get("regularMarketPrice") or q.get("postMarketPrice") or q.get("preMarketPrice"),
+        "vol_now": q.get("regularMarketVolume"),
+        "chg": q.get("regularMarketChangePercent"),
+        "yclose": q.get("regularMarketPreviousClose"),
+        "tick_ts": q.get("tickTime"),           # 串流來源才有
+        "tick_ohl": (q.get("tickOpen"), q.get("tickHigh"), q.get("tickLow")),
+    }
+
+def seed_stream(source, y_list: List[str], chunk: int) -> int:
+    """
+    串流來源的報價底稿（tick 只有價量）：名稱 / 市場先取 symbols_meta，
+    即時來源再以 Yahoo 整批報價（昨收 / 漲跌幅）覆蓋；回放歷史 tick 不查即時報價。回傳有 Yahoo 報價的檔數。
+    """
+    by_y = {ent["yahoo"]: ent for ent in load_meta(META_PATH).values() if ent.get("yahoo")}
+    base = {y: {"shortName": by_y.get(y, {}).get("name") or None, "fullExchangeName": market_of(y)} for y in y_list}
+    quotes = {} if source.replay else fetch_quotes_bulk(y_list, chunk)
+    for y, q in quotes.items():
+        base.setdefault(y, {}).update((k, v) for k, v in q.items() if v is not None)
+    source.seed(base)
+    return len(quotes)
+
+def symbol_features(meta: Dict[str, Any], cfg: Dict[str, Any]) -> Tuple:
+    """K 線（快取）→ 串流指標 → 規則引擎的一列特徵"""
+    ysym = meta["ysym"]
+    d_ent = get_chart_cached(ysym, rng="8mo", interval="1d",
+                             refresh_minutes=cfg["cache_refresh_minutes"]["daily"])
+    ind = get_indicators(ysym, cfg)
+    ma5_st, ma34_st, macd_st = ind.daily.sync(d_ent)
+    (ma5w_st,) = ind.weekly.sync(ind.wbars.sync(d_ent))
+    dif_d, dem_d, hist_d = macd_st.values
+    return feature_row(meta["price"], meta["vol_now"], hist_d, ma34_st.values, ma5w_st.values, ma5_st.values)
+
+def compute_features(metas: List[Dict[str, Any]], cfg: Dict[str, Any], chart_specs) -> Tuple[List[Tuple], int]:
+    """候選代號：併發補 K 線 → 批次 seed → 串流指標 → 特徵列；回傳 (特徵列, 抓的 K 線張數)"""
+    survivors = [m["ysym"] for m in metas]
+    with metrics.stage("chart_fetch"):
+        fetched = prefetch_charts(survivors, chart_specs)
+    for m in metas:
+        if m.get("tick_ts"):
+            apply_tick(m["ysym"], m["price"], m["vol_now"], m["tick_ts"], *m["tick_ohl"])
+    with metrics.stage("indicators"):
+        seed_indicators_bulk(survivors, cfg)
+        rows = [symbol_features(m, cfg) for m in metas]
+    return rows, fetched
+
+def scan_cycle(batch: List[str], cfg: Dict[str, Any], chart_specs, chunk: int,
+               cooldown: int, once_per_day: bool,
+               quotes: Optional[Dict[str, Dict[str, Any]]] = None,
+               scheduler: Optional[QuoteDiffScheduler] = None,
+               shards: Optional["ShardPool"] = None) -> Dict[str, Any]:
+    """
+    一輪分段掃描：報價 →（全部規則模式）報價預篩 → 只替候選抓 K 線 / 算指標 → 規則矩陣 → 推播。
+    quotes 可由呼叫端先整批查好（排程模式）；給 shards 時 K 線 / 指標交給分片子行程，
+    報價、冷卻與推播仍只在這裡做。回傳各階段計數。
+    """
+    if quotes is None:
+        with metrics.stage("quote_fetch"):
+            quotes = fetch_quotes_bulk(batch, chunk)
+    metas = [quote_meta(ysym, quotes.get(ysym, {})) for ysym in batch]
+    stats = {"batch": len(batch), "quoted": sum(1 for y in batch if y in quotes)}
+    now = time.time()
+
+    all_mode = match_all(cfg)
+    if all_mode:
+        keep = prefilter(cfg, [m["price"] for m in metas], [m["vol_now"] for m in metas])
+        if scheduler is not None:       # 被預篩刷掉也算評估過
+            dropped = [m for m, k in zip(metas, keep) if not k]
+            scheduler.mark([m["ysym"] for m in dropped], [m["price"] for m in dropped],
+                           [m["vol_now"] for m in dropped], None, now)
+        metas = [m for m, k in zip(metas, keep) if k]
+    survivors = [m["ysym"] for m in metas]
+    stats["candidates"] = len(survivors)
+    stats["charts_skipped"] = (len(batch) - len(survivors)) * len(chart_specs)
+    if shards is not None:
+        with metrics.stage("shard_features"):
+            rows, stats["charts_fetched"], stats["shards"] = shards.features(metas, chart_specs)
+        for i, _, secs in stats["shards"]:
+            metrics.observe("shard_seconds", secs, shard=i)
+    else:
+        rows, stats["charts_fetched"] = compute_features(metas, cfg, chart_specs)
+
+    F = feature_matrix(rows)
+    if scheduler is not None:
+        scheduler.mark(survivors, [m["price"] for m in metas], [m["vol_now"] for m in metas],
+                       F[:, FEATURES.index("ma5d_1")].tolist(), now)
+    with metrics.stage("rules"):
+        hits, rids = evaluate_rules(cfg, F)
+        if all_mode:
+            hits = require_all(hits)
+    stats["hit_symbols"] = int(hits.any(axis=1).sum()) if hits.size else 0
+    with metrics.stage("push"):
+        stats["pushed"] = notify_hits(cfg, metas, F, hits, rids, cooldown, once_per_day)
+    return stats
+
+def _alert_text(m: Dict[str, Any], notes: List[str]) -> str:
+    return (f"【觸發】{m['name']} ({m['tkr']}) {m['ex']}\n"
+            f"價：{m['price']}（昨收：{m['yclose']}，漲跌：{(m['chg'] or 0):.2f}%）\n"
+            f"{'；'.join(notes)}\n"
+            f"時間：{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+def notify_hits(cfg, metas, F, hits, rids, cooldown: int, once_per_day: bool) -> int:
+    """
+    命中矩陣 → 冷卻檢查 → 組訊息，整輪合併成摘要丟給背景推播；回傳實際排入推播佇列的訊息則數
+    （未設定 token / 收件人而略過的不算）。
+    有訂閱索引時依「代號 × 規則 → 訂閱者」扇出，每人只收自己清單 / 規則的部分；
+    摘要內容相同的人合成一次 multicast。沒有任何人訂閱的（代號, 規則）不佔冷卻，之後有人訂閱才推得出去。
+    """
+    texts: List[str] = []
+    per_user: Dict[str, List[str]] = {}
+    for i in np.flatnonzero(hits.any(axis=1)):
+        m = metas[i]
+        notes = []
+        by_user: Dict[str, List[str]] = {}
+        for j, rid in enumerate(rids):
+            if not hits[i, j]:
+                continue
+            uids = _subs_index.recipients(m["tkr"], rid) if _subs_index is not None else None
+            if uids is not None and not uids:
+                continue
+            if should_push(m["tkr"], rid, cooldown_minutes=cooldown, once_per_day=once_per_day):
+                note = format_hit(cfg, rid, F[i])
+                if note:
+                    notes.append((rid, note))
+                    for uid in uids or ():
+                        by_user.setdefault(uid, []).append(note)
+        if not notes:
+            continue
+        if _subs_index is not None:
+            for uid, ns in by_user.items():
+                per_user.setdefault(uid, []).append(_alert_text(m, ns))
+        text = _alert_text(m, [n for _, n in notes])
+        print(text)
+        texts.append(text)
+    _cooldown.flush()
+    if _subs_index is None:
+        return get_dispatcher().submit_digest(texts) if texts else 0
+    groups: Dict[Tuple[str, ...], List[str]] = {}
+    for uid, ts in per_user.items():
+        groups.setdefault(tuple(ts), []).append(uid)
+    return sum(get_dispatcher().submit_digest(list(ts), to=uids) for ts, uids in groups.items())
+
+# ---------------- 盤外：收盤整理 / 開盤前預熱 ----------------
+def _refresh_now(chart_specs) -> List[Tuple[str, str, int]]:
+    """同樣的 K 線規格但 refresh_minutes=0：不管快取多新都同步補抓"""
+    return [(rng, interval, 0) for rng, interval, _ in chart_specs]
+
+def eod_pass(scan_list: List[str], cfg: Dict[str, Any], chart_specs, chunk: int, batch_size: int,
+             cooldown: int, once_per_day: bool, shards: Optional["ShardPool"] = None) -> Dict[str, int]:
+    """收盤後一次：以收盤報價跑完整輪，K 線同步重抓成定案的日 K / 週 K 並寫回 bar_store"""
+    specs = _refresh_now(chart_specs)
+    total: Dict[str, int] = {}
+    for i in range(0, len(scan_list), batch_size):
+        st = scan_cycle(scan_list[i: i+batch_size], cfg, specs, chunk, cooldown, once_per_day, shards=shards)
+        for k in ("batch", "candidates", "charts_fetched", "hit_symbols", "pushed"):
+            total[k] = total.get(k, 0) + st[k]
+    return total
+
+def prewarm(scan_list: List[str], cfg: Dict[str, Any], chart_specs, batch_size: int,
+            shards: Optional["ShardPool"] = None) -> int:
+    """開盤前：補齊 K 線、seed 指標狀態（不查報價、不跑規則），開盤第一輪就不必等下載；回傳抓的張數"""
+    specs = _refresh_now(chart_specs)
+    fetched = 0
+    for i in range(0, len(scan_list), batch_size):
+        metas = [quote_meta(y, {}) for y in scan_list[i: i+batch_size]]
+        if shards is not None:
+            _, n, _ = shards.features(metas, specs)
+        else:
+            _, n = compute_features(metas, cfg, specs)
+        fetched += n
+    return fetched
+
 def main():
     # 讀設定
     with open("config.json","r",encoding="utf-8") as f:
         cfg = json.load(f)
 
+    # 共用連線池（併發數 / 每 host 限速）
+    fcfg = cfg.get("fetch", {})
+    configure_fetch_pool(concurrency=int(fcfg.get("concurrency", 8)),
+                         rate_per_host=float(fcfg.get("rate_per_host", 0)),
+                         timeout=float(fcfg.get("timeout", 20)))
+
+    # /metrics（Prometheus 文字格式）與 cProfile 訊號
+    mcfg = cfg.get("metrics", {})
+    if mcfg.get("enabled", False):
+        try:
+            metrics.start_server(int(mcfg.get("port", 9108)), mcfg.get("host", "0.0.0.0"))
+        except OSError as e:
+            print("[WARN] metrics 伺服器啟動失敗：", e)
+    if mcfg.get("profile_signal"):
+        metrics.install_profile_signal(mcfg["profile_signal"], mcfg.get("profile_dir", "."))
+
     # 啟動提示（可在 config.json 設 startup_ping: true）
     if cfg.get("startup_ping", False):
-        push_message("【啟動】XQ 全市場掃描（Render Worker）已啟動 🚀")
+        get_dispatcher().submit("【啟動】XQ 全市場掃描（Render Worker）已啟動 🚀")
 
     # 缺清單就試圖更新；失敗再要求用 twse.html/tpex.html 生成
     if not os.path.exists("symbols_all.txt"):
         try:
+            from refresh_symbols_all import refresh_symbols_all
             n = refresh_symbols_all()
             print(f"[INFO] symbols_all.txt updated: {n} codes")
         except Exception as e:
             print("[ERROR] 產生 symbols_all.txt 失敗，請先用 build_symbols_from_local.py：", e)
             return
+    elif not os.path.exists(META_PATH):
+        # 清單在、市場別檔不在（舊部署 / 只放了 symbols_all.txt）：補抓 ISIN 頁面，免得整份清單線上試 suffix
+        try:
+            from refresh_symbols_all import refresh_symbols_meta
+            print(f"[INFO] {META_PATH} updated: {refresh_symbols_meta()} codes")
+        except Exception as e:
+            print(f"[WARN] 產生 {META_PATH} 失敗，改線上判斷 suffix：", e)
 
     # 讀清單後
     with open("symbols_all.txt","r",encoding="utf-8") as f:
         all_syms = [s.strip() for s in f if s.strip()]
     print(f"[DEBUG] symbols_all.txt 讀到 {len(all_syms)} 檔，前5：{all_syms[:5]}")
 
-    sym_map = choose_symbol_suffix_bulk(all_syms, chunk=300)
+    # 啟動快照：新鮮的話直接沿用代號對應 / K 線 / 指標狀態，只有快照裡沒有的代號才重新對應
+    snap_path, snap_max_age = snapshot_settings(cfg)
+    t0 = time.time()
+    snap = snapshot.load(snap_path, snap_max_age) if snap_path else None
+    if snap is not None and snap.get("sym_map"):
+        known = snap["sym_map"]
+        sym_map = {c: known[c] for c in all_syms if c in known}
+        missing = [c for c in all_syms if c not in known]
+        if missing:
+            sym_map.update(resolve_symbols(missing))
+    else:
+        sym_map = resolve_symbols(all_syms)
     print(f"[DEBUG] sym_map 成功對應 {len(sym_map)} 檔，前5：{list(sym_map.items())[:5]}")
 
     y_list = [sym_map[s] for s in all_syms if s in sym_map]
     print(f"[DEBUG] y_list 最終可查 {len(y_list)} 檔，前5：{y_list[:5]}")
 
+    # K 線快取：stale-while-revalidate 與失敗退避
+    configure_chart_cache(cfg)
+
+    # 多行程分片：workers > 1 時 K 線快取與指標狀態分給子行程，本行程只管報價 / 冷卻 / 推播
+    workers = int(cfg.get("workers", 1))
+    # 週 K 由日 K 彙整（weekly_bars），只需要抓日 K
+    chart_specs = [("8mo", "1d", cfg["cache_refresh_minutes"]["daily"])]
+
+    # K 線持久層：重啟後直接沿用，只補缺的尾巴（有快照時只補快照裡沒有的）
+    open_bar_store(cfg, y_list, load=workers <= 1 and snap is None)
+    shards = None
+    if workers > 1:
+        from shard_pool import ShardPool
+        shards = ShardPool(workers, cfg, chart_specs, y_list, yahoo_base=YAHOO_BASE)
+    # 冷卻狀態持久層：重新部署不會把今天推過的再推一次
+    open_cooldown_store(cfg)
+    if snap is not None:
+        n = restore_snapshot(snap, y_list if workers <= 1 else [], cfg)
+        what = f"{n} 檔 K 線 / 指標狀態" if workers <= 1 else "冷卻狀態（K 線 / 指標由各分片載回）"
+        print(f"[INFO] 快照載回 {what}，啟動共 {time.time() - t0:.2f}s")
+    # 多使用者訂閱：只掃所有人清單的聯集
+    open_subscriptions(cfg)
+
     poll = int(cfg.get("poll_seconds", 90))
     chunk = int(cfg.get("yahoo_quote_chunk", 50))
     batch_size = int(cfg.get("batch_size", 200))
     cooldown = int(cfg.get("cooldown_minutes", 30))
     once_per_day = bool(cfg.get("once_per_day", False))
 
-    print(f"[INFO]（Worker）全市場 {len(y_list)} 檔；每輪 {batch_size} 檔；chunk={chunk}。")
+    print(f"[INFO]（Worker）全市場 {len(y_list)} 檔；每輪 {batch_size} 檔；chunk={chunk}；分片 {workers}。")
+
+    # 排程：quote_diff = 每輪整批報價全市場，再挑最可能翻轉的 batch_size 檔；round_robin = 舊的游標輪替
+    scfg = cfg.get("scheduler", {})
+    sched = None
+    if scfg.get("mode", "quote_diff") == "quote_diff":
+        sched = QuoteDiffScheduler(y_list, max_staleness_s=float(scfg.get("max_staleness_minutes", 15)) * 60)
+
+    # 行情來源：yahoo_poll = 定時整批查報價；tick_file 等串流來源 = 有成交才只重算變動的代號
+    source = make_source(cfg, fetch_quotes_bulk, chunk)
+    if source.streaming:
+        sched = None
+        n = seed_stream(source, y_list, chunk)
+        print(f"[INFO] 串流行情模式（{type(source).__name__}），只重算有 tick 的代號；Yahoo 報價底稿 {n}/{len(y_list)} 檔")
+
+    # 交易時段：盤中全速；收盤後做一次收盤整理；盤外睡到下次開盤前 prewarm_minutes 預熱（tick 檔回放不受限）
+    sess = cfg.get("session", {})
+    cal = None
+    if sess.get("enabled", False) and not source.replay:
+        from trading_calendar import TradingCalendar
+        cal = TradingCalendar.from_config(cfg)
+    eod_delay = float(sess.get("eod_delay_minutes", 60)) * 60
+    prewarm_s = float(sess.get("prewarm_minutes", 10)) * 60
+    warmed_for = 0.0
+
+    # 啟動快照：每 every_minutes 寫一次；收到 SIGTERM（重新部署）就把這一輪做完、寫出快照再結束
+    stop = threading.Event()
+    def _on_term(signum, frame):
+        print("[INFO] 收到 SIGTERM，寫出快照後結束")
+        stop.set()
+        source.close()
+    signal.signal(signal.SIGTERM, _on_term)
+    snap_every = float(cfg.get("snapshot", {}).get("every_minutes", 15)) * 60
+    next_snap = time.time() + snap_every
 
     idx = 0
-    while True:
+    scan_list, scan_set = y_list, set(y_list)
+    while not stop.is_set():
         start = time.time()
-
-        batch = y_list[idx: idx+batch_size]
-        if not batch:
+        if snap_path and start >= next_snap:
+            write_snapshots(snap_path, cfg, sym_map, shards)
+            next_snap = time.time() + snap_every
+
+        if cal is not None and not cal.in_session(start):
+            metrics.set_gauge("session_open", 0)
+            eod = cal.eod_pending(start, _cooldown.last_eod())
+            if eod and start >= eod[1] + eod_delay:
+                print(f"[INFO] {eod[0]} 收盤整理：{len(scan_list)} 檔")
+                st = eod_pass(scan_list, cfg, chart_specs, chunk, batch_size, cooldown, once_per_day, shards)
+                print(f"[STAT] 收盤整理 {st.get('batch', 0)} 檔 → 抓 K 線 {st.get('charts_fetched', 0)} 張 → "
+                      f"命中 {st.get('hit_symbols', 0)} 檔 → 推播 {st.get('pushed', 0)} 則，"
+                      f"{time.time() - start:.1f}s")
+                _cooldown.mark_eod(eod[0])
+                continue
+            nxt = cal.next_open(start)
+            if start >= nxt - prewarm_s and warmed_for != nxt:
+                refresh_subscriptions(cfg)
+                if source.streaming:
+                    seed_stream(source, y_list, chunk)      # 換日：昨收以 Yahoo 為準
+                n = prewarm(scan_universe(y_list), cfg, chart_specs, batch_size, shards)
+                print(f"[INFO] 開盤前預熱：抓 K 線 {n} 張，{time.time() - start:.1f}s")
+                warmed_for = nxt
+                continue
+            target = nxt - prewarm_s if warmed_for != nxt else nxt
+            if eod:
+                target = min(target, eod[1] + eod_delay)
+            stop.wait(min(300.0, max(1.0, target - time.time())))
+            continue
+        if cal is not None:
+            metrics.set_gauge("session_open", 1)
+
+        if refresh_subscriptions(cfg):
+            scan_list = scan_universe(y_list)
+            scan_set = set(scan_list)
             idx = 0
-            batch = y_list[idx: idx+batch_size]
-        idx += batch_size
-
-        # 取報價
-        quotes = {}
-        for i in range(0, len(batch), chunk):
-            group = batch[i:i+chunk]
-            quotes.update(fetch_quote_multi(group))
-
-        # 計算指標 & 規則
-        for ysym in batch:
-            q = quotes.get(ysym, {})
-            tkr = ysym.split(".")[0]
-            name = q.get("shortName") or q.get("longName") or tkr
-            ex = q.get("fullExchangeName") or q.get("exchange")
-            price = q.get("regularMarketPrice") or q.get("postMarketPrice") or q.get("preMarketPrice")
-            vol_now = q.get("regularMarketVolume")
-            chg = q.get("regularMarketChangePercent")
-            yclose = q.get("regularMarketPreviousClose")
-
-            d_ent = get_chart_cached(ysym, rng="8mo", interval="1d",
-                                     refresh_minutes=cfg["cache_refresh_minutes"]["daily"])
-            w_ent = get_chart_cached(ysym, rng="5y", interval="1wk",
-                                     refresh_minutes=cfg["cache_refresh_minutes"]["weekly"])
-
-            ma5_d = sma(d_ent["close"], 5)
-            ma34_d = sma(d_ent["close"], 34)
-            dif_d, dem_d, hist_d = macd(d_ent["close"],
-                                        cfg["macd"]["fast"], cfg["macd"]["slow"], cfg["macd"]["signal"])
-            ma5_w = sma(w_ent["close"], 5)
-
-            fired = []
-            if cfg["rules"].get("r1_macd_combo", True):
-                msg = r1_macd_combo(cfg, hist_d);           fired.append(msg) if msg else None
-            if cfg["rules"].get("r2_ma34_up_daily", True):
-                msg = r2_ma34_up_daily(ma34_d);             fired.append(msg) if msg else None
-            if cfg["rules"].get("r3_weekly_ma5_pattern", True):
-                msg = r3_weekly_ma5_pattern(ma5_w);         fired.append(msg) if msg else None
-            if cfg["rules"].get("r4_daily_ma5_up", True):
-                msg = r4_daily_ma5_up(ma5_d);               fired.append(msg) if msg else None
-            if cfg["rules"].get("r5_within_0_to_4pct_of_ma5", True):
-                msg = r5_within_pct_to_ma5(price, ma5_d[-1] if ma5_d else None,
-                                           cfg["diff_to_ma5_pct"]["min"],
-                                           cfg["diff_to_ma5_pct"]["max"]);    fired.append(msg) if msg else None
-            if cfg["rules"].get("r6_price_gt_20", True):
-                msg = r6_price_gt(price, cfg["limits"]["price_min"]);          fired.append(msg) if msg else None
-            if cfg["rules"].get("r7_volume_gt_1000_lots", True):
-                msg = r7_volume_gt(vol_now, cfg["limits"]["min_volume_shares"]); fired.append(msg) if msg else None
-            if cfg["rules"].get("r8_price_gt_ma5", True):
-                msg = r8_price_gt_ma5(price, ma5_d[-1] if ma5_d else None);    fired.append(msg) if msg else None
-
-            if fired:
-                to_send = []
-                for note in fired:
-                    rid = note.split()[0]
-                    if should_push(tkr, rid, cooldown_minutes=cooldown, once_per_day=once_per_day):
-                        to_send.append(note)
-                if to_send:
-                    text = (f"【觸發】{name} ({tkr}) {ex}\n"
-                            f"價：{price}（昨收：{yclose}，漲跌：{(chg or 0):.2f}%）\n"
-                            f"{'；'.join(to_send)}\n"
-                            f"時間：{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-                    print(text)
-                    push_message(text)
-
-        # 節流
-        wait = max(5, poll - int(time.time() - start))
-        time.sleep(wait)
+            if sched is not None:
+                sched = QuoteDiffScheduler(scan_list, max_staleness_s=float(scfg.get("max_staleness_minutes", 15)) * 60)
+        if not scan_list:
+            stop.wait(poll)
+            continue
+
+        quotes = None
+        if source.streaming:
+            quotes = source.wait(timeout=poll)
+            batch = [y for y in quotes if y in scan_set]
+            if not batch:
+                if source.exhausted:
+                    print("[INFO] 行情來源已結束")
+                    break
+                continue
+            start = time.time()
+        elif sched is not None:
+            quotes = source.fetch(scan_list)
+            batch = sched.pick(quotes, cfg, batch_size, start)
+        else:
+            batch = scan_list[idx: idx+batch_size]
+            if not batch:
+                idx = 0
+                batch = scan_list[idx: idx+batch_size]
+            idx += batch_size
+
+        # 報價 → 預篩 → K 線 / 指標 → 規則 → 推播
+        st = scan_cycle(batch, cfg, chart_specs, chunk, cooldown, once_per_day, quotes=quotes, scheduler=sched,
+                        shards=shards)
+        print(f"[STAT] 本輪 {st['batch']} 檔（報價 {st['quoted']}）→ 候選 {st['candidates']} → "
+              f"抓 K 線 {st['charts_fetched']} 張、省下 {st['charts_skipped']} 張 → "
+              f"命中 {st['hit_symbols']} 檔 → 推播 {st['pushed']} 則")
+        if st.get("shards"):
+            print("[STAT] 分片 " + "  ".join(f"#{i}:{n}檔/{secs:.2f}s" for i, n, secs in st["shards"]))
+        if sched is not None:
+            sl = sched.staleness(time.time())
+            print(f"[STAT] 評估延遲 max={sl['max']:.0f}s p90={sl['p90']:.0f}s p50={sl['p50']:.0f}s "
+                  f"mean={sl['mean']:.0f}s，從未評估 {sl['never']} 檔")
+            metrics.record_staleness(sl)
+
+        # 節流（串流模式由 source.wait 等下一批 tick，不必睡）
+        metrics.record_cycle(time.time() - start, poll)
+        if not source.streaming:
+            wait = max(5, poll - int(time.time() - start))
+            stop.wait(wait)
+
+    if snap_path:
+        write_snapshots(snap_path, cfg, sym_map, shards)
+    source.close()
+    if shards is not None:
+        shards.close()
+    get_dispatcher().close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file